@@ -6,3 +6,12 @@ class CommonsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.commons"
     verbose_name = _("Commons")
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from apps.commons.metrics import install_query_recorder
+
+        connection_created.connect(
+            install_query_recorder, dispatch_uid="commons_query_recorder"
+        )
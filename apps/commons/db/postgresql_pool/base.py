@@ -0,0 +1,100 @@
+import os
+import threading
+
+from django.db.backends.postgresql import base
+
+import psycopg2.extras
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+_pools = {}
+_lock = threading.Lock()
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+
+    """ThreadedConnectionPool that makes ``getconn`` wait up to ``timeout``
+    seconds for a connection to be handed back once ``maxconn`` are in use,
+    instead of raising PoolError straight away. Connections that were closed
+    while idle in the pool are discarded rather than handed out."""
+
+    def __init__(self, minconn, maxconn, *args, timeout, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(f"no connection available within {self.timeout}s")
+        try:
+            while True:
+                connection = super().getconn(key)
+                if not connection.closed:
+                    return connection
+                super().putconn(connection, key, close=True)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    """PostgreSQL backend that borrows connections from a psycopg2 pool shared
+    by every thread of the process. Closing the connection at the end of a
+    request hands it back to the pool instead of disconnecting.
+
+    The pool is sized by the ``POOL`` entry of the database settings:
+    ``MIN_SIZE`` idle connections are kept open and at most ``MAX_SIZE`` are
+    in use at once. Threads past ``MAX_SIZE`` wait up to ``TIMEOUT`` seconds
+    for a connection."""
+
+    def get_pool(self, conn_params):
+        # Keyed by pid as well, so forked workers never share a socket
+        key = (os.getpid(), self.alias)
+        pool = _pools.get(key)
+        if pool is None:
+            with _lock:
+                pool = _pools.get(key)
+                if pool is None:
+                    options = self.settings_dict.get("POOL", {})
+                    pool = _pools[key] = BlockingConnectionPool(
+                        options.get("MIN_SIZE", 1),
+                        options.get("MAX_SIZE", 10),
+                        timeout=options.get("TIMEOUT", 10),
+                        **conn_params,
+                    )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool(conn_params).getconn()
+        # Same per connection setup as the postgresql backend, which opens
+        # its connections with psycopg2.connect() directly
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = _pools.get((os.getpid(), self.alias))
+        if pool is None:
+            # Inherited from the parent process, which still owns the session
+            return
+        with self.wrap_database_errors:
+            # The pool rolls back open transactions and drops connections the
+            # server closed
+            pool.putconn(self.connection)
@@ -0,0 +1,98 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import monotonic
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from core.celery import app
+
+logger = logging.getLogger(__name__)
+
+# Looked up in the result backend by the readiness probe, never stored
+PROBE_TASK_ID = "readyz-probe"
+
+
+def probe_database():
+    connection = connections["default"]
+    # Same housekeeping as the start and end of a request, so a connection
+    # the database dropped is replaced and pooled connections are given back
+    connection.close_if_unusable_or_obsolete()
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # Let the server give up on a stuck query instead of the
+                # probe thread waiting on it
+                timeout = int(settings.READINESS_PROBE_TIMEOUT * 1000)
+                cursor.execute("SET LOCAL statement_timeout = %s", [timeout])
+            cursor.execute("SELECT 1")
+    except Exception:
+        connection.close()
+        raise
+    connection.close_if_unusable_or_obsolete()
+
+
+def probe_broker():
+    timeout = settings.READINESS_PROBE_TIMEOUT
+    with app.connection_for_write(connect_timeout=timeout) as connection:
+        connection.ensure_connection(max_retries=1, interval_start=0, timeout=timeout)
+
+
+def probe_result_backend():
+    app.backend.get_task_meta(PROBE_TASK_ID)
+
+
+PROBES = {
+    "database": probe_database,
+    "broker": probe_broker,
+    "result_backend": probe_result_backend,
+}
+
+_executor = ThreadPoolExecutor(max_workers=len(PROBES), thread_name_prefix="readyz")
+_lock = threading.Lock()
+# Latest run of each probe. A hung run keeps its worker thread, so a probe is
+# not started again until it returns and one stuck dependency cannot use up
+# the workers the other probes need
+_running = {}
+_cached = None
+_expires = 0.0
+
+
+def run_probe(name, probe):
+    try:
+        probe()
+    except Exception:
+        logger.warning("Readiness probe %s failed", name, exc_info=True)
+        return "error"
+    return "ok"
+
+
+def run_probes():
+    """Run every probe concurrently and give each READINESS_PROBE_TIMEOUT
+    seconds. A probe still running then, including one still running from an
+    earlier round, is reported as ``timeout``"""
+    futures = {}
+    for name, probe in PROBES.items():
+        future = _running.get(name)
+        if future is None or future.done():
+            future = _running[name] = _executor.submit(run_probe, name, probe)
+        futures[name] = future
+    wait(futures.values(), timeout=settings.READINESS_PROBE_TIMEOUT)
+    return {
+        name: future.result() if future.done() else "timeout"
+        for name, future in futures.items()
+    }
+
+
+def check_readiness():
+    """Probe results, shared by every request for READINESS_CACHE_SECONDS so
+    frequent or concurrent probing runs a single round of checks"""
+    global _cached, _expires
+    if monotonic() < _expires:
+        return _cached
+    with _lock:
+        if monotonic() >= _expires:
+            _cached = run_probes()
+            _expires = monotonic() + settings.READINESS_CACHE_SECONDS
+        return _cached
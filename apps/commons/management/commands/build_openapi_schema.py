@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.commons.openapi import render_schema, write_schema
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema with its gzip and brotli variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.OPENAPI_SCHEMA_PATH,
+            help="Path of the JSON schema, defaults to OPENAPI_SCHEMA_PATH",
+        )
+
+    def handle(self, *args, **options):
+        document = write_schema(options["output"], render_schema())
+        sizes = ", ".join(
+            f"{encoding} {len(body)}" for encoding, body in document.variants.items()
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {options['output']} ({len(document.body)} bytes; {sizes})"
+            )
+        )
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.commons.outbox import relay
+
+
+class Command(BaseCommand):
+    help = "Publish committed outbox messages to Celery"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the outbox once and exit instead of polling",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.OUTBOX_RELAY_INTERVAL,
+            help="Seconds to wait when the outbox is empty",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            published = relay()
+            while published:
+                published = relay()
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,140 @@
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+current_sample = ContextVar("request_metrics_sample", default=None)
+
+
+class Histogram:
+
+    """Prometheus style histogram with fixed upper bounds. Callers hold the
+    registry lock while observing"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+
+    """Per process request metrics keyed by URL name. Each worker process
+    keeps its own registry, so Prometheus should scrape every worker or the
+    series should be summed across instances"""
+
+    histograms = {
+        "http_request_duration_seconds": ("Total request time", DURATION_BUCKETS),
+        "http_request_db_duration_seconds": (
+            "Time spent in SQL queries",
+            DURATION_BUCKETS,
+        ),
+        "http_request_db_queries": ("SQL queries per request", QUERY_BUCKETS),
+        "http_response_size_bytes": ("Response body size", SIZE_BUCKETS),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.series = {name: {} for name in self.histograms}
+
+    def count(self, endpoint, method, status):
+        key = (endpoint, method, status)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def observe(self, endpoint, values):
+        with self.lock:
+            for name, value in values.items():
+                series = self.series[name]
+                histogram = series.get(endpoint)
+                if histogram is None:
+                    histogram = series[endpoint] = Histogram(self.histograms[name][1])
+                histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            for series in self.series.values():
+                series.clear()
+
+    def render(self, sample_rate):
+        """Text exposition format 0.0.4"""
+        lines = [
+            "# HELP http_requests_total Requests served, all of them counted",
+            "# TYPE http_requests_total counter",
+        ]
+        with self.lock:
+            for (endpoint, method, status), total in sorted(self.requests.items()):
+                lines.append(
+                    f'http_requests_total{{endpoint="{endpoint}",method="{method}",'
+                    f'status="{status}"}} {total}'
+                )
+            for name, (description, buckets) in self.histograms.items():
+                lines.append(f"# HELP {name} {description}, sampled requests only")
+                lines.append(f"# TYPE {name} histogram")
+                for endpoint, histogram in sorted(self.series[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                            f"{cumulative}"
+                        )
+                    lines.append(
+                        f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} '
+                        f"{histogram.count}"
+                    )
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+                    lines.append(
+                        f'{name}_count{{endpoint="{endpoint}"}} {histogram.count}'
+                    )
+        lines.append(
+            "# HELP http_request_metrics_sample_rate Share of requests sampled"
+        )
+        lines.append("# TYPE http_request_metrics_sample_rate gauge")
+        lines.append(f"http_request_metrics_sample_rate {sample_rate}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class RequestSample:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper that times queries of sampled requests.
+    Context variables follow sync_to_async, so queries of async views are
+    attributed to the request that issued them"""
+    sample = current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.db_time += perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
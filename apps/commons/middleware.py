@@ -0,0 +1,101 @@
+import random
+from asyncio import iscoroutinefunction
+from time import perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from asgiref.sync import sync_to_async
+
+from apps.commons.health import check_readiness
+from apps.commons.metrics import RequestSample, current_sample, registry
+
+UNMATCHED_ENDPOINT = "unmatched"
+LIVENESS_PATHS = {"/healthz", "/healthz/"}
+READINESS_PATHS = {"/readyz", "/readyz/"}
+
+
+def readiness_response(checks):
+    ready = all(status == "ok" for status in checks.values())
+    return JsonResponse(
+        {"status": "ok" if ready else "unavailable", "checks": checks},
+        status=200 if ready else 503,
+    )
+
+
+@sync_and_async_middleware
+def health_check_middleware(get_response):
+    """Answer /healthz and /readyz before any other middleware, URL
+    resolution or host validation runs, so orchestrator probes stay cheap
+    and are not counted as API traffic"""
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            if request.path in LIVENESS_PATHS:
+                return HttpResponse("ok", content_type="text/plain")
+            if request.path in READINESS_PATHS:
+                checks = await sync_to_async(check_readiness, thread_sensitive=False)()
+                return readiness_response(checks)
+            return await get_response(request)
+
+    else:
+
+        def middleware(request):
+            if request.path in LIVENESS_PATHS:
+                return HttpResponse("ok", content_type="text/plain")
+            if request.path in READINESS_PATHS:
+                return readiness_response(check_readiness())
+            return get_response(request)
+
+    return middleware
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """Count every request by URL name and, for a METRICS_SAMPLE_RATE share
+    of them, record total time, SQL query count, SQL time and response size"""
+    sample_rate = settings.METRICS_SAMPLE_RATE
+
+    def start():
+        if sample_rate <= 0 or random.random() >= sample_rate:
+            return None, None
+        sample = RequestSample()
+        return sample, current_sample.set(sample)
+
+    def finish(request, response, sample, token, started):
+        match = request.resolver_match
+        endpoint = match.view_name if match else UNMATCHED_ENDPOINT
+        registry.count(endpoint, request.method, response.status_code)
+        if sample is None:
+            return
+        current_sample.reset(token)
+        values = {
+            "http_request_duration_seconds": perf_counter() - started,
+            "http_request_db_duration_seconds": sample.db_time,
+            "http_request_db_queries": sample.queries,
+        }
+        if not response.streaming:
+            values["http_response_size_bytes"] = len(response.content)
+        registry.observe(endpoint, values)
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            started = perf_counter()
+            sample, token = start()
+            response = await get_response(request)
+            finish(request, response, sample, token, started)
+            return response
+
+    else:
+
+        def middleware(request):
+            started = perf_counter()
+            sample, token = start()
+            response = get_response(request)
+            finish(request, response, sample, token, started)
+            return response
+
+    return middleware
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("commons", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="dead_lettered_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="last_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name="outboxmessage",
+            index=models.Index(
+                condition=models.Q(("dead_lettered_at", None)),
+                fields=["pkid"],
+                name="outbox_pending_idx",
+            ),
+        ),
+    ]
@@ -12,3 +12,29 @@ class TimeStampedUUIDModel(models.Model):
     class Meta:
         abstract = True
         ordering = ["-created_at", "-updated_at"]
+
+
+class OutboxMessage(TimeStampedUUIDModel):
+
+    """A Celery task call written in the same transaction as the data it
+    refers to and published by the outbox relay once committed"""
+
+    task = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set once OUTBOX_MAX_ATTEMPTS publishes failed, the relay skips it after
+    dead_lettered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["pkid"]
+        indexes = [
+            models.Index(
+                fields=["pkid"],
+                condition=models.Q(dead_lettered_at=None),
+                name="outbox_pending_idx",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.pkid}  {self.task} on {self.created_at}"
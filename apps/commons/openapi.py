@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+import brotli
+from drf_yasg.app_settings import swagger_settings
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+logger = logging.getLogger(__name__)
+
+# Content-Encoding and file suffix of every precompressed variant, in the
+# order they are preferred when a client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class SchemaDocument:
+
+    """The rendered schema with its precompressed variants and ETag"""
+
+    def __init__(self, body, variants):
+        self.body = body
+        self.variants = variants
+        # Weak, as the same ETag is sent for every Content-Encoding
+        self.etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def render_schema():
+    """Generate the public OpenAPI schema of every endpoint as JSON bytes"""
+    generator = OpenAPISchemaGenerator(swagger_settings.DEFAULT_INFO)
+    schema = generator.get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def compress(body):
+    return {
+        "br": brotli.compress(body, quality=11),
+        "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+    }
+
+
+def write_schema(path, body):
+    """Write ``body`` and its precompressed variants next to each other"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    variants = compress(body)
+    path.write_bytes(body)
+    for encoding, suffix in ENCODINGS:
+        path.with_name(path.name + suffix).write_bytes(variants[encoding])
+    return SchemaDocument(body, variants)
+
+
+def read_schema(path):
+    path = Path(path)
+    body = path.read_bytes()
+    variants = {}
+    for encoding, suffix in ENCODINGS:
+        try:
+            variants[encoding] = path.with_name(path.name + suffix).read_bytes()
+        except FileNotFoundError:
+            pass
+    return SchemaDocument(body, variants)
+
+
+_document = None
+_lock = threading.Lock()
+
+
+def get_schema_document():
+    """The schema built by ``build_openapi_schema``, read once per process.
+    When the build step was skipped the schema is generated once and kept in
+    memory instead"""
+    global _document
+    if _document is None:
+        with _lock:
+            if _document is None:
+                try:
+                    _document = read_schema(settings.OPENAPI_SCHEMA_PATH)
+                except FileNotFoundError:
+                    logger.warning(
+                        "%s not found, generating the OpenAPI schema in memory",
+                        settings.OPENAPI_SCHEMA_PATH,
+                    )
+                    body = render_schema()
+                    _document = SchemaDocument(body, compress(body))
+    return _document
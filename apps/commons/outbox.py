@@ -0,0 +1,79 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from kombu.exceptions import OperationalError
+
+from apps.commons.models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, **kwargs):
+    """Record a call of ``task`` to be published after the current
+    transaction commits. Nothing is sent if the transaction rolls back and
+    the caller never waits on the broker."""
+    return OutboxMessage.objects.create(task=task.name, kwargs=kwargs)
+
+
+async def aenqueue(task, **kwargs):
+    """Async counterpart of ``enqueue`` for views outside a transaction"""
+    return await OutboxMessage.objects.acreate(task=task.name, kwargs=kwargs)
+
+
+def relay(batch_size=None):
+    """Publish one batch of pending outbox messages to Celery and delete
+    them, returning the number of messages published.
+
+    Rows are locked with ``SKIP LOCKED`` so several relays can run side by
+    side. Delivery is at least once: a crash between publishing and the
+    commit publishes the batch again. A broker that cannot be reached leaves
+    the batch for the next run. A message that fails to publish on its own
+    is retried by the next runs and dead-lettered after
+    ``OUTBOX_MAX_ATTEMPTS`` failures, so it cannot hold up the messages
+    behind it.
+    """
+    from core.celery import app
+
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(dead_lettered_at=None)
+            .order_by("pkid")[:batch_size]
+        )
+        if not messages:
+            return 0
+        published, failed = [], []
+        with app.producer_or_acquire() as producer:
+            for message in messages:
+                try:
+                    app.send_task(
+                        message.task, kwargs=message.kwargs, producer=producer
+                    )
+                except OperationalError:
+                    # The broker is unreachable, not the message at fault
+                    raise
+                except Exception as error:
+                    message.attempts += 1
+                    message.last_error = repr(error)
+                    failed.append(message)
+                else:
+                    published.append(message.pkid)
+        OutboxMessage.objects.filter(pkid__in=published).delete()
+        for message in failed:
+            if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                message.dead_lettered_at = timezone.now()
+                logger.error(
+                    f"Dead-lettered outbox message {message.pkid} "
+                    f"({message.task}): {message.last_error}"
+                )
+        if failed:
+            OutboxMessage.objects.bulk_update(
+                failed, ["attempts", "last_error", "dead_lettered_at"]
+            )
+
+    logger.info(f"Relayed {len(published)} outbox messages")
+    return len(published)
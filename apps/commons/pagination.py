@@ -0,0 +1,94 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.utils.dateparse import parse_datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+
+    """Forward only cursor pagination over ``(created_at, pkid)``.
+
+    Each page filters on the last row of the previous one instead of using
+    ``OFFSET``, so with an index on ``(created_at, pkid)`` every page costs
+    the same as the first one.
+    """
+
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by("-created_at", "-pkid")
+        position = self.decode_cursor(request)
+        if position:
+            created_at, pkid = position
+            # Same as (created_at, pkid) < position but keeps a plain range
+            # condition on created_at for the index scan
+            queryset = queryset.filter(created_at__lte=created_at).exclude(
+                created_at=created_at, pkid__gte=pkid
+            )
+
+        results = list(queryset[: page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.next_position = (
+            (results[-1].created_at, results[-1].pkid) if self.has_next else None
+        )
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pkid = (
+                urlsafe_b64decode(encoded.encode("ascii")).decode("ascii").split("|")
+            )
+            created_at = parse_datetime(created_at)
+            pkid = int(pkid)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pkid
+
+    def encode_cursor(self, position):
+        created_at, pkid = position
+        encoded = urlsafe_b64encode(f"{created_at.isoformat()}|{pkid}".encode("ascii"))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode())
+
+    def get_next_link(self):
+        if not self.next_position:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,18 @@
+from django.conf import settings
+
+import redis
+
+_clients = {}
+
+
+def get_redis(url=None):
+    """Return a shared Redis client for ``url`` (``REDIS_URL`` by default).
+
+    redis-py connection pools are thread safe and reset themselves after a
+    fork, so one client per URL is enough for every worker process.
+    """
+    url = url or settings.REDIS_URL
+    client = _clients.get(url)
+    if client is None:
+        client = _clients[url] = redis.Redis.from_url(url)
+    return client
@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import override_settings
+
+import fakeredis
+
+from apps.commons import redis_client
+
+
+def fake_redis_caches(server):
+    """CACHES setting whose default cache talks to the fakeredis ``server``"""
+    return {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://localhost:6379/0",
+            "OPTIONS": {
+                "connection_class": fakeredis.FakeConnection,
+                "server": server,
+            },
+        }
+    }
+
+
+class FakeRedisMixin:
+
+    """Point ``get_redis()`` and the default cache at one in-memory Redis
+    server per test, so Redis commands run as they would in production
+    instead of through a LocMemCache"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis_server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.redis_server)
+
+        patcher = mock.patch.dict(
+            redis_client._clients, {settings.REDIS_URL: self.redis}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        caches = override_settings(CACHES=fake_redis_caches(self.redis_server))
+        caches.enable()
+        self.addCleanup(caches.disable)
@@ -0,0 +1,406 @@
+import gzip
+import tempfile
+import threading
+from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+import brotli
+from kombu.exceptions import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.commons import health, openapi
+from apps.commons.db.postgresql_pool.base import BlockingConnectionPool
+from apps.commons.metrics import RequestSample, current_sample, registry
+from apps.commons.models import OutboxMessage
+from apps.commons.outbox import enqueue, relay
+from apps.commons.testing import FakeRedisMixin
+from apps.commons.throttling import SlidingWindowThrottle, sliding_window_hit
+from apps.commons.views import PROMETHEUS_CONTENT_TYPE
+from core.celery import app
+
+NOW = 1_700_000_000.0
+
+
+class SlidingWindowTests(FakeRedisMixin, SimpleTestCase):
+
+    """The Lua sliding window, run by fakeredis"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("apps.commons.throttling.time.time", return_value=NOW)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_limit(self):
+        windows = [("throttle:test", 3, 60)]
+        for _ in range(3):
+            self.assertEqual(sliding_window_hit(windows), (True, 0))
+
+        self.time.return_value = NOW + 10
+        self.assertEqual(sliding_window_hit(windows), (False, 50))
+        self.assertEqual(self.redis.zcard("throttle:test"), 3)
+
+    def test_hits_leave_the_window(self):
+        windows = [("throttle:test", 2, 60)]
+        sliding_window_hit(windows)
+        self.time.return_value = NOW + 30
+        sliding_window_hit(windows)
+
+        self.time.return_value = NOW + 60
+        self.assertEqual(sliding_window_hit(windows), (True, 0))
+        self.assertEqual(sliding_window_hit(windows), (False, 30))
+
+    def test_key_expires_with_the_window(self):
+        sliding_window_hit([("throttle:test", 2, 60)])
+        self.assertEqual(self.redis.pttl("throttle:test"), 60_000)
+
+    def test_refused_hit_is_recorded_in_no_window(self):
+        windows = [("throttle:ip", 5, 60), ("throttle:email", 1, 60)]
+        self.assertTrue(sliding_window_hit(windows)[0])
+        self.assertFalse(sliding_window_hit(windows)[0])
+
+        self.assertEqual(self.redis.zcard("throttle:ip"), 1)
+        self.assertEqual(self.redis.zcard("throttle:email"), 1)
+
+
+@override_settings(
+    REST_FRAMEWORK={
+        "DEFAULT_THROTTLE_RATES": {"login_ip": "3/min", "login_email": "1/min"}
+    }
+)
+class SlidingWindowThrottleTests(FakeRedisMixin, SimpleTestCase):
+    view = SimpleNamespace(throttle_scope="login")
+
+    def allow(self, email):
+        request = APIRequestFactory().post("/", {"email": email}, format="json")
+        request = Request(request, parsers=[JSONParser()])
+        return SlidingWindowThrottle().allow_request(request, self.view)
+
+    def test_email_refusals_leave_the_ip_budget(self):
+        self.assertTrue(self.allow("a@example.com"))
+        for _ in range(3):
+            self.assertFalse(self.allow("a@example.com"))
+
+        self.assertTrue(self.allow("b@example.com"))
+        self.assertTrue(self.allow("c@example.com"))
+        self.assertFalse(self.allow("d@example.com"))
+
+    def test_views_without_scope(self):
+        request = Request(APIRequestFactory().post("/"))
+        self.assertTrue(
+            SlidingWindowThrottle().allow_request(request, SimpleNamespace())
+        )
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=2)
+class OutboxRelayTests(TestCase):
+    def setUp(self):
+        patchers = (
+            mock.patch.object(app, "send_task"),
+            mock.patch.object(app, "producer_or_acquire", return_value=nullcontext()),
+        )
+        self.send_task = patchers[0].start()
+        for patcher in patchers[1:]:
+            patcher.start()
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def enqueue(self, *tasks):
+        for task in tasks:
+            enqueue(SimpleNamespace(name=task), email=f"{task}@example.com")
+
+    def published(self):
+        return [call.args[0] for call in self.send_task.call_args_list]
+
+    def test_publishes_the_oldest_messages_in_batches(self):
+        self.enqueue("a", "b", "c")
+
+        self.assertEqual(relay(batch_size=2), 2)
+        self.assertEqual(self.published(), ["a", "b"])
+        self.send_task.assert_any_call(
+            "a", kwargs={"email": "a@example.com"}, producer=None
+        )
+        self.assertEqual(relay(batch_size=2), 1)
+        self.assertEqual(relay(batch_size=2), 0)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_rolled_back_messages_are_never_published(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.enqueue("a")
+            raise RuntimeError
+        self.assertEqual(relay(), 0)
+
+    def test_unreachable_broker_leaves_the_batch(self):
+        self.enqueue("a", "b")
+        self.send_task.side_effect = OperationalError
+
+        with self.assertRaises(OperationalError):
+            relay()
+        self.assertEqual(
+            list(OutboxMessage.objects.values_list("task", "attempts")),
+            [("a", 0), ("b", 0)],
+        )
+
+    def test_failing_message_is_retried_then_dead_lettered(self):
+        self.enqueue("bad", "a")
+        self.send_task.side_effect = lambda task, **kwargs: task == "bad" and 1 / 0
+
+        self.assertEqual(relay(), 1)
+        bad = OutboxMessage.objects.get()
+        self.assertEqual(bad.attempts, 1)
+        self.assertIn("ZeroDivisionError", bad.last_error)
+        self.assertIsNone(bad.dead_lettered_at)
+
+        self.enqueue("b")
+        with self.assertLogs("apps.commons.outbox", "ERROR"):
+            self.assertEqual(relay(), 1)
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 2)
+        self.assertIsNotNone(bad.dead_lettered_at)
+
+        self.send_task.reset_mock()
+        self.enqueue("c")
+        self.assertEqual(relay(), 1)
+        self.assertEqual(self.published(), ["c"])
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        patcher = mock.patch("apps.commons.middleware.random.random", return_value=0.9)
+        self.random = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(METRICS_SAMPLE_RATE=0.5)
+    def test_every_request_is_counted_and_samples_are_timed(self):
+        self.client.get(reverse("metrics"))
+        self.client.get("/missing/")
+        self.assertEqual(
+            registry.requests,
+            {("metrics", "GET", 200): 1, ("unmatched", "GET", 404): 1},
+        )
+        self.assertEqual(registry.series["http_request_duration_seconds"], {})
+
+        self.random.return_value = 0.1
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(registry.requests[("metrics", "GET", 200)], 2)
+        for name in registry.histograms:
+            self.assertEqual(registry.series[name]["metrics"].count, 1)
+        size = registry.series["http_response_size_bytes"]["metrics"]
+        self.assertEqual(size.sum, len(response.content))
+
+    def test_sampled_queries_are_recorded(self):
+        sample = RequestSample()
+        token = current_sample.set(sample)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        finally:
+            current_sample.reset(token)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+        self.assertEqual(sample.queries, 1)
+        self.assertGreater(sample.db_time, 0)
+
+    def test_render(self):
+        registry.count("metrics", "GET", 200)
+        registry.observe("metrics", {"http_request_db_queries": 2})
+        registry.observe("metrics", {"http_request_db_queries": 7})
+
+        lines = registry.render(0.25).splitlines()
+        self.assertIn(
+            'http_requests_total{endpoint="metrics",method="GET",status="200"} 1',
+            lines,
+        )
+        self.assertIn(
+            'http_request_db_queries_bucket{endpoint="metrics",le="1"} 0', lines
+        )
+        self.assertIn(
+            'http_request_db_queries_bucket{endpoint="metrics",le="2"} 1', lines
+        )
+        self.assertIn(
+            'http_request_db_queries_bucket{endpoint="metrics",le="10"} 2', lines
+        )
+        self.assertIn(
+            'http_request_db_queries_bucket{endpoint="metrics",le="+Inf"} 2', lines
+        )
+        self.assertIn('http_request_db_queries_sum{endpoint="metrics"} 9', lines)
+        self.assertIn('http_request_db_queries_count{endpoint="metrics"} 2', lines)
+        self.assertEqual(lines[-1], "http_request_metrics_sample_rate 0.25")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_scrape_needs_the_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], PROMETHEUS_CONTENT_TYPE)
+
+
+class OpenAPISchemaTests(TestCase):
+    body = b'{"swagger": "2.0"}'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "openapi.json"
+        patcher = mock.patch.object(openapi, "_document", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        schema_path = override_settings(OPENAPI_SCHEMA_PATH=str(self.path))
+        schema_path.enable()
+        self.addCleanup(schema_path.disable)
+
+    def get(self, **headers):
+        return self.client.get(reverse("schema-json"), **headers)
+
+    def test_etag_and_not_modified(self):
+        document = openapi.write_schema(self.path, self.body)
+
+        response = self.get()
+        self.assertEqual(response.content, self.body)
+        self.assertEqual(response["ETag"], document.etag)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertNotIn("Content-Encoding", response)
+
+        response = self.get(HTTP_IF_NONE_MATCH=document.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_precompressed_variants(self):
+        openapi.write_schema(self.path, self.body)
+
+        response = self.get(HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+        response = self.get(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_missing_file_is_generated_once(self):
+        with mock.patch.object(
+            openapi, "render_schema", return_value=self.body
+        ) as render, self.assertLogs("apps.commons.openapi", "WARNING"):
+            self.assertEqual(self.get().content, self.body)
+            self.assertEqual(self.get().content, self.body)
+        render.assert_called_once_with()
+
+
+@override_settings(READINESS_PROBE_TIMEOUT=1, READINESS_CACHE_SECONDS=60)
+class ReadinessTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = Counter()
+        probes = {"database": self.probe("database"), "broker": self.probe("broker")}
+        patchers = (
+            mock.patch.dict(health.PROBES, probes, clear=True),
+            mock.patch.dict(health._running, clear=True),
+            mock.patch.object(health, "_cached", None),
+            mock.patch.object(health, "_expires", 0.0),
+        )
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def probe(self, name, action=None):
+        def probe():
+            self.calls[name] += 1
+            if action:
+                action()
+
+        return probe
+
+    def get(self):
+        response = self.client.get("/readyz")
+        return response.status_code, response.json()["checks"]
+
+    def test_result_is_cached(self):
+        self.assertEqual(self.get(), (200, {"database": "ok", "broker": "ok"}))
+        self.assertEqual(self.get(), (200, {"database": "ok", "broker": "ok"}))
+        self.assertEqual(self.calls, {"database": 1, "broker": 1})
+
+    def test_failing_probe(self):
+        def fail():
+            raise ConnectionError
+
+        health.PROBES["broker"] = self.probe("broker", fail)
+        with self.assertLogs("apps.commons.health", "WARNING"):
+            status, checks = self.get()
+        self.assertEqual(status, 503)
+        self.assertEqual(checks, {"database": "ok", "broker": "error"})
+
+    @override_settings(READINESS_PROBE_TIMEOUT=0.1, READINESS_CACHE_SECONDS=0)
+    def test_hung_probe_times_out_and_is_not_started_again(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        health.PROBES["broker"] = self.probe("broker", release.wait)
+
+        self.assertEqual(self.get(), (503, {"database": "ok", "broker": "timeout"}))
+        self.assertEqual(self.get(), (503, {"database": "ok", "broker": "timeout"}))
+        self.assertEqual(self.calls, {"database": 2, "broker": 1})
+
+        release.set()
+        health._running["broker"].result(timeout=1)
+        self.assertEqual(self.get(), (200, {"database": "ok", "broker": "ok"}))
+        self.assertEqual(self.calls, {"database": 3, "broker": 2})
+
+
+class BlockingConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("psycopg2.pool.psycopg2.connect", side_effect=self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.opened = []
+
+    def connect(self, *args, **kwargs):
+        connection = mock.Mock(closed=0)
+        connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+        self.opened.append(connection)
+        return connection
+
+    def test_connections_are_returned_and_reused(self):
+        pool = BlockingConnectionPool(2, 2, timeout=0.01, dbname="bakery")
+        first, second = pool.getconn(), pool.getconn()
+        self.assertCountEqual(self.opened, [first, second])
+        with self.assertRaises(PoolError):
+            pool.getconn()
+
+        pool.putconn(first)
+        self.assertIs(pool.getconn(), first)
+        self.assertEqual(len(self.opened), 2)
+        first.close.assert_not_called()
+
+    def test_checkout_waits_for_a_returned_connection(self):
+        pool = BlockingConnectionPool(1, 1, timeout=5, dbname="bakery")
+        connection = pool.getconn()
+        threading.Timer(0.05, pool.putconn, [connection]).start()
+
+        self.assertIs(pool.getconn(), connection)
+
+    def test_closed_idle_connections_are_discarded(self):
+        pool = BlockingConnectionPool(1, 2, timeout=0.01, dbname="bakery")
+        stale = pool.getconn()
+        pool.putconn(stale)
+        stale.closed = 1
+
+        connection = pool.getconn()
+        self.assertIsNot(connection, stale)
+        self.assertFalse(connection.closed)
+        # The discarded connection gave its slot back
+        pool.getconn()
+        with self.assertRaises(PoolError):
+            pool.getconn()
@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import time
+import uuid
+
+from django.core.exceptions import ImproperlyConfigured
+
+from redis.exceptions import RedisError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from apps.commons.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Drops the hits that left each window, then records the new hit in every
+# window unless one of them is full, so a refused request is counted in none.
+# KEYS holds one sorted set per window, ARGV the time and member of the hit
+# followed by the length and limit of each window. Returns {allowed,
+# milliseconds until every window has a free slot}
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local refused = false
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local window = tonumber(ARGV[2 * i + 1])
+    local limit = tonumber(ARGV[2 * i + 2])
+    redis.call("ZREMRANGEBYSCORE", key, "-inf", now - window)
+    if redis.call("ZCARD", key) >= limit then
+        refused = true
+        local oldest = redis.call("ZRANGE", key, 0, 0, "WITHSCORES")
+        local free_at = window
+        if oldest[2] then
+            free_at = tonumber(oldest[2]) + window - now
+        end
+        wait = math.max(wait, free_at)
+    end
+end
+if refused then
+    return {0, wait}
+end
+for i, key in ipairs(KEYS) do
+    redis.call("ZADD", key, now, ARGV[2])
+    redis.call("PEXPIRE", key, ARGV[2 * i + 1])
+end
+return {1, 0}
+"""
+
+_scripts = {}
+
+
+def sliding_window_hit(windows):
+    """Record a hit in every ``(key, limit, window seconds)`` of ``windows``
+    unless one of them already saw ``limit`` hits in its window. Runs as a
+    single Lua script so concurrent requests cannot both take the last slot.
+
+    Returns ``(allowed, seconds to wait)``.
+    """
+    client = get_redis()
+    script = _scripts.get(client)
+    if script is None:
+        script = _scripts[client] = client.register_script(SLIDING_WINDOW_SCRIPT)
+    now = int(time.time() * 1000)
+    args = [now, f"{now}:{uuid.uuid4().hex}"]
+    for _, limit, window in windows:
+        args.extend((window * 1000, limit))
+    allowed, wait = script(keys=[key for key, _, _ in windows], args=args)
+    return bool(allowed), wait / 1000
+
+
+def email_ident(request):
+    """Hash of the ``email`` of the request body, so the address is not
+    stored in Redis"""
+    data = request.data
+    email = data.get("email") if hasattr(data, "get") else None
+    if not email or not isinstance(email, str):
+        return None
+    return hashlib.sha256(email.strip().lower().encode()).hexdigest()
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+
+    """Redis sliding window throttle scoped by the view's ``throttle_scope``,
+    like ``ScopedRateThrottle``, and views without one are not throttled.
+
+    Requests are counted per client IP and per submitted email, whichever
+    address they come from, at the ``<throttle_scope>_ip`` and
+    ``<throttle_scope>_email`` rates of ``DEFAULT_THROTTLE_RATES``. Both
+    windows are checked before either records the request, so a request
+    refused by one does not use up the budget of the other."""
+
+    cache_format = "throttle:%(scope)s:%(ident)s"
+
+    def __init__(self):
+        # The rates are only known once the view is, see allow_request
+        self.wait_seconds = None
+
+    def get_rate(self):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(
+                f"No default throttle rate set for '{self.scope}' scope"
+            )
+
+    def get_idents(self, request):
+        return {"ip": self.get_ident(request), "email": email_ident(request)}
+
+    def allow_request(self, request, view):
+        throttle_scope = getattr(view, "throttle_scope", None)
+        if not throttle_scope:
+            return True
+
+        windows = []
+        for suffix, ident in self.get_idents(request).items():
+            self.scope = f"{throttle_scope}_{suffix}"
+            rate = self.get_rate()
+            if rate is None or ident is None:
+                continue
+            num_requests, duration = self.parse_rate(rate)
+            key = self.cache_format % {"scope": self.scope, "ident": ident}
+            windows.append((key, num_requests, duration))
+        if not windows:
+            return True
+
+        try:
+            allowed, self.wait_seconds = sliding_window_hit(windows)
+        except RedisError:
+            # Failing open keeps logins working while Redis is unavailable
+            logger.warning(
+                "Throttle check failed for %s", throttle_scope, exc_info=True
+            )
+            return True
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,55 @@
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import condition, require_GET
+
+from apps.commons.metrics import registry
+from apps.commons.openapi import ENCODINGS, get_schema_document
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+ACCEPT_ENCODING_RE = {
+    encoding: re.compile(rf"\b{encoding}\b") for encoding, _ in ENCODINGS
+}
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape endpoint. When METRICS_TOKEN is set the scraper must
+    send it as a bearer token"""
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(settings.METRICS_SAMPLE_RATE),
+        content_type=PROMETHEUS_CONTENT_TYPE,
+    )
+
+
+def schema_etag(request):
+    return get_schema_document().etag
+
+
+@require_GET
+@condition(etag_func=schema_etag)
+def openapi_schema(request):
+    """Serve the prebuilt OpenAPI schema, precompressed when the client
+    accepts it, without introspecting any view"""
+    document = get_schema_document()
+    accept_encoding = request.headers.get("Accept-Encoding", "")
+    body, content_encoding = document.body, None
+    for encoding, _ in ENCODINGS:
+        variant = document.variants.get(encoding)
+        if variant and ACCEPT_ENCODING_RE[encoding].search(accept_encoding):
+            body, content_encoding = variant, encoding
+            break
+
+    response = HttpResponse(body, content_type="application/json")
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+    return response
@@ -0,0 +1,72 @@
+from django.contrib import admin
+
+from apps.inventory.lookups import pastry_types, raw_material_types, times_of_day
+from apps.inventory.models import (
+    PastryRawMaterialBatch,
+    PastryType,
+    ProcessingStatusTransition,
+    RawMaterial,
+    RawMaterialType,
+    TimeOfDay,
+)
+
+
+class LookupAdmin(admin.ModelAdmin):
+    list_display = ("name", "id", "created_at")
+    search_fields = ("name",)
+
+
+class RawMaterialAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "batch",
+        "pastry_type_name",
+        "raw_material_type_name",
+        "time_of_day_name",
+        "weight",
+        "cost",
+        "processing_status",
+        "created_at",
+    )
+    list_filter = ("processing_status",)
+    list_select_related = ("batch",)
+    raw_id_fields = ("batch",)
+
+    @staticmethod
+    def lookup_name(lookup_cache, pkid):
+        entry = lookup_cache.get("pkid", pkid)
+        return entry["name"] if entry else None
+
+    @admin.display(description="pastry type")
+    def pastry_type_name(self, obj):
+        return self.lookup_name(pastry_types, obj.pastry_type_id)
+
+    @admin.display(description="raw material type")
+    def raw_material_type_name(self, obj):
+        return self.lookup_name(raw_material_types, obj.raw_material_type_id)
+
+    @admin.display(description="time of day")
+    def time_of_day_name(self, obj):
+        return self.lookup_name(times_of_day, obj.time_of_day_id)
+
+
+class ProcessingStatusTransitionAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "batch",
+        "from_status",
+        "to_status",
+        "affected_rows",
+        "created_by",
+        "created_at",
+    )
+    list_select_related = ("batch", "created_by")
+    readonly_fields = [field.name for field in ProcessingStatusTransition._meta.fields]
+
+
+admin.site.register(PastryType, LookupAdmin)
+admin.site.register(RawMaterialType, LookupAdmin)
+admin.site.register(TimeOfDay, LookupAdmin)
+admin.site.register(PastryRawMaterialBatch)
+admin.site.register(RawMaterial, RawMaterialAdmin)
+admin.site.register(ProcessingStatusTransition, ProcessingStatusTransitionAdmin)
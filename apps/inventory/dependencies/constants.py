@@ -2,3 +2,9 @@ PENDING = "Pending"
 DONE = "Done"
 
 PROCESSING_STATUS: tuple = ((PENDING, "Pending"), (DONE, "Done"))
+
+# Statuses each status may be moved to by a bulk transition
+PROCESSING_STATUS_TRANSITIONS: dict = {PENDING: (DONE,)}
+
+# Bucket sizes of the consumption time series
+SERIES_INTERVALS: tuple = ("hour", "day", "week")
@@ -0,0 +1,80 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from redis.exceptions import RedisError
+
+from apps.commons.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RAW_MATERIALS_CREATED = "raw_materials.created"
+RAW_MATERIALS_TRANSITIONED = "raw_materials.transitioned"
+
+# Every event is appended to one capped stream, whose entry ids are the
+# event ids clients resume from, and published to the channel of each of
+# its subscriptions
+STREAM_KEY = "inventory:events"
+CHANNEL_PREFIX = "inventory:events:"
+ALL = "all"
+
+# Appends the event to the stream and publishes it with its new id, in one
+# round trip and in the same order on every channel
+PUBLISH_SCRIPT = """
+local id = redis.call("XADD", KEYS[1], "MAXLEN", "~", ARGV[1], "*",
+    "event", ARGV[2], "channels", ARGV[3])
+for i = 2, #KEYS do
+    redis.call("PUBLISH", KEYS[i], id .. " " .. ARGV[2])
+end
+return id
+"""
+
+_scripts = {}
+
+
+def subscription(batch=None, pastry_type=None):
+    """Name of the subscription to the events of a batch, of a pastry type or,
+    without either, to every event"""
+    if batch:
+        return f"batch:{batch}"
+    if pastry_type:
+        return f"pastry_type:{pastry_type}"
+    return ALL
+
+
+def channel(name):
+    return f"{CHANNEL_PREFIX}{name}"
+
+
+def publish(event, batch=None, pastry_types=()):
+    """Publish ``event`` once the current transaction commits, so clients
+    never hear of rows that were rolled back"""
+    subscriptions = [ALL]
+    if batch:
+        subscriptions.append(subscription(batch=batch))
+    subscriptions.extend(
+        subscription(pastry_type=pastry_type) for pastry_type in pastry_types
+    )
+    transaction.on_commit(lambda: send(event, subscriptions))
+
+
+def send(event, subscriptions):
+    client = get_redis()
+    script = _scripts.get(client)
+    if script is None:
+        script = _scripts[client] = client.register_script(PUBLISH_SCRIPT)
+    try:
+        script(
+            keys=[STREAM_KEY, *(channel(name) for name in subscriptions)],
+            args=[
+                settings.INVENTORY_EVENTS_STREAM_LENGTH,
+                json.dumps(event, cls=DjangoJSONEncoder),
+                " ".join(subscriptions),
+            ],
+        )
+    except RedisError:
+        # Subscribers resync from the API, the rows themselves are saved
+        logger.warning("Could not publish %s event", event["type"], exc_info=True)
@@ -0,0 +1,262 @@
+"""Server-sent events feed of inventory changes.
+
+Served straight from ``core/asgi.py``: Django 4.1 cannot stream a response
+from an async view, and every open feed would otherwise hold a worker
+thread. Each client costs one Redis pub/sub connection, and its token is
+checked again, mostly from the token cache, every
+``INVENTORY_EVENTS_HEARTBEAT`` seconds.
+"""
+import asyncio
+import binascii
+import json
+import time
+import uuid
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections
+
+import redis.asyncio as redis
+from asgiref.sync import sync_to_async
+from knox.crypto import hash_token
+from rest_framework import exceptions
+
+from apps.inventory import events
+from apps.users.authentication import CachedTokenAuthentication
+
+FEED_PATH = "/inventory/events/"
+TICKET_SALT = "apps.inventory.feed.ticket"
+
+
+def stream_id(value):
+    """``<ms>-<seq>`` stream id as a comparable tuple, None when invalid"""
+    try:
+        milliseconds, sequence = value.split("-")
+        return int(milliseconds), int(sequence)
+    except (AttributeError, ValueError):
+        return None
+
+
+def sse(data, event_id=None, event=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def make_ticket(auth_token):
+    """Signed ticket standing in for ``auth_token`` in the feed URL, where
+    a browser ``EventSource`` cannot send headers. It holds the token digest
+    only, and expires after ``INVENTORY_EVENTS_TICKET_MAX_AGE`` seconds, so
+    one found in an access log is of little use"""
+    return signing.dumps({"digest": auth_token.digest}, salt=TICKET_SALT)
+
+
+def read_ticket(ticket):
+    """Token digest of ``ticket``, or None when it is tampered with or
+    expired"""
+    try:
+        payload = signing.loads(
+            ticket, salt=TICKET_SALT, max_age=settings.INVENTORY_EVENTS_TICKET_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    return payload["digest"]
+
+
+def token_digest(token):
+    try:
+        return hash_token(token)
+    except (TypeError, binascii.Error):
+        return None
+
+
+@sync_to_async
+def authenticate(digest):
+    """User of the knox token with ``digest``, or None when the token is
+    gone, expired or its user inactive"""
+    # Outside of Django's request cycle, so reuse and close the connection of
+    # the sync thread the way request_started and request_finished do
+    close_old_connections()
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_digest(digest)
+        return user
+    except exceptions.AuthenticationFailed:
+        return None
+    finally:
+        close_old_connections()
+
+
+def parse_request(scope):
+    """``(token digest, subscription, last event id)`` of a feed request,
+    or an error message. The digest is None without valid credentials"""
+    query = {
+        key: values[-1]
+        for key, values in parse_qs(scope["query_string"].decode()).items()
+    }
+    headers = {key.decode().lower(): value.decode() for key, value in scope["headers"]}
+
+    digest = None
+    authorization = headers.get("authorization", "").split()
+    if len(authorization) == 2 and authorization[0].lower() == "token":
+        digest = token_digest(authorization[1])
+    elif "ticket" in query:
+        digest = read_ticket(query["ticket"])
+
+    filters = {}
+    for field in ("batch", "pastry_type"):
+        if field in query:
+            try:
+                filters[field] = uuid.UUID(query[field])
+            except ValueError:
+                return f"{field} must be a valid UUID"
+    if len(filters) > 1:
+        return "Subscribe to either a batch or a pastry type"
+
+    # EventSource sends Last-Event-ID by itself when it reconnects
+    last_event_id = headers.get("last-event-id") or query.get("last_event_id")
+    if last_event_id and stream_id(last_event_id) is None:
+        return "last_event_id must be an event id"
+    return digest, events.subscription(**filters), last_event_id
+
+
+async def send_error(send, status, message):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send(
+        {"type": "http.response.body", "body": json.dumps({"error": message}).encode()}
+    )
+
+
+async def replay(client, subscription, last_event_id):
+    """SSE messages for the events of ``subscription`` after
+    ``last_event_id``, or a single ``reset`` event when some of them were
+    already trimmed from the stream or there are too many to replay, after
+    which the client reloads from the API"""
+    reset = [sse("{}", event="reset")]
+    oldest = await client.xrange(events.STREAM_KEY, count=1)
+    if oldest and stream_id(oldest[0][0].decode()) > stream_id(last_event_id):
+        return reset, None
+
+    limit = settings.INVENTORY_EVENTS_REPLAY_LIMIT
+    entries = await client.xrange(
+        events.STREAM_KEY, min=f"({last_event_id}", count=limit + 1
+    )
+    if len(entries) > limit:
+        return reset, None
+
+    messages = []
+    for entry_id, fields in entries:
+        if subscription in fields[b"channels"].decode().split():
+            event = fields[b"event"].decode()
+            messages.append(
+                sse(event, event_id=entry_id.decode(), event=json.loads(event)["type"])
+            )
+    last_id = entries[-1][0].decode() if entries else last_event_id
+    return messages, last_id
+
+
+async def stream(send, digest, subscription, last_event_id):
+    """Send the events of ``subscription`` until the client goes away, or
+    until its token no longer authenticates, e.g. after a logout or when it
+    expires, which ends the response"""
+    client = redis.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        # Subscribed before replaying, so nothing published in between is lost
+        await pubsub.subscribe(events.channel(subscription))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b"retry: 3000\n\n",
+                "more_body": True,
+            }
+        )
+
+        last_id = None
+        if last_event_id:
+            messages, last_event_id = await replay(client, subscription, last_event_id)
+            last_id = last_event_id and stream_id(last_event_id)
+            for message in messages:
+                await send(
+                    {"type": "http.response.body", "body": message, "more_body": True}
+                )
+
+        checked_at = time.monotonic()
+        while True:
+            if time.monotonic() - checked_at >= settings.INVENTORY_EVENTS_HEARTBEAT:
+                if await authenticate(digest) is None:
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+                checked_at = time.monotonic()
+
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=settings.INVENTORY_EVENTS_HEARTBEAT,
+            )
+            if message is None:
+                # Keeps proxies from closing an idle connection
+                body = b": keepalive\n\n"
+            else:
+                event_id, event = message["data"].decode().split(" ", 1)
+                if last_id and stream_id(event_id) <= last_id:
+                    # Already sent by the replay
+                    continue
+                body = sse(event, event_id=event_id, event=json.loads(event)["type"])
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        await pubsub.close()
+        await client.close()
+
+
+async def inventory_feed(scope, receive, send):
+    """ASGI app of the feed. Subscribe with ``?batch=<id>`` or
+    ``?pastry_type=<id>``, or to every event without either, and resume with
+    ``Last-Event-ID`` or ``?last_event_id=``. The knox token goes in the
+    Authorization header or, for EventSource, a ticket from
+    ``inventory/events/tickets/`` goes in ``?ticket=``"""
+    if scope["method"] != "GET":
+        return await send_error(send, 405, "Method not allowed")
+    parsed = parse_request(scope)
+    if isinstance(parsed, str):
+        return await send_error(send, 400, parsed)
+    digest, subscription, last_event_id = parsed
+    if not digest or await authenticate(digest) is None:
+        return await send_error(send, 401, "Invalid token.")
+
+    async def wait_for_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    streaming = asyncio.ensure_future(stream(send, digest, subscription, last_event_id))
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    done, pending = await asyncio.wait(
+        (streaming, disconnected), return_when=asyncio.FIRST_COMPLETED
+    )
+    for task in pending:
+        task.cancel()
+    # Lets the cancelled stream close its Redis connection before returning
+    await asyncio.gather(*pending, return_exceptions=True)
+    # Surfaces errors of the stream, e.g. Redis going away
+    if streaming in done:
+        streaming.result()
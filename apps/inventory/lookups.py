@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.inventory.models import PastryType, RawMaterialType, TimeOfDay
+
+LOOKUP_FIELDS = ("pkid", "id", "name")
+UNIQUE_FIELDS = ("pkid", "id")
+
+
+class LookupCache:
+
+    """Read-through cache for a small lookup table.
+
+    Rows are stored as ``{"pkid", "id", "name"}`` dicts under one key per
+    lookup field. Reads go to a per-process LRU first, then to the shared
+    cache (Redis) and only then to the database. Saves and deletes drop the
+    row from the shared cache and the local LRU of the process that made the
+    change once they commit; other processes pick the change up once their
+    local entry expires after ``INVENTORY_LOOKUP_LOCAL_TTL`` seconds.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.prefix = f"inventory:lookup:{model._meta.model_name}"
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # Shared per process, serializer fields deep copy their arguments
+        return self
+
+    def key(self, field, value):
+        return f"{self.prefix}:{field}:{value}"
+
+    def _get_local(self, key):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry
+
+    def _set_local(self, key, entry):
+        expires_at = time.monotonic() + settings.INVENTORY_LOOKUP_LOCAL_TTL
+        with self._lock:
+            self._local[key] = (expires_at, entry)
+            self._local.move_to_end(key)
+            while len(self._local) > settings.INVENTORY_LOOKUP_LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def _store(self, entries, fetched_by):
+        # Names are not unique, so a name key is only written from a read by
+        # name, which sees every row of that name and keeps the oldest one
+        fields = LOOKUP_FIELDS if fetched_by == "name" else UNIQUE_FIELDS
+        keyed = {
+            self.key(field, entry[field]): entry
+            for entry in entries
+            for field in fields
+        }
+        if not keyed:
+            # Redis rejects an MSET without keys
+            return
+        cache.set_many(keyed, settings.INVENTORY_LOOKUP_CACHE_TIMEOUT)
+        for key, entry in keyed.items():
+            self._set_local(key, entry)
+
+    def get(self, field, value):
+        """Return the row whose ``field`` equals ``value`` or None"""
+        return self.get_many(field, [value]).get(value)
+
+    def get_many(self, field, values):
+        """Return a ``{value: row}`` dict for the ``values`` that exist"""
+        found = {}
+        missing = {}
+        for value in set(values):
+            key = self.key(field, value)
+            entry = self._get_local(key)
+            if entry is None:
+                missing[key] = value
+            else:
+                found[value] = entry
+        if not missing:
+            return found
+
+        shared = cache.get_many(missing.keys())
+        for key, entry in shared.items():
+            self._set_local(key, entry)
+            found[missing.pop(key)] = entry
+        if not missing:
+            return found
+
+        entries = list(
+            self.model.objects.filter(**{f"{field}__in": missing.values()})
+            .order_by("-pkid")
+            .values(*LOOKUP_FIELDS)
+        )
+        self._store(entries, field)
+        # Names are not unique, ordering by -pkid lets the oldest row win
+        found.update({entry[field]: entry for entry in entries})
+        return found
+
+    def invalidate(self, *entries):
+        keys = [
+            self.key(field, entry[field])
+            for entry in entries
+            for field in LOOKUP_FIELDS
+        ]
+        if not keys:
+            return
+        cache.delete_many(keys)
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+
+pastry_types = LookupCache(PastryType)
+raw_material_types = LookupCache(RawMaterialType)
+times_of_day = LookupCache(TimeOfDay)
+
+LOOKUP_CACHES = {
+    PastryType: pastry_types,
+    RawMaterialType: raw_material_types,
+    TimeOfDay: times_of_day,
+}
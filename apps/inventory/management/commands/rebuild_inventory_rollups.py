@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.inventory.services import ROLLUPS, rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the raw material rollup tables from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rollup rows written per insert",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, bucket, fields in ROLLUPS:
+            written = rebuild_rollup(
+                model, bucket, fields, batch_size=options["batch_size"]
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt {written} {model._meta.verbose_name} rows")
+            )
@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.inventory.models import (
+    PastryRawMaterialBatch,
+    PastryType,
+    RawMaterialType,
+    TimeOfDay,
+)
+
+
+class Command(BaseCommand):
+    help = "Create lookup rows and batches for the load test and write their ids"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batches",
+            type=int,
+            default=10,
+            help="Number of batches raw materials are written to",
+        )
+        parser.add_argument(
+            "--lookups",
+            type=int,
+            default=5,
+            help="Number of pastry types and raw material types",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmarks/load_test_data.json",
+            help="File the ids are written to, read by benchmarks/locustfile.py",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        lookups = options["lookups"]
+        pastry_types = PastryType.objects.bulk_create(
+            PastryType(name=f"Load test pastry {i}") for i in range(lookups)
+        )
+        raw_material_types = RawMaterialType.objects.bulk_create(
+            RawMaterialType(name=f"Load test material {i}") for i in range(lookups)
+        )
+        times_of_day = TimeOfDay.objects.bulk_create(
+            TimeOfDay(name=name) for name in ("Morning", "Afternoon", "Evening")
+        )
+        batches = PastryRawMaterialBatch.objects.bulk_create(
+            PastryRawMaterialBatch(batch_code=f"LOAD-{i:04d}")
+            for i in range(options["batches"])
+        )
+
+        data = {
+            "pastry_types": [str(row.id) for row in pastry_types],
+            "raw_material_types": [str(row.id) for row in raw_material_types],
+            "times_of_day": [str(row.id) for row in times_of_day],
+            "batches": [str(row.id) for row in batches],
+        }
+        with open(options["output"], "w") as output:
+            json.dump(data, output, indent=2)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote load test ids to {options['output']}")
+        )
@@ -0,0 +1,83 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:24
+
+import uuid
+
+from django.db import migrations, models
+from django.db.models import F
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def backfill_raw_materials(apps, schema_editor):
+    """Give existing raw materials a UUID, and the creation time of their
+    batch as created_at, the closest record of when they arrived. UUIDs are
+    made in Python on every backend, as gen_random_uuid() needs PostgreSQL 13
+    or pgcrypto"""
+    RawMaterial = apps.get_model("inventory", "RawMaterial")
+    last_pkid = 0
+    while True:
+        raw_materials = list(
+            RawMaterial.objects.filter(pkid__gt=last_pkid)
+            .annotate(batch_created_at=F("batch__created_at"))
+            .only("pkid")
+            .order_by("pkid")[:BACKFILL_BATCH_SIZE]
+        )
+        if not raw_materials:
+            return
+        for raw_material in raw_materials:
+            raw_material.id = uuid.uuid4()
+            raw_material.created_at = raw_material.batch_created_at
+        RawMaterial.objects.bulk_update(raw_materials, ["id", "created_at"])
+        last_pkid = raw_materials[-1].pkid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="rawmaterial",
+            old_name="id",
+            new_name="pkid",
+        ),
+        migrations.AlterField(
+            model_name="rawmaterial",
+            name="pkid",
+            field=models.BigAutoField(
+                editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="rawmaterial",
+            name="id",
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="rawmaterial",
+            name="created_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_raw_materials, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="rawmaterial",
+            name="id",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="rawmaterial",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AddField(
+            model_name="rawmaterial",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterModelOptions(
+            name="rawmaterial",
+            options={"ordering": ["-created_at", "-updated_at"]},
+        ),
+    ]
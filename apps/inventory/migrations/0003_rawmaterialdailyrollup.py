@@ -0,0 +1,92 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    # Against the historical models only, the services module follows the
+    # current ones
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncDate
+
+    RawMaterial = apps.get_model("inventory", "RawMaterial")
+    RawMaterialDailyRollup = apps.get_model("inventory", "RawMaterialDailyRollup")
+    totals = (
+        RawMaterial.objects.annotate(day=TruncDate("created_at"))
+        .values("day", "pastry_type_id", "raw_material_type_id", "time_of_day_id")
+        .annotate(
+            total_weight=Sum("weight"),
+            total_cost=Sum("cost"),
+            row_count=Count("pkid"),
+        )
+        .order_by()
+    )
+    RawMaterialDailyRollup.objects.all().delete()
+    RawMaterialDailyRollup.objects.bulk_create(
+        (RawMaterialDailyRollup(**row) for row in totals.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0002_rawmaterial_timestamped_uuid"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RawMaterialDailyRollup",
+            fields=[
+                (
+                    "pkid",
+                    models.BigAutoField(
+                        editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("day", models.DateField()),
+                ("total_weight", models.FloatField(default=0)),
+                ("total_cost", models.FloatField(default=0)),
+                ("row_count", models.PositiveIntegerField(default=0)),
+                (
+                    "pastry_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.RESTRICT,
+                        to="inventory.pastrytype",
+                    ),
+                ),
+                (
+                    "raw_material_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.RESTRICT,
+                        to="inventory.rawmaterialtype",
+                    ),
+                ),
+                (
+                    "time_of_day",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.RESTRICT,
+                        to="inventory.timeofday",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["day"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="rawmaterialdailyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "pastry_type", "raw_material_type", "time_of_day"),
+                name="unique_raw_material_daily_rollup",
+            ),
+        ),
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0003_rawmaterialdailyrollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pastryrawmaterialbatch",
+            index=models.Index(
+                fields=["-created_at", "-pkid"], name="batch_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rawmaterial",
+            index=models.Index(
+                fields=["-created_at", "-pkid"], name="raw_material_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rawmaterial",
+            index=models.Index(
+                fields=["batch", "-created_at", "-pkid"], name="raw_material_batch_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rawmaterial",
+            index=models.Index(
+                fields=["pastry_type", "processing_status", "-created_at", "-pkid"],
+                name="raw_material_pastry_status_idx",
+            ),
+        ),
+    ]
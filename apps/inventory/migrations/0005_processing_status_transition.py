@@ -0,0 +1,88 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("inventory", "0004_rawmaterial_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessingStatusTransition",
+            fields=[
+                (
+                    "pkid",
+                    models.BigAutoField(
+                        editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("filters", models.JSONField(default=dict)),
+                (
+                    "from_status",
+                    models.CharField(
+                        choices=[("Pending", "Pending"), ("Done", "Done")], max_length=7
+                    ),
+                ),
+                (
+                    "to_status",
+                    models.CharField(
+                        choices=[("Pending", "Pending"), ("Done", "Done")], max_length=7
+                    ),
+                ),
+                ("affected_rows", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["-created_at", "-updated_at"],
+                "abstract": False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name="rawmaterial",
+            index=models.Index(
+                condition=models.Q(("processing_status", "Pending")),
+                fields=["-created_at", "-pkid"],
+                name="raw_material_pending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rawmaterial",
+            index=models.Index(
+                condition=models.Q(("processing_status", "Pending")),
+                fields=["batch", "-created_at", "-pkid"],
+                name="raw_material_pending_batch_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="processingstatustransition",
+            name="batch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="inventory.pastryrawmaterialbatch",
+            ),
+        ),
+        migrations.AddField(
+            model_name="processingstatustransition",
+            name="created_by",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0005_processing_status_transition"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="rawmaterial",
+            index=models.Index(
+                condition=models.Q(("processing_status", "Pending")),
+                fields=["time_of_day", "pastry_type"],
+                name="raw_material_pending_count_idx",
+            ),
+        ),
+    ]
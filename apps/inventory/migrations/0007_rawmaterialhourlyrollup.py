@@ -0,0 +1,82 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def backfill_hourly_rollups(apps, schema_editor):
+    # Against the historical models only, the services module follows the
+    # current ones
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncHour
+
+    RawMaterial = apps.get_model("inventory", "RawMaterial")
+    RawMaterialHourlyRollup = apps.get_model("inventory", "RawMaterialHourlyRollup")
+    totals = (
+        RawMaterial.objects.annotate(hour=TruncHour("created_at"))
+        .values("hour", "raw_material_type_id")
+        .annotate(
+            total_weight=Sum("weight"),
+            total_cost=Sum("cost"),
+            row_count=Count("pkid"),
+        )
+        .order_by()
+    )
+    RawMaterialHourlyRollup.objects.all().delete()
+    RawMaterialHourlyRollup.objects.bulk_create(
+        (RawMaterialHourlyRollup(**row) for row in totals.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0006_rawmaterial_pending_count_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RawMaterialHourlyRollup",
+            fields=[
+                (
+                    "pkid",
+                    models.BigAutoField(
+                        editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("hour", models.DateTimeField()),
+                ("total_weight", models.FloatField(default=0)),
+                ("total_cost", models.FloatField(default=0)),
+                ("row_count", models.PositiveIntegerField(default=0)),
+                (
+                    "raw_material_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.RESTRICT,
+                        to="inventory.rawmaterialtype",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["hour"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="rawmaterialhourlyrollup",
+            index=models.Index(fields=["hour"], name="raw_material_hourly_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="rawmaterialhourlyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("raw_material_type", "hour"),
+                name="unique_raw_material_hourly_rollup",
+            ),
+        ),
+        migrations.RunPython(backfill_hourly_rollups, migrations.RunPython.noop),
+    ]
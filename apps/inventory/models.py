@@ -1,8 +1,9 @@
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from apps.commons.models import TimeStampedUUIDModel
-from apps.inventory.dependencies.constants import PROCESSING_STATUS
+from apps.inventory.dependencies.constants import PENDING, PROCESSING_STATUS
 
 
 class PastryType(TimeStampedUUIDModel):
@@ -24,6 +25,9 @@ class PastryRawMaterialBatch(TimeStampedUUIDModel):
 
     class Meta:
         verbose_name_plural = _("Pastry Raw Materials Batches")
+        indexes = [
+            models.Index(fields=["-created_at", "-pkid"], name="batch_created_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.pkid}  {self.batch_code} on {self.created_at}"
@@ -39,7 +43,7 @@ class TimeOfDay(TimeStampedUUIDModel):
         return f"{self.pkid}  {self.name} on {self.created_at}"
 
 
-class RawMaterial(models.Model):
+class RawMaterial(TimeStampedUUIDModel):
     weight = models.FloatField()
     cost = models.FloatField()
     processing_status = models.CharField(choices=PROCESSING_STATUS, max_length=7)
@@ -48,5 +52,102 @@ class RawMaterial(models.Model):
     raw_material_type = models.ForeignKey(RawMaterialType, on_delete=models.RESTRICT)
     batch = models.ForeignKey(PastryRawMaterialBatch, on_delete=models.RESTRICT)
 
+    class Meta(TimeStampedUUIDModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-pkid"], name="raw_material_created_idx"
+            ),
+            models.Index(
+                fields=["batch", "-created_at", "-pkid"],
+                name="raw_material_batch_idx",
+            ),
+            models.Index(
+                fields=["pastry_type", "processing_status", "-created_at", "-pkid"],
+                name="raw_material_pastry_status_idx",
+            ),
+            # Pending rows are the few still in flight, so these stay small
+            # however long the history gets
+            models.Index(
+                fields=["-created_at", "-pkid"],
+                name="raw_material_pending_idx",
+                condition=models.Q(processing_status=PENDING),
+            ),
+            models.Index(
+                fields=["batch", "-created_at", "-pkid"],
+                name="raw_material_pending_batch_idx",
+                condition=models.Q(processing_status=PENDING),
+            ),
+            models.Index(
+                fields=["time_of_day", "pastry_type"],
+                name="raw_material_pending_count_idx",
+                condition=models.Q(processing_status=PENDING),
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.pkid}  {self.batch} on {self.created_at}"
+
+
+class RawMaterialDailyRollup(TimeStampedUUIDModel):
+    day = models.DateField()
+    pastry_type = models.ForeignKey(PastryType, on_delete=models.RESTRICT)
+    time_of_day = models.ForeignKey(TimeOfDay, on_delete=models.RESTRICT)
+    raw_material_type = models.ForeignKey(RawMaterialType, on_delete=models.RESTRICT)
+    total_weight = models.FloatField(default=0)
+    total_cost = models.FloatField(default=0)
+    row_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "pastry_type", "raw_material_type", "time_of_day"],
+                name="unique_raw_material_daily_rollup",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.pkid}  {self.raw_material_type} for {self.pastry_type} on {self.day}"
+
+
+class RawMaterialHourlyRollup(TimeStampedUUIDModel):
+    hour = models.DateTimeField()
+    raw_material_type = models.ForeignKey(RawMaterialType, on_delete=models.RESTRICT)
+    total_weight = models.FloatField(default=0)
+    total_cost = models.FloatField(default=0)
+    row_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["hour"]
+        indexes = [models.Index(fields=["hour"], name="raw_material_hourly_idx")]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["raw_material_type", "hour"],
+                name="unique_raw_material_hourly_rollup",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.pkid}  {self.raw_material_type} at {self.hour}"
+
+
+class ProcessingStatusTransition(TimeStampedUUIDModel):
+
+    """Audit row of one bulk processing status transition, however many raw
+    materials it moved"""
+
+    batch = models.ForeignKey(
+        PastryRawMaterialBatch, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    filters = models.JSONField(default=dict)
+    from_status = models.CharField(choices=PROCESSING_STATUS, max_length=7)
+    to_status = models.CharField(choices=PROCESSING_STATUS, max_length=7)
+    affected_rows = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL
+    )
+
+    def __str__(self) -> str:
+        return (
+            f"{self.pkid}  {self.from_status} to {self.to_status} on {self.created_at}"
+        )
@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from redis.exceptions import RedisError
+
+from apps.commons.redis_client import get_redis
+from apps.inventory.dependencies.constants import PENDING
+from apps.inventory.models import RawMaterial
+
+logger = logging.getLogger(__name__)
+
+COUNTS_KEY = "inventory:pending:counts"
+RECONCILED_AT_KEY = "inventory:pending:reconciled-at"
+RECONCILE_LOCK_KEY = "inventory:pending:reconcile-lock"
+
+# Pending raw materials are counted per (time of day, pastry type) pkids
+COUNTED_FIELDS = ("time_of_day_id", "pastry_type_id")
+
+
+def pending_key(raw_material):
+    """Counter ``raw_material`` adds to, or None when it is not pending"""
+    if raw_material.processing_status != PENDING:
+        return None
+    return tuple(getattr(raw_material, field) for field in COUNTED_FIELDS)
+
+
+def pending_deltas(added=(), removed=()):
+    """Fold the counter keys of raw materials that became and stopped being
+    pending into one delta per counter"""
+    deltas = Counter(key for key in added if key)
+    deltas.subtract(key for key in removed if key)
+    return deltas
+
+
+def adjust_pending_counts(deltas):
+    """Add ``deltas`` to the counters once the current transaction commits,
+    so rolled back writes never reach them"""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: increment(deltas))
+
+
+def increment(deltas):
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            for key, delta in deltas.items():
+                pipe.hincrby(COUNTS_KEY, counter_field(key), delta)
+            pipe.execute()
+    except RedisError:
+        # The next reconciliation puts the counters right
+        logger.warning("Could not update the pending counters", exc_info=True)
+
+
+def request_reconciliation():
+    """Have the next read reconcile the counters, for writes whose effect on
+    them is not known exactly"""
+
+    def expire():
+        try:
+            get_redis().delete(RECONCILED_AT_KEY)
+        except RedisError:
+            logger.warning("Could not expire the pending counters", exc_info=True)
+
+    transaction.on_commit(expire)
+
+
+def counter_field(key):
+    return ":".join(str(pkid) for pkid in key)
+
+
+def pending_counts_from_database():
+    """Pending raw materials per counter, counted through the partial index
+    on pending rows"""
+    rows = (
+        RawMaterial.objects.filter(processing_status=PENDING)
+        .values_list(*COUNTED_FIELDS)
+        .annotate(pending=Count("pkid"))
+        .order_by()
+    )
+    return {tuple(key): pending for *key, pending in rows}
+
+
+def reconcile_pending_counts():
+    """Replace the counters with the counts in the database.
+
+    Counter updates committed between the count and the write are lost until
+    the next reconciliation, which is what bounds how stale the counters can
+    get.
+    """
+    counts = pending_counts_from_database()
+    reconciled_at = time.time()
+    with get_redis().pipeline() as pipe:
+        pipe.delete(COUNTS_KEY)
+        if counts:
+            pipe.hset(
+                COUNTS_KEY,
+                mapping={counter_field(key): count for key, count in counts.items()},
+            )
+        pipe.set(RECONCILED_AT_KEY, reconciled_at)
+        pipe.execute()
+    return counts, reconciled_at
+
+
+def read_pending_counts():
+    """``(counts, reconciled_at)`` from Redis, with ``counts`` mapping
+    ``(time_of_day pkid, pastry_type pkid)`` to the number of pending raw
+    materials.
+
+    Counters last reconciled more than INVENTORY_PENDING_COUNTS_MAX_AGE
+    seconds ago, e.g. while celery beat is down, are reconciled first by the
+    one request that takes the reconciliation lock.
+    """
+    client = get_redis()
+    with client.pipeline(transaction=False) as pipe:
+        pipe.hgetall(COUNTS_KEY)
+        pipe.get(RECONCILED_AT_KEY)
+        counters, reconciled_at = pipe.execute()
+
+    max_age = settings.INVENTORY_PENDING_COUNTS_MAX_AGE
+    if reconciled_at is None or time.time() - float(reconciled_at) > max_age:
+        if client.set(RECONCILE_LOCK_KEY, 1, nx=True, ex=max_age):
+            try:
+                return reconcile_pending_counts()
+            finally:
+                client.delete(RECONCILE_LOCK_KEY)
+
+    counts = {
+        tuple(int(pkid) for pkid in field.split(b":")): int(count)
+        for field, count in counters.items()
+        if int(count)
+    }
+    return counts, reconciled_at and float(reconciled_at)
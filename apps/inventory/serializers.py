@@ -0,0 +1,264 @@
+from django.conf import settings
+
+from rest_framework import serializers
+
+from apps.inventory.dependencies.constants import (
+    DONE,
+    PENDING,
+    PROCESSING_STATUS,
+    PROCESSING_STATUS_TRANSITIONS,
+    SERIES_INTERVALS,
+)
+from apps.inventory.lookups import pastry_types, raw_material_types, times_of_day
+from apps.inventory.models import (
+    PastryRawMaterialBatch,
+    ProcessingStatusTransition,
+    RawMaterial,
+    RawMaterialDailyRollup,
+)
+
+
+class CachedLookupField(serializers.ReadOnlyField):
+
+    """Renders a lookup table foreign key from the lookup cache instead of
+    joining or fetching the related row"""
+
+    def __init__(self, lookup_cache, slug_field, **kwargs):
+        self.lookup_cache = lookup_cache
+        self.slug_field = slug_field
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return getattr(instance, f"{self.source}_id")
+
+    def to_representation(self, value):
+        entry = self.lookup_cache.get("pkid", value)
+        return entry[self.slug_field] if entry else None
+
+
+class RawMaterialRowSerializer(serializers.Serializer):
+
+    """Validates a single raw material row of a bulk ingestion payload.
+    Related lookup rows are referenced by their public UUID"""
+
+    weight = serializers.FloatField(min_value=0)
+    cost = serializers.FloatField(min_value=0)
+    processing_status = serializers.ChoiceField(
+        choices=PROCESSING_STATUS, default=PENDING
+    )
+    pastry_type = serializers.UUIDField()
+    time_of_day = serializers.UUIDField()
+    raw_material_type = serializers.UUIDField()
+
+
+class RawMaterialExportFilterSerializer(serializers.Serializer):
+
+    """Query parameters accepted by the raw material export"""
+
+    export_format = serializers.ChoiceField(choices=("csv", "ndjson"), default="csv")
+    created_after = serializers.DateField(required=False)
+    created_before = serializers.DateField(required=False)
+    batch = serializers.UUIDField(required=False)
+
+    def validate(self, attrs):
+        created_after = attrs.get("created_after")
+        created_before = attrs.get("created_before")
+        if created_after and created_before and created_after > created_before:
+            raise serializers.ValidationError(
+                "created_after must be on or before created_before"
+            )
+        return attrs
+
+
+class DailyRollupFilterSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+
+    def validate(self, attrs):
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must be on or before end")
+        return attrs
+
+
+class ReportWindowSerializer(DailyRollupFilterSerializer):
+
+    """Report window at most as many days long as the ``max_days_setting``
+    setting says"""
+
+    max_days_setting = None
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        max_days = getattr(settings, self.max_days_setting)
+        if (attrs["end"] - attrs["start"]).days >= max_days:
+            raise serializers.ValidationError(
+                f"The window cannot be longer than {max_days} days"
+            )
+        return attrs
+
+
+class BatchCostingFilterSerializer(ReportWindowSerializer):
+    max_days_setting = "INVENTORY_COSTING_MAX_DAYS"
+
+
+class RawMaterialDailyRollupSerializer(serializers.ModelSerializer):
+    pastry_type = CachedLookupField(pastry_types, "name")
+    raw_material_type = CachedLookupField(raw_material_types, "name")
+    time_of_day = CachedLookupField(times_of_day, "name")
+
+    class Meta:
+        model = RawMaterialDailyRollup
+        fields = (
+            "day",
+            "pastry_type",
+            "raw_material_type",
+            "time_of_day",
+            "total_weight",
+            "total_cost",
+            "row_count",
+        )
+
+
+class PastryRawMaterialBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PastryRawMaterialBatch
+        fields = ("id", "batch_code", "created_at", "updated_at")
+
+
+class RawMaterialSerializer(serializers.ModelSerializer):
+    batch = serializers.SlugRelatedField(slug_field="id", read_only=True)
+    pastry_type = CachedLookupField(pastry_types, "id")
+    raw_material_type = CachedLookupField(raw_material_types, "id")
+    time_of_day = CachedLookupField(times_of_day, "id")
+
+    class Meta:
+        model = RawMaterial
+        fields = (
+            "id",
+            "batch",
+            "pastry_type",
+            "raw_material_type",
+            "time_of_day",
+            "weight",
+            "cost",
+            "processing_status",
+            "created_at",
+            "updated_at",
+        )
+
+
+class RawMaterialListFilterSerializer(serializers.Serializer):
+    batch = serializers.UUIDField(required=False)
+    pastry_type = serializers.UUIDField(required=False)
+    processing_status = serializers.ChoiceField(
+        choices=PROCESSING_STATUS, required=False
+    )
+
+
+class LookupUUIDField(serializers.UUIDField):
+
+    """UUID of a lookup row, validated against the lookup cache and returned
+    as its cache entry"""
+
+    def __init__(self, lookup_cache, **kwargs):
+        self.lookup_cache = lookup_cache
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        entry = self.lookup_cache.get("id", value)
+        if entry is None:
+            raise serializers.ValidationError(f"{value} does not exist")
+        return entry
+
+
+class RawMaterialTransitionSerializer(serializers.Serializer):
+
+    """Raw materials moved by a bulk processing status transition. At least
+    one filter is required so a single request cannot move every row"""
+
+    from_status = serializers.ChoiceField(choices=PROCESSING_STATUS, default=PENDING)
+    to_status = serializers.ChoiceField(choices=PROCESSING_STATUS, default=DONE)
+    batch = serializers.SlugRelatedField(
+        slug_field="id",
+        queryset=PastryRawMaterialBatch.objects.only("pkid", "id"),
+        required=False,
+    )
+    pastry_type = LookupUUIDField(pastry_types, required=False)
+    time_of_day = LookupUUIDField(times_of_day, required=False)
+    raw_material_type = LookupUUIDField(raw_material_types, required=False)
+    created_after = serializers.DateField(required=False)
+    created_before = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs["to_status"] not in PROCESSING_STATUS_TRANSITIONS.get(
+            attrs["from_status"], ()
+        ):
+            raise serializers.ValidationError(
+                f"Cannot move raw materials from {attrs['from_status']} "
+                f"to {attrs['to_status']}"
+            )
+        if set(attrs) <= {"from_status", "to_status"}:
+            raise serializers.ValidationError("At least one filter is required")
+        created_after = attrs.get("created_after")
+        created_before = attrs.get("created_before")
+        if created_after and created_before and created_after > created_before:
+            raise serializers.ValidationError(
+                "created_after must be on or before created_before"
+            )
+        return attrs
+
+
+class ProcessingStatusTransitionSerializer(serializers.ModelSerializer):
+    batch = serializers.SlugRelatedField(slug_field="id", read_only=True)
+
+    class Meta:
+        model = ProcessingStatusTransition
+        fields = (
+            "id",
+            "batch",
+            "filters",
+            "from_status",
+            "to_status",
+            "affected_rows",
+            "created_at",
+        )
+
+
+class PendingCountSerializer(serializers.Serializer):
+    time_of_day = serializers.UUIDField()
+    time_of_day_name = serializers.CharField()
+    pastry_type = serializers.UUIDField()
+    pastry_type_name = serializers.CharField()
+    pending = serializers.IntegerField()
+
+
+class PendingCountsSerializer(serializers.Serializer):
+
+    """Pending counters with the time they were last reconciled with the
+    database and the most seconds that can go by between reconciliations"""
+
+    reconciled_at = serializers.DateTimeField(allow_null=True)
+    max_age = serializers.IntegerField()
+    counts = PendingCountSerializer(many=True)
+
+
+class ConsumptionSeriesFilterSerializer(ReportWindowSerializer):
+
+    """Bucket size and raw material types of the consumption series. Every
+    raw material type is included when none is given"""
+
+    max_days_setting = "INVENTORY_SERIES_MAX_DAYS"
+
+    interval = serializers.ChoiceField(choices=SERIES_INTERVALS, default="day")
+    raw_material_type = serializers.ListField(
+        child=LookupUUIDField(raw_material_types), required=False
+    )
+
+
+class FeedTicketSerializer(serializers.Serializer):
+
+    """Ticket to open the events feed with, and the seconds it is valid for"""
+
+    ticket = serializers.CharField()
+    expires_in = serializers.IntegerField()
@@ -0,0 +1,588 @@
+import csv
+import json
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+import numpy as np
+
+from apps.inventory import events
+from apps.inventory.dependencies.constants import PENDING
+from apps.inventory.lookups import LOOKUP_CACHES, pastry_types, raw_material_types
+from apps.inventory.models import (
+    PastryRawMaterialBatch,
+    PastryType,
+    ProcessingStatusTransition,
+    RawMaterial,
+    RawMaterialDailyRollup,
+    RawMaterialHourlyRollup,
+    RawMaterialType,
+    TimeOfDay,
+)
+from apps.inventory.pending import (
+    COUNTED_FIELDS,
+    adjust_pending_counts,
+    pending_deltas,
+    pending_key,
+    request_reconciliation,
+)
+from apps.inventory.serializers import RawMaterialRowSerializer
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_MODELS = {
+    "pastry_type": PastryType,
+    "time_of_day": TimeOfDay,
+    "raw_material_type": RawMaterialType,
+}
+
+
+def ingest_raw_materials(batch, rows):
+    """Validate ``rows`` and insert the valid ones into ``batch``.
+
+    Every lookup type is resolved through its lookup cache, with at most one
+    query per type for the ids missing from it, and the inserts go through
+    ``bulk_create`` in chunks of ``INVENTORY_BULK_CREATE_BATCH_SIZE``. Invalid
+    rows are reported by their position in the payload and never prevent the
+    valid rows from being saved.
+    """
+    errors = []
+    validated_rows = []
+    for index, row in enumerate(rows):
+        serializer = RawMaterialRowSerializer(data=row)
+        if serializer.is_valid():
+            validated_rows.append((index, serializer.validated_data))
+        else:
+            errors.append({"row": index, "errors": serializer.errors})
+
+    lookups = {}
+    for field, model in LOOKUP_MODELS.items():
+        ids = {data[field] for _, data in validated_rows}
+        lookups[field] = {
+            lookup_id: entry["pkid"]
+            for lookup_id, entry in LOOKUP_CACHES[model].get_many("id", ids).items()
+        }
+
+    raw_materials = []
+    for index, data in validated_rows:
+        missing = {
+            field: [f"{model._meta.verbose_name} {data[field]} does not exist"]
+            for field, model in LOOKUP_MODELS.items()
+            if data[field] not in lookups[field]
+        }
+        if missing:
+            errors.append({"row": index, "errors": missing})
+            continue
+        raw_materials.append(
+            RawMaterial(
+                weight=data["weight"],
+                cost=data["cost"],
+                processing_status=data["processing_status"],
+                pastry_type_id=lookups["pastry_type"][data["pastry_type"]],
+                time_of_day_id=lookups["time_of_day"][data["time_of_day"]],
+                raw_material_type_id=lookups["raw_material_type"][
+                    data["raw_material_type"]
+                ],
+                batch=batch,
+            )
+        )
+
+    RawMaterial.objects.bulk_create(
+        raw_materials, batch_size=settings.INVENTORY_BULK_CREATE_BATCH_SIZE
+    )
+    update_rollups(added=[raw_material_rollup_values(rm) for rm in raw_materials])
+    adjust_pending_counts(pending_deltas(pending_key(rm) for rm in raw_materials))
+    publish_created(batch, raw_materials)
+    errors.sort(key=lambda error: error["row"])
+
+    return {"created": len(raw_materials), "errors": errors}
+
+
+EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("created_at", "created_at"),
+    ("batch", "batch__batch_code"),
+    ("pastry_type", "pastry_type__name"),
+    ("raw_material_type", "raw_material_type__name"),
+    ("time_of_day", "time_of_day__name"),
+    ("weight", "weight"),
+    ("cost", "cost"),
+    ("processing_status", "processing_status"),
+)
+
+
+class Echo:
+
+    """File-like object that hands back whatever is written to it, so
+    ``csv.writer`` can produce one line at a time for a streaming response"""
+
+    def write(self, value):
+        return value
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def raw_material_export_rows(created_after=None, created_before=None, batch=None):
+    """Yield raw material rows as tuples in ``EXPORT_COLUMNS`` order.
+
+    Rows are read with ``values_list`` through a server-side cursor so that
+    memory use stays flat regardless of the size of the export.
+    """
+    queryset = RawMaterial.objects.all()
+    if created_after:
+        queryset = queryset.filter(created_at__gte=_start_of_day(created_after))
+    if created_before:
+        queryset = queryset.filter(
+            created_at__lt=_start_of_day(created_before + timedelta(days=1))
+        )
+    if batch:
+        queryset = queryset.filter(batch__id=batch)
+
+    return (
+        queryset.order_by("created_at", "pkid")
+        .values_list(*(lookup for _, lookup in EXPORT_COLUMNS))
+        .iterator(chunk_size=settings.INVENTORY_EXPORT_CHUNK_SIZE)
+    )
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), default=str) + "\n"
+
+
+ROLLUP_FIELDS = ("pastry_type_id", "raw_material_type_id", "time_of_day_id")
+
+# Rollup tables kept up to date by every write, with the bucket and the
+# fields their rows are keyed by
+ROLLUPS = (
+    (RawMaterialDailyRollup, "day", ROLLUP_FIELDS),
+    (RawMaterialHourlyRollup, "hour", ("raw_material_type_id",)),
+)
+
+
+# Database function computing each rollup bucket, in the current time zone
+# like raw_material_rollup_values
+BUCKET_FUNCTIONS = {"day": TruncDate, "hour": TruncHour}
+
+
+def rebuild_rollup(model, bucket, fields, batch_size=1000):
+    """Replace the rows of the rollup ``model`` with totals computed in the
+    database from every raw material, and return the number of rows
+    written"""
+    totals = (
+        RawMaterial.objects.annotate(**{bucket: BUCKET_FUNCTIONS[bucket]("created_at")})
+        .values(bucket, *fields)
+        .annotate(
+            total_weight=Sum("weight"),
+            total_cost=Sum("cost"),
+            row_count=Count("pkid"),
+        )
+        .order_by()
+    )
+    model.objects.all().delete()
+    rollups = model.objects.bulk_create(
+        (model(**row) for row in totals.iterator()), batch_size=batch_size
+    )
+    return len(rollups)
+
+
+def raw_material_rollup_values(raw_material):
+    """Return the values of ``raw_material`` that feed the rollups"""
+    created_at = timezone.localtime(raw_material.created_at)
+    return {
+        "day": created_at.date(),
+        "hour": created_at.replace(minute=0, second=0, microsecond=0),
+        "weight": raw_material.weight,
+        "cost": raw_material.cost,
+        **{field: getattr(raw_material, field) for field in ROLLUP_FIELDS},
+    }
+
+
+def rollup_deltas(added=(), removed=(), bucket="day", fields=ROLLUP_FIELDS):
+    """Fold rollup values of added and removed raw materials into one
+    ``(weight, cost, row_count)`` delta per rollup row"""
+    deltas = defaultdict(lambda: [0.0, 0.0, 0])
+    for sign, rows in ((1, added), (-1, removed)):
+        for values in rows:
+            key = (values[bucket], *(values[field] for field in fields))
+            delta = deltas[key]
+            delta[0] += sign * values["weight"]
+            delta[1] += sign * values["cost"]
+            delta[2] += sign
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def apply_rollup_deltas(
+    deltas, model=RawMaterialDailyRollup, bucket="day", fields=ROLLUP_FIELDS
+):
+    """Add ``deltas`` to the rollup rows, creating them when missing and
+    deleting the ones no raw material is counted in anymore"""
+    for (bucket_value, *related_ids), (weight, cost, row_count) in deltas.items():
+        lookup = {bucket: bucket_value, **dict(zip(fields, related_ids))}
+        increments = {
+            "total_weight": F("total_weight") + weight,
+            "total_cost": F("total_cost") + cost,
+            "row_count": F("row_count") + row_count,
+            "updated_at": timezone.now(),
+        }
+        if model.objects.filter(**lookup).update(**increments):
+            if row_count < 0:
+                model.objects.filter(**lookup, row_count=0).delete()
+            continue
+        if row_count <= 0:
+            # Nothing to take the rows away from, the rollup is out of sync
+            logger.warning(
+                "No %s row for %s, run rebuild_inventory_rollups",
+                model._meta.verbose_name,
+                lookup,
+            )
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(
+                    total_weight=weight,
+                    total_cost=cost,
+                    row_count=row_count,
+                    **lookup,
+                )
+        except IntegrityError:
+            model.objects.filter(**lookup).update(**increments)
+
+
+def update_rollups(added=(), removed=()):
+    """Apply the rollup values of added and removed raw materials to every
+    table in ``ROLLUPS``"""
+    for model, bucket, fields in ROLLUPS:
+        apply_rollup_deltas(
+            rollup_deltas(added, removed, bucket, fields), model, bucket, fields
+        )
+
+
+def transition_processing_status(
+    from_status,
+    to_status,
+    user=None,
+    batch=None,
+    created_after=None,
+    created_before=None,
+    **lookups,
+):
+    """Move the raw materials in ``from_status`` that match the filters to
+    ``to_status`` and record the transition in a single audit row.
+
+    The rows are moved by one ``UPDATE ... WHERE processing_status = ...``,
+    so rows a concurrent transition already moved are not counted twice. The
+    pending counters are adjusted by the rows counted just before it, and
+    reconciled instead when the update moved a different number of rows.
+    ``lookups`` map lookup fields to their lookup cache entries.
+    """
+    queryset = RawMaterial.objects.filter(processing_status=from_status)
+    filters = {}
+    if batch is not None:
+        queryset = queryset.filter(batch=batch)
+        filters["batch"] = str(batch.id)
+    for field, entry in lookups.items():
+        queryset = queryset.filter(**{f"{field}_id": entry["pkid"]})
+        filters[field] = str(entry["id"])
+    if created_after:
+        queryset = queryset.filter(created_at__gte=_start_of_day(created_after))
+        filters["created_after"] = created_after.isoformat()
+    if created_before:
+        queryset = queryset.filter(
+            created_at__lt=_start_of_day(created_before + timedelta(days=1))
+        )
+        filters["created_before"] = created_before.isoformat()
+
+    with transaction.atomic():
+        moved = {
+            tuple(key): count
+            for *key, count in queryset.values_list(*COUNTED_FIELDS)
+            .annotate(count=Count("pkid"))
+            .order_by()
+        }
+        affected_rows = queryset.update(
+            processing_status=to_status, updated_at=timezone.now()
+        )
+        if sum(moved.values()) == affected_rows:
+            sign = (to_status == PENDING) - (from_status == PENDING)
+            adjust_pending_counts({key: sign * count for key, count in moved.items()})
+        else:
+            # Rows changed between the count and the update
+            request_reconciliation()
+        transition = ProcessingStatusTransition.objects.create(
+            batch=batch,
+            filters=filters,
+            from_status=from_status,
+            to_status=to_status,
+            affected_rows=affected_rows,
+            created_by=user,
+        )
+
+    if affected_rows:
+        publish_transition(
+            transition, {pastry_type_pkid for _, pastry_type_pkid in moved}
+        )
+    return transition
+
+
+def publish_created(batch, raw_materials):
+    """Publish one created event per pastry type of ``raw_materials``"""
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for raw_material in raw_materials:
+        total = totals[raw_material.pastry_type_id]
+        total[0] += 1
+        total[1] += raw_material.weight
+        total[2] += raw_material.cost
+
+    entries = pastry_types.get_many("pkid", totals)
+    for pastry_type_pkid, (count, weight, cost) in totals.items():
+        pastry_type = entries[pastry_type_pkid]["id"]
+        events.publish(
+            {
+                "type": events.RAW_MATERIALS_CREATED,
+                "batch": batch.id,
+                "pastry_type": pastry_type,
+                "count": count,
+                "weight": weight,
+                "cost": cost,
+            },
+            batch=batch.id,
+            pastry_types=[pastry_type],
+        )
+
+
+def publish_transition(transition, pastry_type_pkids):
+    """Publish ``transition`` to its batch and to the pastry types of the raw
+    materials it moved"""
+    entries = pastry_types.get_many("pkid", pastry_type_pkids)
+    events.publish(
+        {
+            "type": events.RAW_MATERIALS_TRANSITIONED,
+            "transition": transition.id,
+            "batch": transition.batch and transition.batch.id,
+            "from_status": transition.from_status,
+            "to_status": transition.to_status,
+            "affected_rows": transition.affected_rows,
+            "filters": transition.filters,
+        },
+        batch=transition.batch and transition.batch.id,
+        pastry_types=[entry["id"] for entry in entries.values()],
+    )
+
+
+def consumption_series(interval, start, end, raw_material_type=()):
+    """Weight, cost and row count of the raw materials created from ``start``
+    to ``end`` per ``interval`` bucket, as one series per raw material type.
+
+    Hours are read as they are from the hourly rollup. Days are summed over
+    the daily rollup and weeks folded from the days, so the cost depends on
+    the number of buckets and not on the number of raw materials.
+    """
+    if interval == "hour":
+        bucket_field = "hour"
+        rows = RawMaterialHourlyRollup.objects.filter(
+            hour__gte=_start_of_day(start),
+            hour__lt=_start_of_day(end + timedelta(days=1)),
+        ).values_list(
+            "raw_material_type_id", "hour", "total_weight", "total_cost", "row_count"
+        )
+    else:
+        bucket_field = "day"
+        rows = (
+            RawMaterialDailyRollup.objects.filter(day__range=(start, end))
+            .values_list("raw_material_type_id", "day")
+            .annotate(Sum("total_weight"), Sum("total_cost"), Sum("row_count"))
+        )
+    if raw_material_type:
+        rows = rows.filter(
+            raw_material_type_id__in=[entry["pkid"] for entry in raw_material_type]
+        )
+    rows = rows.order_by("raw_material_type_id", bucket_field)
+
+    series = {}
+    for type_pkid, bucket, weight, cost, count in rows:
+        if interval == "week":
+            bucket -= timedelta(days=bucket.weekday())
+        points = series.get(type_pkid)
+        if points is None:
+            points = series[type_pkid] = {
+                "buckets": [],
+                "weight": [],
+                "cost": [],
+                "rows": [],
+            }
+        if points["buckets"] and points["buckets"][-1] == bucket:
+            points["weight"][-1] += weight
+            points["cost"][-1] += cost
+            points["rows"][-1] += count
+            continue
+        points["buckets"].append(bucket)
+        points["weight"].append(weight)
+        points["cost"].append(cost)
+        points["rows"].append(count)
+
+    entries = raw_material_types.get_many("pkid", series)
+    return [
+        {
+            "raw_material_type": entries.get(type_pkid, {}).get("id"),
+            "name": entries.get(type_pkid, {}).get("name"),
+            **points,
+        }
+        for type_pkid, points in series.items()
+    ]
+
+
+COSTING_COLUMNS = np.dtype(
+    [
+        ("batch_id", np.int64),
+        ("raw_material_type_id", np.int64),
+        ("weight", np.float64),
+        ("cost", np.float64),
+    ]
+)
+COST_PER_KG_PERCENTILES = (50, 90)
+
+
+def costing_columns(start, end):
+    """Batch, raw material type, weight and cost of the raw materials created
+    from ``start`` to ``end`` (inclusive) as one structured array, without
+    building a model instance or a dict per row"""
+    rows = RawMaterial.objects.filter(
+        created_at__gte=_start_of_day(start),
+        created_at__lt=_start_of_day(end + timedelta(days=1)),
+    ).values_list(*COSTING_COLUMNS.names)
+    return np.fromiter(
+        rows.iterator(chunk_size=settings.INVENTORY_EXPORT_CHUNK_SIZE),
+        dtype=COSTING_COLUMNS,
+    )
+
+
+def group_percentiles(codes, values, groups, percentiles):
+    """Linearly interpolated ``percentiles`` of ``values`` within each of the
+    ``groups`` groups numbered by ``codes``, NaN for groups without values.
+    One sort covers every group and percentile"""
+    order = np.lexsort((values, codes))
+    values = values[order]
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.cumsum(counts) - counts
+    present = counts > 0
+    result = np.full((groups, len(percentiles)), np.nan)
+    for column, percentile in enumerate(percentiles):
+        position = starts[present] + (counts[present] - 1) * percentile / 100
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        result[present, column] = values[lower] + (values[upper] - values[lower]) * (
+            position - lower
+        )
+    return result
+
+
+def _finite(value):
+    return value if math.isfinite(value) else None
+
+
+def batch_costing(start, end):
+    """Cost and weight totals of every batch with raw materials created from
+    ``start`` to ``end``, with cost per kg percentiles over its rows and a
+    breakdown by raw material type.
+
+    Rows are grouped by array position codes from ``np.unique`` and summed
+    with ``np.bincount``, so the work per row happens in NumPy and Python only
+    loops over the batches when building the response.
+    """
+    columns = costing_columns(start, end)
+    batch_pkids, batch_codes = np.unique(columns["batch_id"], return_inverse=True)
+    type_pkids, type_codes = np.unique(
+        columns["raw_material_type_id"], return_inverse=True
+    )
+    batches, types = len(batch_pkids), len(type_pkids)
+    weight, cost = columns["weight"], columns["cost"]
+
+    rows = np.bincount(batch_codes, minlength=batches)
+    total_weight = np.bincount(batch_codes, weights=weight, minlength=batches)
+    total_cost = np.bincount(batch_codes, weights=cost, minlength=batches)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cost_per_kg = total_cost / total_weight
+        weighed = weight > 0
+        unit_costs = group_percentiles(
+            batch_codes[weighed],
+            cost[weighed] / weight[weighed],
+            batches,
+            COST_PER_KG_PERCENTILES,
+        )
+
+    # One cell per (batch, raw material type) pair
+    pairs = batch_codes * types + type_codes
+    shape = (batches, types)
+    type_rows = np.bincount(pairs, minlength=batches * types).reshape(shape)
+    type_weight = np.bincount(pairs, weights=weight, minlength=batches * types)
+    type_cost = np.bincount(pairs, weights=cost, minlength=batches * types)
+    type_weight, type_cost = type_weight.reshape(shape), type_cost.reshape(shape)
+
+    batch_ids = dict(
+        PastryRawMaterialBatch.objects.filter(
+            pkid__in=batch_pkids.tolist()
+        ).values_list("pkid", "id")
+    )
+    entries = raw_material_types.get_many("pkid", type_pkids.tolist())
+    type_entries = [entries.get(pkid, {}) for pkid in type_pkids.tolist()]
+
+    # Python floats from here on, indexing NumPy arrays one cell at a time
+    # would cost more than the grouping itself
+    rows, total_weight, total_cost = (
+        rows.tolist(),
+        total_weight.tolist(),
+        total_cost.tolist(),
+    )
+    cost_per_kg, unit_costs = cost_per_kg.tolist(), unit_costs.tolist()
+    type_rows, type_weight, type_cost = (
+        type_rows.tolist(),
+        type_weight.tolist(),
+        type_cost.tolist(),
+    )
+
+    results = []
+    for code, batch_pkid in enumerate(batch_pkids.tolist()):
+        results.append(
+            {
+                "batch": batch_ids.get(batch_pkid),
+                "rows": rows[code],
+                "total_weight": total_weight[code],
+                "total_cost": total_cost[code],
+                "mean_cost": total_cost[code] / rows[code],
+                "cost_per_kg": _finite(cost_per_kg[code]),
+                **{
+                    f"cost_per_kg_p{percentile}": _finite(unit_costs[code][column])
+                    for column, percentile in enumerate(COST_PER_KG_PERCENTILES)
+                },
+                "raw_material_types": [
+                    {
+                        "raw_material_type": type_entries[column].get("id"),
+                        "name": type_entries[column].get("name"),
+                        "rows": count,
+                        "total_weight": type_weight[code][column],
+                        "total_cost": type_cost[code][column],
+                    }
+                    for column, count in enumerate(type_rows[code])
+                    if count
+                ],
+            }
+        )
+    return results
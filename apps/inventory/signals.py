@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.inventory.lookups import LOOKUP_CACHES, LOOKUP_FIELDS
+from apps.inventory.models import RawMaterial
+from apps.inventory.pending import adjust_pending_counts, pending_deltas, pending_key
+from apps.inventory.services import (
+    ROLLUP_FIELDS,
+    publish_created,
+    raw_material_rollup_values,
+    update_rollups,
+)
+
+
+@receiver(pre_save, sender=RawMaterial)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    instance._previous_rollup_values = None
+    instance._previous_pending_key = None
+    if raw or instance._state.adding:
+        return
+    previous = (
+        RawMaterial.objects.filter(pk=instance.pk)
+        .only("created_at", "weight", "cost", "processing_status", *ROLLUP_FIELDS)
+        .first()
+    )
+    if previous:
+        instance._previous_rollup_values = raw_material_rollup_values(previous)
+        instance._previous_pending_key = pending_key(previous)
+
+
+@receiver(post_save, sender=RawMaterial)
+def update_aggregates_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_rollup_values", None)
+    update_rollups(
+        added=[raw_material_rollup_values(instance)],
+        removed=[previous] if previous else [],
+    )
+    adjust_pending_counts(
+        pending_deltas(
+            added=[pending_key(instance)],
+            removed=[getattr(instance, "_previous_pending_key", None)],
+        )
+    )
+    if created:
+        publish_created(instance.batch, [instance])
+
+
+@receiver(post_delete, sender=RawMaterial)
+def update_aggregates_on_delete(sender, instance, **kwargs):
+    update_rollups(removed=[raw_material_rollup_values(instance)])
+    adjust_pending_counts(pending_deltas(removed=[pending_key(instance)]))
+
+
+def lookup_entry(instance):
+    return {field: getattr(instance, field) for field in LOOKUP_FIELDS}
+
+
+def remember_previous_lookup_entry(sender, instance, raw=False, **kwargs):
+    instance._previous_lookup_entry = None
+    if raw or instance._state.adding:
+        return
+    instance._previous_lookup_entry = (
+        sender.objects.filter(pk=instance.pk).values(*LOOKUP_FIELDS).first()
+    )
+
+
+def invalidate_lookup_cache(sender, instance, **kwargs):
+    entries = [lookup_entry(instance)]
+    previous = getattr(instance, "_previous_lookup_entry", None)
+    if previous:
+        entries.append(previous)
+    # Dropped only once committed, or a concurrent read could cache the old
+    # row again until INVENTORY_LOOKUP_CACHE_TIMEOUT
+    transaction.on_commit(lambda: LOOKUP_CACHES[sender].invalidate(*entries))
+
+
+for lookup_model in LOOKUP_CACHES:
+    pre_save.connect(remember_previous_lookup_entry, sender=lookup_model)
+    post_save.connect(invalidate_lookup_cache, sender=lookup_model)
+    post_delete.connect(invalidate_lookup_cache, sender=lookup_model)
@@ -0,0 +1,15 @@
+import logging
+
+from celery import shared_task
+
+from apps.inventory import pending
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_pending_counts():
+    """Reset the Redis pending counters from the database"""
+    counts, _ = pending.reconcile_pending_counts()
+    logger.info(f"Reconciled {len(counts)} pending counters")
+    return len(counts)
@@ -0,0 +1,849 @@
+import asyncio
+import json
+import time as clock
+import uuid
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+import fakeredis
+import fakeredis.aioredis
+from asgiref.sync import async_to_sync
+from knox.models import AuthToken
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.commons.pagination import KeysetPagination
+from apps.commons.testing import FakeRedisMixin
+from apps.inventory import events
+from apps.inventory.dependencies.constants import DONE, PENDING
+from apps.inventory.feed import FEED_PATH, inventory_feed, make_ticket, replay
+from apps.inventory.lookups import LOOKUP_CACHES, pastry_types
+from apps.inventory.models import (
+    PastryRawMaterialBatch,
+    PastryType,
+    ProcessingStatusTransition,
+    RawMaterial,
+    RawMaterialDailyRollup,
+    RawMaterialHourlyRollup,
+    RawMaterialType,
+    TimeOfDay,
+)
+from apps.inventory.pending import (
+    COUNTS_KEY,
+    RECONCILE_LOCK_KEY,
+    RECONCILED_AT_KEY,
+    read_pending_counts,
+)
+from apps.inventory.services import (
+    ROLLUPS,
+    batch_costing,
+    consumption_series,
+    ingest_raw_materials,
+    raw_material_export_rows,
+    rebuild_rollup,
+    stream_csv,
+    stream_ndjson,
+    transition_processing_status,
+)
+from apps.users.models import User
+
+
+class InventoryTestCase(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # The local LRUs live as long as the process, the fake Redis per test
+        for lookup_cache in LOOKUP_CACHES.values():
+            lookup_cache.clear_local()
+            self.addCleanup(lookup_cache.clear_local)
+
+
+class RawMaterialTestCase(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = PastryRawMaterialBatch.objects.create(batch_code="B-001")
+        cls.croissant = PastryType.objects.create(name="Croissant")
+        cls.brioche = PastryType.objects.create(name="Brioche")
+        cls.morning = TimeOfDay.objects.create(name="Morning")
+        cls.flour = RawMaterialType.objects.create(name="Flour")
+        cls.butter = RawMaterialType.objects.create(name="Butter")
+
+    def raw_material(self, **fields):
+        fields = {
+            "weight": 2.0,
+            "cost": 10.0,
+            "processing_status": PENDING,
+            "pastry_type": self.croissant,
+            "time_of_day": self.morning,
+            "raw_material_type": self.flour,
+            "batch": self.batch,
+            **fields,
+        }
+        return RawMaterial.objects.create(**fields)
+
+
+class LookupCacheTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pastry_type = PastryType.objects.create(name="Croissant")
+
+    def test_reads_through_to_the_database_once(self):
+        with self.assertNumQueries(1):
+            entry = pastry_types.get("id", self.pastry_type.id)
+            self.assertEqual(pastry_types.get("pkid", self.pastry_type.pkid), entry)
+        self.assertEqual(entry["name"], "Croissant")
+
+        pastry_types.clear_local()
+        with self.assertNumQueries(0):
+            self.assertEqual(pastry_types.get("id", self.pastry_type.id), entry)
+
+    def test_oldest_row_wins_a_name(self):
+        newer = PastryType.objects.create(name="Croissant")
+        self.assertEqual(pastry_types.get("id", newer.id)["pkid"], newer.pkid)
+        self.assertEqual(pastry_types.get("pkid", newer.pkid)["pkid"], newer.pkid)
+
+        entry = pastry_types.get("name", "Croissant")
+        self.assertEqual(entry["pkid"], self.pastry_type.pkid)
+        pastry_types.clear_local()
+        with self.assertNumQueries(0):
+            self.assertEqual(pastry_types.get("name", "Croissant"), entry)
+
+    def test_unknown_values(self):
+        self.assertEqual(pastry_types.get_many("name", ["Baguette"]), {})
+        pastry_types.invalidate()
+
+    def test_rename_invalidates_once_committed(self):
+        pastry_types.get("id", self.pastry_type.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pastry_type.name = "Brioche"
+            self.pastry_type.save()
+            self.assertEqual(
+                pastry_types.get("id", self.pastry_type.id)["name"], "Croissant"
+            )
+
+        self.assertEqual(pastry_types.get("id", self.pastry_type.id)["name"], "Brioche")
+        self.assertIsNone(pastry_types.get("name", "Croissant"))
+
+    def test_delete_invalidates_once_committed(self):
+        pastry_types.get("id", self.pastry_type.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pastry_type.delete()
+        self.assertIsNone(pastry_types.get("id", self.pastry_type.id))
+
+
+class RollupTests(RawMaterialTestCase):
+    def daily(self):
+        return {
+            (row.pastry_type_id, row.raw_material_type_id): (
+                row.total_weight,
+                row.total_cost,
+                row.row_count,
+            )
+            for row in RawMaterialDailyRollup.objects.all()
+        }
+
+    def hourly(self):
+        return {
+            row.raw_material_type_id: (row.total_weight, row.total_cost, row.row_count)
+            for row in RawMaterialHourlyRollup.objects.all()
+        }
+
+    def assertRebuildMatches(self):
+        incremental = (self.daily(), self.hourly())
+        for model, bucket, fields in ROLLUPS:
+            rebuild_rollup(model, bucket, fields)
+        self.assertEqual((self.daily(), self.hourly()), incremental)
+
+    def test_insert(self):
+        self.raw_material()
+        self.raw_material(weight=3.0, cost=5.0)
+        self.raw_material(raw_material_type=self.butter)
+
+        key = (self.croissant.pkid, self.flour.pkid)
+        self.assertEqual(self.daily()[key], (5.0, 15.0, 2))
+        self.assertEqual(self.hourly()[self.butter.pkid], (2.0, 10.0, 1))
+        self.assertRebuildMatches()
+
+    def test_update_moves_totals_between_rows(self):
+        kept = self.raw_material()
+        moved = self.raw_material()
+
+        moved.weight = 4.0
+        moved.pastry_type = self.brioche
+        moved.save()
+        kept.cost = 1.0
+        kept.save()
+
+        self.assertEqual(
+            self.daily(),
+            {
+                (self.croissant.pkid, self.flour.pkid): (2.0, 1.0, 1),
+                (self.brioche.pkid, self.flour.pkid): (4.0, 10.0, 1),
+            },
+        )
+        self.assertEqual(self.hourly(), {self.flour.pkid: (6.0, 11.0, 2)})
+        self.assertRebuildMatches()
+
+    def test_delete_drops_empty_rows(self):
+        kept = self.raw_material()
+        self.raw_material(raw_material_type=self.butter).delete()
+
+        self.assertEqual(
+            self.daily(), {(self.croissant.pkid, self.flour.pkid): (2.0, 10.0, 1)}
+        )
+        self.assertEqual(self.hourly(), {self.flour.pkid: (2.0, 10.0, 1)})
+
+        kept.delete()
+        self.assertEqual((self.daily(), self.hourly()), ({}, {}))
+
+    def test_delete_of_uncounted_row(self):
+        raw_material = self.raw_material()
+        RawMaterialDailyRollup.objects.all().delete()
+        RawMaterialHourlyRollup.objects.all().delete()
+
+        with self.assertLogs("apps.inventory.services", "WARNING"):
+            raw_material.delete()
+        self.assertEqual((self.daily(), self.hourly()), ({}, {}))
+
+    def test_rebuild_uses_local_days(self):
+        raw_material = self.raw_material()
+        RawMaterial.objects.filter(pkid=raw_material.pkid).update(
+            created_at=timezone.now() - timedelta(days=3)
+        )
+        rebuild_rollup(*ROLLUPS[0])
+        self.assertEqual(
+            RawMaterialDailyRollup.objects.get().day,
+            timezone.localdate() - timedelta(days=3),
+        )
+
+    def test_daily_report_queries(self):
+        # 20 rollup rows over 5 days, 2 pastry types and 2 raw material types
+        for days in range(5):
+            for pastry_type in (self.croissant, self.brioche):
+                for raw_material_type in (self.flour, self.butter):
+                    raw_material = self.raw_material(
+                        pastry_type=pastry_type, raw_material_type=raw_material_type
+                    )
+                    RawMaterial.objects.filter(pkid=raw_material.pkid).update(
+                        created_at=timezone.now() - timedelta(days=days)
+                    )
+        rebuild_rollup(*ROLLUPS[0])
+        for lookup_cache in LOOKUP_CACHES.values():
+            lookup_cache.clear_local()
+        self.redis.flushall()
+
+        client = APIClient()
+        client.force_authenticate(User(email="ada@example.com"))
+        today = timezone.localdate()
+        # The rollup rows and one query per lookup type, inside the savepoint
+        # of ATOMIC_REQUESTS
+        with self.assertNumQueries(6):
+            response = client.get(
+                reverse("raw_material_daily_rollup"),
+                {"start": today - timedelta(days=4), "end": today},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 20)
+        self.assertEqual(
+            {(row["pastry_type"], row["raw_material_type"]) for row in response.json()},
+            {
+                ("Croissant", "Flour"),
+                ("Croissant", "Butter"),
+                ("Brioche", "Flour"),
+                ("Brioche", "Butter"),
+            },
+        )
+        self.assertEqual({row["time_of_day"] for row in response.json()}, {"Morning"})
+
+
+class ConsumptionSeriesTests(RawMaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        # Saturday 30 December 2023 to Wednesday 3 January 2024
+        days = (
+            (date(2023, 12, 30), 1.0),
+            (date(2023, 12, 31), 2.0),
+            (date(2024, 1, 1), 4.0),
+            (date(2024, 1, 3), 8.0),
+        )
+        for day, weight in days:
+            raw_material = self.raw_material(weight=weight, cost=weight * 10)
+            RawMaterial.objects.filter(pkid=raw_material.pkid).update(
+                created_at=timezone.make_aware(datetime.combine(day, time(9)))
+            )
+        for rollup in ROLLUPS:
+            rebuild_rollup(*rollup)
+
+    def series(self, interval, start, end):
+        (series,) = consumption_series(interval, start, end)
+        self.assertEqual(series["raw_material_type"], self.flour.id)
+        return series
+
+    def test_weeks_are_folded_from_days(self):
+        series = self.series("week", date(2023, 12, 30), date(2024, 1, 3))
+        self.assertEqual(series["buckets"], [date(2023, 12, 25), date(2024, 1, 1)])
+        self.assertEqual(series["weight"], [3.0, 12.0])
+        self.assertEqual(series["cost"], [30.0, 120.0])
+        self.assertEqual(series["rows"], [2, 2])
+
+    def test_weeks_cover_the_window_only(self):
+        series = self.series("week", date(2023, 12, 31), date(2024, 1, 2))
+        self.assertEqual(series["weight"], [2.0, 4.0])
+
+    def test_days(self):
+        series = self.series("day", date(2023, 12, 30), date(2024, 1, 3))
+        self.assertEqual(
+            series["buckets"],
+            [
+                date(2023, 12, 30),
+                date(2023, 12, 31),
+                date(2024, 1, 1),
+                date(2024, 1, 3),
+            ],
+        )
+        self.assertEqual(series["weight"], [1.0, 2.0, 4.0, 8.0])
+
+    def test_hours(self):
+        series = self.series("hour", date(2024, 1, 1), date(2024, 1, 1))
+        self.assertEqual(
+            series["buckets"], [timezone.make_aware(datetime(2024, 1, 1, 9))]
+        )
+        self.assertEqual(series["rows"], [1])
+
+
+class KeysetPaginationTests(RawMaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(5):
+            self.raw_material()
+        # Three rows share a created_at, so only the pkid orders them
+        created_at = timezone.now()
+        tied = RawMaterial.objects.order_by("pkid").values_list("pkid", flat=True)
+        RawMaterial.objects.filter(pkid__in=list(tied[1:4])).update(
+            created_at=created_at
+        )
+
+    def paginate(self, url):
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get(url))
+        page = paginator.paginate_queryset(RawMaterial.objects.all(), request)
+        return [raw_material.pkid for raw_material in page], paginator.get_next_link()
+
+    def test_pages_through_tied_rows(self):
+        expected = list(
+            RawMaterial.objects.order_by("-created_at", "-pkid").values_list(
+                "pkid", flat=True
+            )
+        )
+        pkids, url = [], "/inventory/raw-materials/?page_size=2"
+        while url:
+            page, url = self.paginate(url)
+            self.assertLessEqual(len(page), 2)
+            pkids += page
+        self.assertEqual(pkids, expected)
+
+    def test_last_page_has_no_next_link(self):
+        page, url = self.paginate("/inventory/raw-materials/?page_size=5")
+        self.assertEqual(len(page), 5)
+        self.assertIsNone(url)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(NotFound):
+            self.paginate("/inventory/raw-materials/?cursor=bm90LWEtY3Vyc29y")
+
+
+class PendingCountsTests(RawMaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        # Freshly reconciled, so reads return the counters as they are
+        self.redis.set(RECONCILED_AT_KEY, clock.time())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.raw_material()
+            self.raw_material()
+            self.raw_material(pastry_type=self.brioche)
+
+    def counts(self):
+        return read_pending_counts()[0]
+
+    def transition(self, pastry_type):
+        return transition_processing_status(
+            PENDING, DONE, pastry_type=pastry_types.get("pkid", pastry_type.pkid)
+        )
+
+    def test_transition_subtracts_the_moved_rows(self):
+        self.assertEqual(
+            self.counts(),
+            {
+                (self.morning.pkid, self.croissant.pkid): 2,
+                (self.morning.pkid, self.brioche.pkid): 1,
+            },
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            transition = self.transition(self.croissant)
+
+        self.assertEqual(transition.affected_rows, 2)
+        self.assertEqual(self.counts(), {(self.morning.pkid, self.brioche.pkid): 1})
+
+    def test_racing_write_requests_a_reconciliation(self):
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            if queryset.model is RawMaterial:
+                # A row committed between the count and the update
+                with mock.patch.object(QuerySet, "update", update):
+                    self.raw_material()
+            return update(queryset, **kwargs)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(QuerySet, "update", racing_update):
+                transition = self.transition(self.croissant)
+
+        self.assertEqual(transition.affected_rows, 3)
+        self.assertFalse(self.redis.exists(RECONCILED_AT_KEY))
+        self.assertEqual(self.counts(), {(self.morning.pkid, self.brioche.pkid): 1})
+
+    def test_rolled_back_transition_leaves_the_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.transition(self.croissant)
+                raise RuntimeError
+
+        self.assertEqual(
+            RawMaterial.objects.filter(processing_status=PENDING).count(), 3
+        )
+        self.assertEqual(self.counts()[(self.morning.pkid, self.croissant.pkid)], 2)
+
+    def test_stale_counters_are_reconciled(self):
+        self.redis.hset(COUNTS_KEY, "0:0", 7)
+        self.redis.set(RECONCILED_AT_KEY, clock.time() - 3600)
+
+        counts, reconciled_at = read_pending_counts()
+        self.assertEqual(
+            counts,
+            {
+                (self.morning.pkid, self.croissant.pkid): 2,
+                (self.morning.pkid, self.brioche.pkid): 1,
+            },
+        )
+        self.assertAlmostEqual(reconciled_at, clock.time(), delta=60)
+        self.assertEqual(len(self.redis.hgetall(COUNTS_KEY)), 2)
+        self.assertFalse(self.redis.exists(RECONCILE_LOCK_KEY))
+
+    def test_stale_counters_reconciled_by_another_request(self):
+        self.redis.hset(COUNTS_KEY, "0:0", 7)
+        self.redis.set(RECONCILED_AT_KEY, clock.time() - 3600)
+        self.redis.set(RECONCILE_LOCK_KEY, 1)
+
+        with self.assertNumQueries(0):
+            counts = self.counts()
+        self.assertEqual(counts[(0, 0)], 7)
+        self.assertTrue(self.redis.exists(RECONCILE_LOCK_KEY))
+
+
+class FeedTestCase(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            first_name="Ada",
+            last_name="Baker",
+            email="ada@example.com",
+            password="Sup3r-secret-pass",
+            phone_number="+2348012345678",
+        )
+        self.auth_token, self.token = AuthToken.objects.create(self.user)
+        patcher = mock.patch(
+            "apps.inventory.feed.redis.Redis.from_url",
+            side_effect=lambda url: fakeredis.aioredis.FakeRedis(
+                server=self.redis_server
+            ),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def publish(self, batch):
+        events.send(
+            {"type": events.RAW_MATERIALS_CREATED, "batch": batch},
+            [events.ALL, events.subscription(batch=batch)],
+        )
+        return self.redis.xrevrange(events.STREAM_KEY, count=1)[0][0].decode()
+
+
+class ReplayTests(FeedTestCase):
+    def replay(self, subscription, last_event_id):
+        client = fakeredis.aioredis.FakeRedis(server=self.redis_server)
+        return async_to_sync(replay)(client, subscription, last_event_id)
+
+    def test_replays_missed_events_of_the_subscription(self):
+        first = self.publish("a")
+        self.publish("b")
+        third = self.publish("a")
+
+        messages, last_id = self.replay("batch:a", first)
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith(f"id: {third}\n".encode()))
+        self.assertEqual(last_id, third)
+
+    def test_nothing_missed(self):
+        last = self.publish("a")
+        self.assertEqual(self.replay(events.ALL, last), ([], last))
+
+    def test_reset_once_missed_events_are_trimmed(self):
+        first = self.publish("a")
+        self.publish("a")
+        self.publish("a")
+        self.redis.xtrim(events.STREAM_KEY, maxlen=1)
+
+        messages, last_id = self.replay(events.ALL, first)
+        self.assertEqual(messages, [b"event: reset\ndata: {}\n\n"])
+        self.assertIsNone(last_id)
+
+    @override_settings(INVENTORY_EVENTS_REPLAY_LIMIT=1)
+    def test_reset_when_too_many_events_were_missed(self):
+        first = self.publish("a")
+        self.publish("a")
+        self.publish("a")
+
+        messages, last_id = self.replay(events.ALL, first)
+        self.assertEqual(messages, [b"event: reset\ndata: {}\n\n"])
+        self.assertIsNone(last_id)
+
+
+class InventoryFeedTests(FeedTestCase):
+    def request(self, query="", headers=(), method="GET", until=b"retry"):
+        """Messages sent by the feed to a client that disconnects once a body
+        containing ``until`` was sent, or never when it is None"""
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": FEED_PATH,
+            "query_string": query.encode(),
+            "headers": [(key.encode(), value.encode()) for key, value in headers],
+        }
+        sent = []
+
+        async def run():
+            received = asyncio.Event()
+
+            async def receive():
+                await received.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+                if until is not None and until in message.get("body", b""):
+                    received.set()
+
+            await inventory_feed(scope, receive, send)
+
+        async_to_sync(run)()
+        return sent
+
+    def authorization(self, token=None):
+        return [("authorization", f"Token {token or self.token}")]
+
+    def test_method_not_allowed(self):
+        self.assertEqual(self.request(method="POST")[0]["status"], 405)
+
+    def test_invalid_filters(self):
+        queries = (
+            "batch=not-a-uuid",
+            f"batch={uuid.uuid4()}&pastry_type={uuid.uuid4()}",
+            "last_event_id=1",
+        )
+        for query in queries:
+            with self.subTest(query=query):
+                start, body = self.request(query, self.authorization())
+                self.assertEqual(start["status"], 400)
+
+    def test_invalid_credentials(self):
+        cases = (
+            ("", []),
+            ("", self.authorization("not-a-token")),
+            ("", self.authorization("ab" * 32)),
+            ("ticket=forged", []),
+            (f"token={self.token}", []),
+        )
+        for query, headers in cases:
+            with self.subTest(query=query, headers=headers):
+                start, body = self.request(query, headers)
+                self.assertEqual(start["status"], 401)
+
+    @override_settings(INVENTORY_EVENTS_TICKET_MAX_AGE=-1)
+    def test_expired_ticket(self):
+        start, body = self.request(f"ticket={make_ticket(self.auth_token)}")
+        self.assertEqual(start["status"], 401)
+
+    def test_ticket(self):
+        response = self.client.post(
+            reverse("feed_ticket"), HTTP_AUTHORIZATION=f"Token {self.token}"
+        )
+        self.assertEqual(response.status_code, 201)
+
+        sent = self.request(f"ticket={response.json()['ticket']}")
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(sent[1]["body"], b"retry: 3000\n\n")
+
+    def test_replay_from_last_event_id(self):
+        batch, other = str(uuid.uuid4()), str(uuid.uuid4())
+        first = self.publish(batch)
+        self.publish(other)
+        third = self.publish(batch)
+
+        sent = self.request(
+            f"batch={batch}",
+            [*self.authorization(), ("last-event-id", first)],
+            until=f"id: {third}".encode(),
+        )
+        # The retry interval, then the one missed event of the batch
+        replayed = sent[2]["body"]
+        self.assertTrue(replayed.startswith(f"id: {third}\n".encode()))
+        self.assertIn(f'"batch": "{batch}"'.encode(), replayed)
+
+    @override_settings(INVENTORY_EVENTS_HEARTBEAT=0)
+    def test_feed_ends_once_the_token_is_gone(self):
+        with mock.patch(
+            "apps.inventory.feed.authenticate",
+            new_callable=mock.AsyncMock,
+            side_effect=[self.user, self.user, None],
+        ) as authenticate:
+            sent = self.request(headers=self.authorization(), until=None)
+
+        self.assertEqual(authenticate.call_count, 3)
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(sent[-1], {"type": "http.response.body", "body": b""})
+
+
+class IngestTests(RawMaterialTestCase):
+    def row(self, **fields):
+        return {
+            "weight": 2.0,
+            "cost": 10.0,
+            "pastry_type": str(self.croissant.id),
+            "time_of_day": str(self.morning.id),
+            "raw_material_type": str(self.flour.id),
+            **fields,
+        }
+
+    def test_valid_rows_are_saved_next_to_invalid_ones(self):
+        unknown = uuid.uuid4()
+        rows = [
+            self.row(),
+            self.row(weight=-1),
+            self.row(raw_material_type=str(unknown)),
+            self.row(pastry_type=str(self.brioche.id), processing_status=DONE),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            result = ingest_raw_materials(self.batch, rows)
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual([error["row"] for error in result["errors"]], [1, 2])
+        self.assertEqual(
+            result["errors"][1]["errors"],
+            {"raw_material_type": [f"raw material type {unknown} does not exist"]},
+        )
+        self.assertEqual(
+            sorted(
+                RawMaterial.objects.values_list("pastry_type_id", "processing_status")
+            ),
+            sorted([(self.croissant.pkid, PENDING), (self.brioche.pkid, DONE)]),
+        )
+        self.assertEqual(
+            RawMaterialHourlyRollup.objects.get().row_count, result["created"]
+        )
+        self.assertEqual(self.redis.xlen(events.STREAM_KEY), 2)
+
+    def test_cached_lookups_cost_no_queries(self):
+        rows = [self.row() for _ in range(10)]
+        # Both ingests land in the same rollup rows
+        now = timezone.now()
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            ingest_raw_materials(self.batch, rows)
+            # One insert and one update per existing rollup row
+            with self.assertNumQueries(3):
+                ingest_raw_materials(self.batch, rows)
+        self.assertEqual(RawMaterial.objects.count(), 20)
+
+
+class ExportTests(RawMaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_batch = PastryRawMaterialBatch.objects.create(batch_code="B-002")
+        self.rows = {}
+        for day, batch in (
+            (date(2024, 1, 1), self.batch),
+            (date(2024, 1, 2), self.other_batch),
+            (date(2024, 1, 3), self.batch),
+        ):
+            raw_material = self.raw_material(batch=batch)
+            RawMaterial.objects.filter(pkid=raw_material.pkid).update(
+                created_at=timezone.make_aware(datetime.combine(day, time(23, 30)))
+            )
+            self.rows[day] = raw_material.id
+
+    def exported(self, **filters):
+        return [row[0] for row in raw_material_export_rows(**filters)]
+
+    def test_filters(self):
+        self.assertEqual(self.exported(), list(self.rows.values()))
+        self.assertEqual(
+            self.exported(
+                created_after=date(2024, 1, 2), created_before=date(2024, 1, 2)
+            ),
+            [self.rows[date(2024, 1, 2)]],
+        )
+        self.assertEqual(
+            self.exported(batch=self.batch.id),
+            [self.rows[date(2024, 1, 1)], self.rows[date(2024, 1, 3)]],
+        )
+
+    def test_csv(self):
+        lines = list(stream_csv(raw_material_export_rows(batch=self.other_batch.id)))
+        self.assertEqual(
+            lines[0],
+            "id,created_at,batch,pastry_type,raw_material_type,time_of_day,"
+            "weight,cost,processing_status\r\n",
+        )
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f"{self.rows[date(2024, 1, 2)]},"))
+        self.assertTrue(
+            lines[1].endswith(",B-002,Croissant,Flour,Morning,2.0,10.0,Pending\r\n")
+        )
+
+    def test_ndjson(self):
+        (line,) = stream_ndjson(raw_material_export_rows(batch=self.other_batch.id))
+        row = json.loads(line)
+        self.assertEqual(row["id"], str(self.rows[date(2024, 1, 2)]))
+        self.assertEqual(row["batch"], "B-002")
+        self.assertEqual(row["weight"], 2.0)
+
+
+class BatchCostingTests(RawMaterialTestCase):
+    def test_costing(self):
+        self.raw_material(weight=2.0, cost=10.0)
+        self.raw_material(weight=3.0, cost=6.0)
+        self.raw_material(weight=1.0, cost=4.0, raw_material_type=self.butter)
+        unweighed = PastryRawMaterialBatch.objects.create(batch_code="B-002")
+        self.raw_material(weight=0.0, cost=5.0, batch=unweighed)
+        outside = self.raw_material(weight=100.0, cost=100.0)
+        RawMaterial.objects.filter(pkid=outside.pkid).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+
+        today = timezone.localdate()
+        batch, unweighed = batch_costing(today, today)
+
+        self.assertEqual(batch["batch"], self.batch.id)
+        self.assertEqual(batch["rows"], 3)
+        self.assertEqual((batch["total_weight"], batch["total_cost"]), (6.0, 20.0))
+        self.assertAlmostEqual(batch["mean_cost"], 20 / 3)
+        self.assertAlmostEqual(batch["cost_per_kg"], 20 / 6)
+        # Per row cost per kg of 5, 2 and 4
+        self.assertAlmostEqual(batch["cost_per_kg_p50"], 4.0)
+        self.assertAlmostEqual(batch["cost_per_kg_p90"], 4.8)
+        self.assertEqual(
+            batch["raw_material_types"],
+            [
+                {
+                    "raw_material_type": self.flour.id,
+                    "name": "Flour",
+                    "rows": 2,
+                    "total_weight": 5.0,
+                    "total_cost": 16.0,
+                },
+                {
+                    "raw_material_type": self.butter.id,
+                    "name": "Butter",
+                    "rows": 1,
+                    "total_weight": 1.0,
+                    "total_cost": 4.0,
+                },
+            ],
+        )
+
+        self.assertEqual(unweighed["total_cost"], 5.0)
+        self.assertIsNone(unweighed["cost_per_kg"])
+        self.assertIsNone(unweighed["cost_per_kg_p50"])
+
+    def test_empty_window(self):
+        self.assertEqual(batch_costing(date(2000, 1, 1), date(2000, 1, 2)), [])
+
+
+class TransitionTests(RawMaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            first_name="Ada",
+            last_name="Baker",
+            email="ada@example.com",
+            password="Sup3r-secret-pass",
+            phone_number="+2348012345678",
+        )
+        _, self.token = AuthToken.objects.create(self.user)
+
+    def transition(self, **data):
+        return self.client.post(
+            reverse("raw_material_transition"),
+            data,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Token {self.token}",
+        )
+
+    def test_moves_the_pending_rows_of_a_batch(self):
+        self.raw_material()
+        self.raw_material(pastry_type=self.brioche)
+        self.raw_material(processing_status=DONE)
+        other = self.raw_material(
+            batch=PastryRawMaterialBatch.objects.create(batch_code="B-002")
+        )
+
+        response = self.transition(batch=str(self.batch.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["affected_rows"], 2)
+        self.assertEqual(response.json()["filters"], {"batch": str(self.batch.id)})
+        self.assertEqual(
+            RawMaterial.objects.filter(processing_status=PENDING).get(), other
+        )
+        self.assertEqual(ProcessingStatusTransition.objects.get().created_by, self.user)
+
+        self.assertEqual(
+            self.transition(batch=str(self.batch.id)).json()["affected_rows"], 0
+        )
+
+    def test_created_window(self):
+        moved = self.raw_material()
+        kept = self.raw_material()
+        RawMaterial.objects.filter(pkid=kept.pkid).update(
+            created_at=timezone.now() + timedelta(days=2)
+        )
+
+        today = timezone.localdate()
+        response = self.transition(
+            pastry_type=str(self.croissant.id),
+            created_after=str(today),
+            created_before=str(today),
+        )
+        self.assertEqual(response.json()["affected_rows"], 1)
+        moved.refresh_from_db()
+        kept.refresh_from_db()
+        self.assertEqual(
+            (moved.processing_status, kept.processing_status), (DONE, PENDING)
+        )
+
+    def test_invalid_requests(self):
+        cases = (
+            {},
+            {"from_status": DONE, "to_status": PENDING, "batch": str(self.batch.id)},
+            {"pastry_type": str(uuid.uuid4())},
+            {"batch": str(uuid.uuid4())},
+        )
+        for data in cases:
+            with self.subTest(data=data):
+                self.assertEqual(self.transition(**data).status_code, 400)
+        self.assertFalse(ProcessingStatusTransition.objects.exists())
@@ -0,0 +1,51 @@
+from django.urls import path
+
+from apps.inventory.views import (
+    BatchCostingView,
+    ConsumptionSeriesView,
+    FeedTicketView,
+    PastryRawMaterialBatchListView,
+    PendingRawMaterialCountView,
+    RawMaterialBulkCreateView,
+    RawMaterialDailyRollupView,
+    RawMaterialExportView,
+    RawMaterialListView,
+    RawMaterialTransitionView,
+)
+
+urlpatterns = [
+    path("batches/", PastryRawMaterialBatchListView.as_view(), name="batch_list"),
+    path(
+        "batches/<uuid:batch_id>/raw-materials/bulk/",
+        RawMaterialBulkCreateView.as_view(),
+        name="raw_material_bulk_create",
+    ),
+    path("raw-materials/", RawMaterialListView.as_view(), name="raw_material_list"),
+    path(
+        "raw-materials/transitions/",
+        RawMaterialTransitionView.as_view(),
+        name="raw_material_transition",
+    ),
+    path(
+        "raw-materials/pending-counts/",
+        PendingRawMaterialCountView.as_view(),
+        name="raw_material_pending_counts",
+    ),
+    path(
+        "raw-materials/export/",
+        RawMaterialExportView.as_view(),
+        name="raw_material_export",
+    ),
+    path(
+        "reports/daily/",
+        RawMaterialDailyRollupView.as_view(),
+        name="raw_material_daily_rollup",
+    ),
+    path("reports/batch-costs/", BatchCostingView.as_view(), name="batch_costing"),
+    path(
+        "reports/consumption/",
+        ConsumptionSeriesView.as_view(),
+        name="raw_material_consumption_series",
+    ),
+    path("events/tickets/", FeedTicketView.as_view(), name="feed_ticket"),
+]
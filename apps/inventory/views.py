@@ -0,0 +1,261 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from rest_framework import status
+from rest_framework.generics import GenericAPIView, ListAPIView
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from apps.commons.pagination import KeysetPagination
+from apps.inventory.feed import make_ticket
+from apps.inventory.lookups import pastry_types, raw_material_types, times_of_day
+from apps.inventory.models import (
+    PastryRawMaterialBatch,
+    RawMaterial,
+    RawMaterialDailyRollup,
+)
+from apps.inventory.parsers import NDJSONParser
+from apps.inventory.pending import read_pending_counts
+from apps.inventory.serializers import (
+    BatchCostingFilterSerializer,
+    ConsumptionSeriesFilterSerializer,
+    DailyRollupFilterSerializer,
+    FeedTicketSerializer,
+    PastryRawMaterialBatchSerializer,
+    PendingCountsSerializer,
+    ProcessingStatusTransitionSerializer,
+    RawMaterialDailyRollupSerializer,
+    RawMaterialExportFilterSerializer,
+    RawMaterialListFilterSerializer,
+    RawMaterialRowSerializer,
+    RawMaterialSerializer,
+    RawMaterialTransitionSerializer,
+)
+from apps.inventory.services import (
+    batch_costing,
+    consumption_series,
+    ingest_raw_materials,
+    raw_material_export_rows,
+    stream_csv,
+    stream_ndjson,
+    transition_processing_status,
+)
+
+
+class RawMaterialBulkCreateView(GenericAPIView):
+
+    """Ingest a whole batch worth of raw materials as a JSON array or NDJSON"""
+
+    serializer_class = RawMaterialRowSerializer
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request, batch_id):
+        batch = get_object_or_404(PastryRawMaterialBatch, id=batch_id)
+        if not isinstance(request.data, list):
+            return Response(
+                {"error": "Expected a list of raw materials"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result = ingest_raw_materials(batch, request.data)
+        result["batch"] = batch.id
+        if result["errors"]:
+            return Response(result, status=status.HTTP_207_MULTI_STATUS)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+class RawMaterialTransitionView(GenericAPIView):
+
+    """Move every raw material of a batch, or of a filtered set, from one
+    processing status to another in one statement"""
+
+    serializer_class = RawMaterialTransitionSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        transition = transition_processing_status(
+            user=request.user, **serializer.validated_data
+        )
+        return Response(
+            ProcessingStatusTransitionSerializer(transition).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class RawMaterialExportView(GenericAPIView):
+
+    """Stream the raw material history as CSV or NDJSON"""
+
+    serializer_class = RawMaterialExportFilterSerializer
+
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+        export_format = filters.pop("export_format")
+        filename = f"raw-materials.{export_format}"
+
+        rows = raw_material_export_rows(**filters)
+        if export_format == "ndjson":
+            response = StreamingHttpResponse(
+                stream_ndjson(rows), content_type="application/x-ndjson"
+            )
+        else:
+            response = StreamingHttpResponse(stream_csv(rows), content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class RawMaterialDailyRollupView(GenericAPIView):
+
+    """Daily cost and weight totals read from the precomputed rollup table"""
+
+    serializer_class = RawMaterialDailyRollupSerializer
+
+    def get(self, request):
+        filters = DailyRollupFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        rollups = list(
+            RawMaterialDailyRollup.objects.filter(
+                day__range=(
+                    filters.validated_data["start"],
+                    filters.validated_data["end"],
+                )
+            )
+        )
+        # Lookup rows missing from the caches cost one query per lookup type
+        # instead of one per rollup row
+        for field, lookup_cache in (
+            ("pastry_type_id", pastry_types),
+            ("raw_material_type_id", raw_material_types),
+            ("time_of_day_id", times_of_day),
+        ):
+            lookup_cache.get_many("pkid", {getattr(row, field) for row in rollups})
+        serializer = self.serializer_class(rollups, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class BatchCostingView(GenericAPIView):
+
+    """Cost per batch, cost per kg and weight by raw material type of every
+    batch with raw materials created between ``start`` and ``end``"""
+
+    serializer_class = BatchCostingFilterSerializer
+
+    def get(self, request):
+        filters = self.serializer_class(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        return Response(
+            batch_costing(**filters.validated_data), status=status.HTTP_200_OK
+        )
+
+
+class ConsumptionSeriesView(GenericAPIView):
+
+    """Weight and cost per hour, day or week of the chosen raw material types,
+    read from the rollup tables. Each series lists its buckets and values as
+    parallel arrays"""
+
+    serializer_class = ConsumptionSeriesFilterSerializer
+
+    def get(self, request):
+        filters = self.serializer_class(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        return Response(
+            {
+                "interval": filters.validated_data["interval"],
+                "series": consumption_series(**filters.validated_data),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class PendingRawMaterialCountView(GenericAPIView):
+
+    """Pending raw materials per time of day and pastry type, served from the
+    Redis counters. They follow every committed write and are reconciled
+    with the database at least every INVENTORY_PENDING_COUNTS_MAX_AGE
+    seconds"""
+
+    serializer_class = PendingCountsSerializer
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # ATOMIC_REQUESTS would open a database connection for every poll
+        return transaction.non_atomic_requests(super().as_view(**initkwargs))
+
+    def get(self, request):
+        counts, reconciled_at = read_pending_counts()
+        times = times_of_day.get_many("pkid", {key[0] for key in counts})
+        pastries = pastry_types.get_many("pkid", {key[1] for key in counts})
+        rows = [
+            {
+                "time_of_day": times[time_of_day_id]["id"],
+                "time_of_day_name": times[time_of_day_id]["name"],
+                "pastry_type": pastries[pastry_type_id]["id"],
+                "pastry_type_name": pastries[pastry_type_id]["name"],
+                "pending": pending,
+            }
+            for (time_of_day_id, pastry_type_id), pending in sorted(counts.items())
+            if time_of_day_id in times and pastry_type_id in pastries
+        ]
+        serializer = self.serializer_class(
+            {
+                "reconciled_at": reconciled_at
+                and datetime.fromtimestamp(reconciled_at, tz=timezone.utc),
+                "max_age": settings.INVENTORY_PENDING_COUNTS_MAX_AGE,
+                "counts": rows,
+            }
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class PastryRawMaterialBatchListView(ListAPIView):
+    serializer_class = PastryRawMaterialBatchSerializer
+    pagination_class = KeysetPagination
+    queryset = PastryRawMaterialBatch.objects.all()
+
+
+class RawMaterialListView(ListAPIView):
+    serializer_class = RawMaterialSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        filters = RawMaterialListFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        lookups = {
+            "batch__id": filters.validated_data.get("batch"),
+            "processing_status": filters.validated_data.get("processing_status"),
+        }
+        queryset = RawMaterial.objects.filter(
+            **{lookup: value for lookup, value in lookups.items() if value}
+        ).select_related("batch")
+
+        if "pastry_type" in filters.validated_data:
+            pastry_type = pastry_types.get("id", filters.validated_data["pastry_type"])
+            if pastry_type is None:
+                return queryset.none()
+            queryset = queryset.filter(pastry_type_id=pastry_type["pkid"])
+        return queryset
+
+
+class FeedTicketView(GenericAPIView):
+
+    """Short-lived ticket that opens the events feed for the token of the
+    request, for an ``EventSource``, which cannot send the token in a header"""
+
+    serializer_class = FeedTicketSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(
+            {
+                "ticket": make_ticket(request.auth),
+                "expires_in": settings.INVENTORY_EVENTS_TICKET_MAX_AGE,
+            }
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,95 @@
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import AuthToken
+from knox.settings import knox_settings
+from rest_framework import exceptions
+
+
+def token_cache_key(digest):
+    return f"users:knox:{digest}"
+
+
+def invalidate_cached_tokens(*digests):
+    """Drop the cached tokens once the current transaction commits, so a
+    concurrent request cannot cache them again from rows about to change"""
+    keys = [token_cache_key(digest) for digest in digests]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user_tokens(user):
+    invalidate_cached_tokens(
+        *AuthToken.objects.filter(user=user).values_list("digest", flat=True)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    """Knox token authentication that caches validated tokens together with
+    their user under the token digest.
+
+    A cache hit costs one SHA512 of the presented token and no queries. The
+    cached entry never outlives the token expiry nor
+    ``KNOX_TOKEN_CACHE_TIMEOUT``, and is dropped as soon as the token is
+    deleted (logout, password change) or its user is saved.
+    """
+
+    def authenticate_credentials(self, token):
+        if knox_settings.AUTO_REFRESH:
+            # Refreshing writes the expiry on every request, keep knox's path
+            return super().authenticate_credentials(token)
+
+        try:
+            digest = hash_token(token.decode("utf-8"))
+        except (TypeError, UnicodeDecodeError, binascii.Error):
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        auth_token = self.get_cached_token(digest)
+        if auth_token is None:
+            user, auth_token = super().authenticate_credentials(token)
+            self.cache_token(auth_token)
+        return self.validate_user(auth_token)
+
+    def authenticate_digest(self, digest):
+        """``(user, auth_token)`` of the token whose digest is ``digest``, for
+        callers that hold the digest and not the token itself"""
+        auth_token = self.get_cached_token(digest)
+        if auth_token is None:
+            auth_token = (
+                AuthToken.objects.select_related("user").filter(digest=digest).first()
+            )
+            if auth_token is None or self.has_expired(auth_token):
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            self.cache_token(auth_token)
+        return self.validate_user(auth_token)
+
+    def get_cached_token(self, digest):
+        auth_token = cache.get(token_cache_key(digest))
+        if auth_token is None or self.has_expired(auth_token):
+            return None
+        return auth_token
+
+    def cache_token(self, auth_token):
+        timeout = self.get_cache_timeout(auth_token)
+        if timeout > 0:
+            cache.set(token_cache_key(auth_token.digest), auth_token, timeout)
+
+    @staticmethod
+    def has_expired(auth_token):
+        return auth_token.expiry is not None and auth_token.expiry < timezone.now()
+
+    @staticmethod
+    def get_cache_timeout(auth_token):
+        timeout = settings.KNOX_TOKEN_CACHE_TIMEOUT
+        if auth_token.expiry is not None:
+            remaining = (auth_token.expiry - timezone.now()).total_seconds()
+            timeout = min(timeout, int(remaining))
+        return timeout
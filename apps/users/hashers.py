@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+from django.core.exceptions import ImproperlyConfigured
+
+
+class ProfiledArgon2PasswordHasher(Argon2PasswordHasher):
+
+    """Argon2 hasher whose cost parameters come from a named profile in
+    ``PASSWORD_HASHER_PROFILES``.
+
+    The algorithm name is still ``argon2`` so existing hashes keep verifying.
+    Hashes made with other parameters are reported by ``must_update`` and get
+    rehashed with the active profile on the next successful login.
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile
+
+    @property
+    def profile_params(self):
+        name = self.profile or settings.PASSWORD_HASHER_PROFILE
+        try:
+            return settings.PASSWORD_HASHER_PROFILES[name]
+        except KeyError:
+            raise ImproperlyConfigured(f"Unknown password hasher profile {name!r}")
+
+    @property
+    def time_cost(self):
+        return self.profile_params["time_cost"]
+
+    @property
+    def memory_cost(self):
+        return self.profile_params["memory_cost"]
+
+    @property
+    def parallelism(self):
+        return self.profile_params["parallelism"]
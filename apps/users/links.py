@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.contrib.sites.shortcuts import get_current_site
+from django.urls import reverse
+from django.utils.encoding import smart_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from apps.users.tokens import PASSWORD_RESET, VERIFY_EMAIL, make_link_token
+
+
+def verification_url(request, user):
+    """Absolute email verification link for ``user``"""
+    current_site = get_current_site(request).domain
+    link = reverse("verify_email")
+    token = make_link_token(user, VERIFY_EMAIL)
+    return settings.APP_SCHEME + current_site + link + "?token=" + token
+
+
+def password_reset_url(request, user, redirect_url=""):
+    """Absolute password reset link for ``user``"""
+    base_64_email = urlsafe_base64_encode(smart_bytes(user.email))
+    token = make_link_token(user, PASSWORD_RESET)
+    current_site = get_current_site(request).domain
+    link = reverse(
+        "password-reset-confirm",
+        kwargs={"base_64_email": base_64_email, "token": token},
+    )
+    absolute_url = settings.APP_SCHEME + current_site + link
+
+    return absolute_url + "?redirect_url=" + redirect_url
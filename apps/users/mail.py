@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+
+from django.conf import settings
+
+import requests
+from redis.exceptions import LockError
+from requests.adapters import HTTPAdapter
+
+from apps.commons.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_ACTIVATION = "account_activation"
+PASSWORD_RESET = "password_reset"
+
+# %recipient.<name>% placeholders are filled in by Mailgun from the
+# recipient-variables of the batch
+EMAIL_TEMPLATES = {
+    ACCOUNT_ACTIVATION: {
+        "subject": "Activate your account",
+        "text": "Hi %recipient.email% Use the link below to verify your email \n"
+        "%recipient.absolute_url%",
+    },
+    PASSWORD_RESET: {
+        "subject": "Reset your password",
+        "text": "Hi %recipient.email% Use the link below to reset your password \n"
+        "%recipient.absolute_url%",
+    },
+}
+
+FLUSH_SCHEDULED_KEY = "users:mail:flush-scheduled"
+
+_session = None
+_session_pid = None
+
+
+def get_session():
+    """Return the ``requests.Session`` of the current process so Mailgun
+    calls reuse pooled keep-alive connections instead of a new TLS handshake
+    per email"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=settings.MAILGUN_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def queue_key(template):
+    return f"users:mail:queue:{template}"
+
+
+def enqueue_email(template, email, absolute_url):
+    """Queue an email for the next batch of ``template``.
+
+    Returns True when the caller should schedule a flush, i.e. when no flush
+    is already due within ``EMAIL_BATCH_WINDOW`` seconds.
+    """
+    client = get_redis()
+    client.rpush(
+        queue_key(template), json.dumps({"email": email, "absolute_url": absolute_url})
+    )
+    return bool(
+        client.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=settings.EMAIL_BATCH_WINDOW)
+    )
+
+
+def processing_key(template):
+    return f"users:mail:processing:{template}"
+
+
+def dead_letter_key(template):
+    return f"users:mail:dead-letter:{template}"
+
+
+def flush_lock_key(template):
+    return f"users:mail:flush-lock:{template}"
+
+
+def claim_batch(template):
+    """Move the next batch of ``template`` from the queue to its processing
+    list, where it stays until Mailgun accepts or rejects it, and return it
+    as ``(raw, message)`` pairs. A batch left there by a flush that died is
+    returned again first."""
+    client = get_redis()
+    processing = processing_key(template)
+    raws = client.lrange(processing, 0, -1)
+    if not raws:
+        size = min(client.llen(queue_key(template)), settings.EMAIL_BATCH_SIZE)
+        with client.pipeline() as pipe:
+            for _ in range(size):
+                pipe.lmove(queue_key(template), processing, "LEFT", "RIGHT")
+            raws = [raw for raw in pipe.execute() if raw is not None]
+    return [(raw, json.loads(raw)) for raw in raws]
+
+
+def recipient_groups(batch):
+    """Split ``batch`` so no address appears twice in a group, as Mailgun
+    takes one set of recipient variables per address"""
+    groups = []
+    for raw, message in batch:
+        for group in groups:
+            if message["email"] not in group:
+                group[message["email"]] = (raw, message)
+                break
+        else:
+            groups.append({message["email"]: (raw, message)})
+    return [list(group.values()) for group in groups]
+
+
+def settle(template, group, dead_letter=False):
+    """Drop ``group`` from the processing list, onto the dead letter list
+    when Mailgun rejected it"""
+    raws = [raw for raw, _ in group]
+    with get_redis().pipeline() as pipe:
+        for raw in raws:
+            pipe.lrem(processing_key(template), 1, raw)
+        if dead_letter:
+            pipe.rpush(dead_letter_key(template), *raws)
+        pipe.execute()
+
+
+def is_permanent(error):
+    """Whether Mailgun will reject the same request again. Rate limits and
+    server errors are worth retrying"""
+    response = getattr(error, "response", None)
+    return (
+        isinstance(error, requests.HTTPError)
+        and response is not None
+        and 400 <= response.status_code < 500
+        and response.status_code != 429
+    )
+
+
+def send_batch(template, messages):
+    """Send ``messages``, to distinct addresses, with a single Mailgun batch
+    sending call"""
+    recipient_variables = {message["email"]: message for message in messages}
+    response = get_session().post(
+        settings.MAILGUN_BASE_URL,
+        auth=("api", settings.MAILGUN_API_KEY),
+        data={
+            "from": settings.SENDER,
+            "to": list(recipient_variables),
+            "subject": EMAIL_TEMPLATES[template]["subject"],
+            "text": EMAIL_TEMPLATES[template]["text"],
+            "recipient-variables": json.dumps(recipient_variables),
+        },
+        timeout=settings.MAILGUN_TIMEOUT,
+    )
+    response.raise_for_status()
+    logger.info(response.text)
+
+
+def flush(template):
+    """Send every queued email of ``template`` in batches.
+
+    Only one flush per template runs at a time. A batch Mailgun fails to
+    take stays in the processing list and is sent again by the next flush,
+    while one it rejects is moved to the dead letter list so it does not
+    hold up the rest of the queue.
+    """
+    lock = get_redis().lock(
+        flush_lock_key(template),
+        timeout=settings.MAILGUN_TIMEOUT * 2,
+        blocking=False,
+    )
+    if not lock.acquire():
+        return 0
+    sent = 0
+    try:
+        while True:
+            batch = claim_batch(template)
+            if not batch:
+                return sent
+            for group in recipient_groups(batch):
+                lock.reacquire()
+                try:
+                    send_batch(template, [message for _, message in group])
+                except Exception as error:
+                    if not is_permanent(error):
+                        raise
+                    logger.error(
+                        "Mailgun rejected %s %s emails, moved to %s",
+                        len(group),
+                        template,
+                        dead_letter_key(template),
+                        exc_info=True,
+                    )
+                    settle(template, group, dead_letter=True)
+                else:
+                    settle(template, group)
+                    sent += len(group)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # Expired during a slow send, another flush may hold it now
+            pass
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.hashers import ProfiledArgon2PasswordHasher
+
+
+class Command(BaseCommand):
+    help = "Measure password hashes per second for each hasher profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "profiles",
+            nargs="*",
+            help="Profiles to benchmark, defaults to all of PASSWORD_HASHER_PROFILES",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20,
+            help="Number of hashes per profile",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=1,
+            help="Number of concurrent hashing threads, e.g. LOGIN_HASHER_WORKERS",
+        )
+
+    def handle(self, *args, **options):
+        profiles = options["profiles"] or list(settings.PASSWORD_HASHER_PROFILES)
+        unknown = set(profiles) - set(settings.PASSWORD_HASHER_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        iterations = options["iterations"]
+        threads = options["threads"]
+        self.stdout.write(
+            f"{'profile':<12}{'time':>6}{'memory KiB':>12}{'lanes':>7}"
+            f"{'ms/hash':>10}{'hashes/s':>10}"
+        )
+        for profile in profiles:
+            hasher = ProfiledArgon2PasswordHasher(profile=profile)
+            salt = hasher.salt()
+
+            def hash_once(_):
+                hasher.encode("benchmark-password", salt)
+
+            hash_once(None)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(hash_once, range(iterations)))
+            elapsed = time.perf_counter() - started
+
+            params = hasher.profile_params
+            active = " (active)" if profile == settings.PASSWORD_HASHER_PROFILE else ""
+            self.stdout.write(
+                f"{profile:<12}{params['time_cost']:>6}{params['memory_cost']:>12}"
+                f"{params['parallelism']:>7}{elapsed / iterations * 1000:>10.1f}"
+                f"{iterations / elapsed:>10.1f}{active}"
+            )
@@ -11,8 +11,8 @@ class CustomUserManager(BaseUserManager):
         except ValidationError:
             raise ValueError(_("You must provide a valid email address"))
 
-    def create_user(self, first_name, last_name, email, password, **extra_fields):
-
+    def build_user(self, first_name, last_name, email, **extra_fields):
+        """Validated, unsaved user without a password"""
         if not first_name:
             raise ValueError(_("Users must submit a first name"))
 
@@ -25,10 +25,12 @@ class CustomUserManager(BaseUserManager):
         else:
             raise ValueError(_("Base User Account: An email address is required"))
 
-        user = self.model(
+        return self.model(
             first_name=first_name, last_name=last_name, email=email, **extra_fields
         )
 
+    def create_user(self, first_name, last_name, email, password, **extra_fields):
+        user = self.build_user(first_name, last_name, email, **extra_fields)
         user.set_password(password)
         extra_fields.setdefault("is_staff", False)
         extra_fields.setdefault("is_superuser", False)
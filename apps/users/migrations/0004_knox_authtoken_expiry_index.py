@@ -0,0 +1,21 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_remove_user_username"),
+        ("knox", "0008_remove_authtoken_salt"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS knox_authtoken_expiry_idx "
+                "ON knox_authtoken (expiry)"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS knox_authtoken_expiry_idx",
+        ),
+    ]
@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+from asgiref.sync import sync_to_async
+
+from apps.users.models import User
+
+
+class PasswordPoolFull(Exception):
+    pass
+
+
+class PasswordHashingPool:
+
+    """Bounded thread pool for password hashing.
+
+    Argon2 releases the GIL while hashing, so running it on a fixed number of
+    threads keeps the event loop free without letting a burst of logins use
+    more than ``max_workers`` cores. Once ``max_queue`` calls are waiting for
+    a thread, new calls are rejected instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hashing"
+        )
+
+    @property
+    def queue_depth(self):
+        return self.pending - self.running
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queue_depth": self.queue_depth,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def _call(self, func, *args):
+        with self._lock:
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordPoolFull()
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(self._call, func, *args)
+            )
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+
+password_pool = PasswordHashingPool(
+    max_workers=settings.LOGIN_HASHER_WORKERS,
+    max_queue=settings.LOGIN_HASHER_MAX_QUEUE,
+)
+
+
+def verify_password(password, encoded):
+    """Return whether ``password`` matches ``encoded`` and whether the hash
+    should be upgraded to the preferred hasher"""
+    outdated = []
+    valid = check_password(password, encoded, setter=outdated.append)
+    return valid, bool(outdated)
+
+
+async def aauthenticate(email, password):
+    """Async counterpart of ``auth.authenticate`` for email logins that runs
+    every password hash on ``password_pool``"""
+    try:
+        user = await User.objects.aget(email=email)
+    except User.DoesNotExist:
+        # Hash anyway so unknown emails take as long as wrong passwords
+        await password_pool.run(make_password, password)
+        return None
+
+    valid, outdated = await password_pool.run(verify_password, password, user.password)
+    if not valid or not user.is_active:
+        return None
+    if outdated:
+        user.password = await password_pool.run(make_password, password)
+        # Saved rather than updated so post_save drops the cached tokens
+        await sync_to_async(user.save)(update_fields=["password"])
+    return user
@@ -1,29 +1,23 @@
 import django.contrib.auth.password_validation as validators
 from django.conf import settings
 from django.contrib import auth
-from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.contrib.sites.shortcuts import get_current_site
 from django.core import exceptions
 from django.db.transaction import atomic
-from django.urls import reverse
-from django.utils.encoding import (
-    DjangoUnicodeDecodeError,
-    force_str,
-    smart_bytes,
-    smart_str,
-)
-from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
 from knox.models import AuthToken
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed
 
+from apps.commons import outbox
+from apps.users.links import password_reset_url, verification_url
 from apps.users.models import User
+from apps.users.services import VERIFICATION_FIELDS, user_by_email, user_for_link_token
 from apps.users.tasks import (
     send_account_activation_email,
     send_new_account_activation_email,
     send_password_reset_email,
 )
+from apps.users.tokens import PASSWORD_RESET, VERIFY_EMAIL
 
 
 class RegisterUserSerializer(serializers.ModelSerializer):
@@ -67,54 +61,41 @@ class RegisterUserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
 
         request = self.context.get("request")
-        current_site = get_current_site(request).domain
-        link = reverse("verify_email")
-        token = PasswordResetTokenGenerator().make_token(user)
-        base_64_email = urlsafe_base64_encode(smart_bytes(user.email))
-        absolute_url = (
-            settings.APP_SCHEME
-            + current_site
-            + link
-            + "?token="
-            + str(token)
-            + "&uid="
-            + str(base_64_email)
-        )
+        absolute_url = verification_url(request, user)
 
-        send_account_activation_email.delay(email=user.email, absolute_url=absolute_url)
+        outbox.enqueue(
+            send_account_activation_email, email=user.email, absolute_url=absolute_url
+        )
 
         return user
 
 
+class AsyncRegisterUserSerializer(RegisterUserSerializer):
+
+    """Registration fields for the async view, which checks that the email
+    is free with the async ORM instead of the model unique validator"""
+
+    email = serializers.EmailField(max_length=254)
+
+
 class RequestNewRegistrationLinkSerializer(serializers.Serializer):
     email = serializers.EmailField(min_length=2, max_length=100)
 
     def validate(self, attrs):
         email = attrs.get("email", "")
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+        user = user_by_email(email, VERIFICATION_FIELDS)
+        if user is None:
             raise serializers.ValidationError("user does not exist")
         if user.is_verified:
             raise serializers.ValidationError("email is already verified")
 
         request = self.context.get("request")
-        current_site = get_current_site(request).domain
-        link = reverse("verify_email")
-        base_64_email = urlsafe_base64_encode(smart_bytes(user.email))
-        token = PasswordResetTokenGenerator().make_token(user)
-        absolute_url = (
-            settings.APP_SCHEME
-            + current_site
-            + link
-            + "?token="
-            + str(token)
-            + "&uid="
-            + str(base_64_email)
-        )
+        absolute_url = verification_url(request, user)
 
-        send_new_account_activation_email.delay(
-            email=user.email, absolute_url=absolute_url
+        outbox.enqueue(
+            send_new_account_activation_email,
+            email=user.email,
+            absolute_url=absolute_url,
         )
 
         return attrs
@@ -122,14 +103,12 @@ class RequestNewRegistrationLinkSerializer(serializers.Serializer):
 
 class VerifyEmailSerializer(serializers.Serializer):
     def validate(self, attrs):
-        token = self.context.get("request").query_params["token"]
-        base_64_email = self.context.get("request").query_params["uid"]
-        email = smart_str(urlsafe_base64_decode(base_64_email))
-        user = User.objects.get(email=email)
-        if PasswordResetTokenGenerator().check_token(user, token):
+        token = self.context.get("request").query_params.get("token", "")
+        user = user_for_link_token(token, VERIFY_EMAIL, VERIFICATION_FIELDS)
+        if user is not None:
             if not user.is_verified:
                 user.is_verified = True
-                user.save()
+                user.save(update_fields=["is_verified"])
 
         else:
             raise serializers.ValidationError("Invalid token, try again")
@@ -164,31 +143,33 @@ class LoginSerializer(serializers.ModelSerializer):
         }
 
 
-class RequestPasswordResetSerializer(serializers.Serializer):
+class LoginCredentialsSerializer(serializers.Serializer):
+
+    """Field validation for the async login view, which authenticates
+    outside of the serializer"""
+
+    email = serializers.EmailField(max_length=255, min_length=3)
+    password = serializers.CharField(min_length=8, write_only=True)
+
+
+class PasswordResetEmailSerializer(serializers.Serializer):
     email = serializers.EmailField(min_length=2)
     redirect_url = serializers.CharField(max_length=500, required=False)
 
+
+class RequestPasswordResetSerializer(PasswordResetEmailSerializer):
     def validate(self, attrs):
 
         email = attrs.get("email")
         request = self.context.get("request")
         redirect_url = attrs.get("redirect_url", "")
-        if User.objects.filter(email=email).exists():
-            user = User.objects.get(email=email)
-            base_64_email = urlsafe_base64_encode(smart_bytes(user.email))
-            token = PasswordResetTokenGenerator().make_token(user)
-            current_site = get_current_site(request).domain
-            link = reverse(
-                "password-reset-confirm",
-                kwargs={"base_64_email": base_64_email, "token": token},
-            )
-            absolute_url = settings.APP_SCHEME + current_site + link
+        user = user_by_email(email)
+        if user is not None:
+            url = password_reset_url(request, user, redirect_url)
 
-            url = absolute_url + "?redirect_url=" + redirect_url
-
-            send_password_reset_email.delay(email=user.email, absolute_url=url)
-        else:
-            pass
+            outbox.enqueue(
+                send_password_reset_email, email=user.email, absolute_url=url
+            )
         return attrs
 
 
@@ -231,43 +212,29 @@ class ChangePasswordSerializer(serializers.ModelSerializer):
 
 class PasswordTokenCheckSerializer(serializers.Serializer):
     def validate(self, attrs):
-        try:
-            base_64_email = self.context.get("request").path.split("/")[3]
-            token = self.context.get("request").path.split("/")[4]
-            redirect_url = self.context.get("request").query_params["redirect_url"]
-            email = smart_str(urlsafe_base64_decode(base_64_email))
-            user = User.objects.get(email=email)
-
-            if not PasswordResetTokenGenerator().check_token(user, token):
-
-                if len(redirect_url) > 3:
-                    final_url = redirect_url + "?token_valid=False"
-                    return final_url
-                else:
-                    final_url = settings.FRONTEND_URL + "?token_valid=False"
-                    return final_url
-            if redirect_url and len(redirect_url) > 3:
-                final_url = (
-                    redirect_url
-                    + "?token_valid=True&message=Credentials Valid&base_64_email="
-                    + base_64_email
-                    + "&token="
-                    + token
-                )
+        base_64_email = self.context.get("request").path.split("/")[3]
+        token = self.context.get("request").path.split("/")[4]
+        redirect_url = self.context.get("request").query_params.get("redirect_url", "")
+
+        if user_for_link_token(token, PASSWORD_RESET) is None:
+            if len(redirect_url) > 3:
+                final_url = redirect_url + "?token_valid=False"
                 return final_url
             else:
                 final_url = settings.FRONTEND_URL + "?token_valid=False"
                 return final_url
-
-        except DjangoUnicodeDecodeError:
-            try:
-                if not PasswordResetTokenGenerator().check_token(user):
-                    final_url = redirect_url + "?token_valid=False"
-                    return final_url
-            except UnboundLocalError:
-                raise serializers.ValidationError(
-                    "Token is not valid, please request a new one"
-                )
+        if redirect_url and len(redirect_url) > 3:
+            final_url = (
+                redirect_url
+                + "?token_valid=True&message=Credentials Valid&base_64_email="
+                + base_64_email
+                + "&token="
+                + token
+            )
+            return final_url
+        else:
+            final_url = settings.FRONTEND_URL + "?token_valid=False"
+            return final_url
 
 
 class SetNewPasswordSerializer(serializers.ModelSerializer):
@@ -281,20 +248,16 @@ class SetNewPasswordSerializer(serializers.ModelSerializer):
 
     def validate(self, attrs):
         try:
-            breakpoint()
-
             token = attrs.get("token")
-            base_64_email = attrs.get("base_64_email")
             password = attrs.get("password")
 
-            email = force_str(urlsafe_base64_decode(base_64_email))
-            user = User.objects.get(email=email)
-            if not PasswordResetTokenGenerator().check_token(user, token):
+            user = user_for_link_token(token, PASSWORD_RESET)
+            if user is None:
                 raise AuthenticationFailed("The reset link is invalid", 401)
             attrs.pop("token")
             attrs.pop("base_64_email")
             user.set_password(password)
-            user.save
+            user.save()
 
             return attrs
 
@@ -0,0 +1,34 @@
+from apps.users.models import User
+from apps.users.tokens import check_link_token, read_link_token
+
+# Columns PasswordResetTokenGenerator hashes into its tokens
+TOKEN_FIELDS = ("pkid", "email", "password", "last_login")
+VERIFICATION_FIELDS = TOKEN_FIELDS + ("is_verified",)
+
+
+def user_by_email(email, fields=TOKEN_FIELDS):
+    """Fetch the user with ``email`` in a single query loading only
+    ``fields``, or None when there is no such user"""
+    return User.objects.filter(email=email).only(*fields).first()
+
+
+async def auser_by_email(email, fields=TOKEN_FIELDS):
+    return await User.objects.filter(email=email).only(*fields).afirst()
+
+
+def user_for_link_token(token, purpose, fields=TOKEN_FIELDS):
+    """User a ``purpose`` link token was issued to, or None when the token is
+    invalid. Expired and tampered tokens are refused without a query"""
+    payload = read_link_token(token, purpose)
+    if payload is None:
+        return None
+    user = user_by_email(payload["email"], fields)
+    return user if check_link_token(user, payload) else None
+
+
+async def auser_for_link_token(token, purpose, fields=TOKEN_FIELDS):
+    payload = read_link_token(token, purpose)
+    if payload is None:
+        return None
+    user = await auser_by_email(payload["email"], fields)
+    return user if check_link_token(user, payload) else None
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from knox.models import AuthToken
+
+from apps.users.authentication import invalidate_cached_tokens, invalidate_user_tokens
+from apps.users.models import User
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_cached_tokens(instance.digest)
+
+
+@receiver(post_save, sender=User)
+def invalidate_tokens_of_saved_user(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    invalidate_user_tokens(instance)
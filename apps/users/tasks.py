@@ -1,116 +1,72 @@
 import logging
-import os
 
-import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
 from celery import shared_task
+from knox.models import AuthToken
+
+from apps.users import mail
 
 logger = logging.getLogger(__name__)
 
-mailgun_base_url = os.environ.get("MAILGUN_BASE_URL")
-mailgun_api_key = os.environ.get("MAILGUN_API_KEY")
-sender = os.environ.get("SENDER")
-
-
-@shared_task(
-    bind=True,
-    autoretry_for=(Exception,),
-    retry_backoff=5,
-    retry_jitter=True,
-    retry_kwargs={"max_retries": 5},
-)
-def send_account_activation_email(
-    self,
-    email,
-    absolute_url,
-    mailgun_base_url=mailgun_base_url,
-    mailgun_api_key=mailgun_api_key,
-    sender=sender,
-):
-    try:
-        mailing_data = {
-            "from": sender,
-            "to": email,
-            "subject": "Activate your account",
-            "text": "Hi "
-            + email
-            + " Use the link below to verify your email \n"
-            + absolute_url,
-        }
-        response = requests.post(
-            mailgun_base_url,
-            auth=("api", mailgun_api_key),
-            data=mailing_data,
-        )
-        logger.info(response.text)
-    except Exception as e:
-        logger.error(e)
-
-
-@shared_task(
-    bind=True,
-    autoretry_for=(Exception,),
-    retry_backoff=5,
-    retry_jitter=True,
-    retry_kwargs={"max_retries": 5},
-)
-def send_new_account_activation_email(
-    self,
-    email,
-    absolute_url,
-    mailgun_base_url=mailgun_base_url,
-    mailgun_api_key=mailgun_api_key,
-    sender=sender,
-):
-    try:
-        mailing_data = {
-            "from": sender,
-            "to": email,
-            "subject": "Activate your account",
-            "text": "Hi "
-            + email
-            + " Use the link below to verify your email \n"
-            + absolute_url,
-        }
-        response = requests.post(
-            mailgun_base_url,
-            auth=("api", mailgun_api_key),
-            data=mailing_data,
-        )
-        logger.info(response.text)
-    except Exception as e:
-        logger.error(e)
-
-
-@shared_task(
-    bind=True,
-    autoretry_for=(Exception,),
-    retry_backoff=5,
-    retry_jitter=True,
-    retry_kwargs={"max_retries": 5},
-)
-def send_password_reset_email(
-    self,
-    email,
-    absolute_url,
-    mailgun_base_url=mailgun_base_url,
-    mailgun_api_key=mailgun_api_key,
-    sender=sender,
-):
-    try:
-        mailing_data = {
-            "from": sender,
-            "to": email,
-            "subject": "Reset your password",
-            "text": "Hi "
-            + email
-            + " Use the link below to reset your password \n"
-            + absolute_url,
-        }
-        response = requests.post(
-            mailgun_base_url,
-            auth=("api", mailgun_api_key),
-            data=mailing_data,
+EMAIL_TASK_OPTIONS = {
+    "bind": True,
+    "autoretry_for": (Exception,),
+    "retry_backoff": 5,
+    "retry_jitter": True,
+    "retry_kwargs": {"max_retries": 5},
+}
+
+
+def queue_email(template, email, absolute_url):
+    if mail.enqueue_email(template, email, absolute_url):
+        flush_email_queue.apply_async(countdown=settings.EMAIL_BATCH_WINDOW)
+
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def send_account_activation_email(self, email, absolute_url):
+    queue_email(mail.ACCOUNT_ACTIVATION, email, absolute_url)
+
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def send_new_account_activation_email(self, email, absolute_url):
+    queue_email(mail.ACCOUNT_ACTIVATION, email, absolute_url)
+
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def send_password_reset_email(self, email, absolute_url):
+    queue_email(mail.PASSWORD_RESET, email, absolute_url)
+
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def flush_email_queue(self):
+    """Send the queued emails of every template as Mailgun batches"""
+    for template in mail.EMAIL_TEMPLATES:
+        sent = mail.flush(template)
+        if sent:
+            logger.info(f"Sent {sent} {template} emails")
+
+
+@shared_task
+def purge_expired_auth_tokens(batch_size=None):
+    """Delete expired knox tokens, oldest expiry first, committing after
+    every ``KNOX_PURGE_BATCH_SIZE`` tokens so no lock is held for long"""
+    batch_size = batch_size or settings.KNOX_PURGE_BATCH_SIZE
+    now = timezone.now()
+    purged = 0
+    while True:
+        digests = list(
+            AuthToken.objects.filter(expiry__lt=now)
+            .order_by("expiry")
+            .values_list("digest", flat=True)[:batch_size]
         )
-        logger.info(response.text)
-    except Exception as e:
-        logger.error(e)
+        if not digests:
+            break
+        with transaction.atomic():
+            AuthToken.objects.filter(digest__in=digests).delete()
+        purged += len(digests)
+
+    logger.info(f"Purged {purged} expired auth tokens")
+    return purged
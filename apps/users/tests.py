@@ -0,0 +1,580 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import smart_bytes
+from django.utils.http import urlsafe_base64_encode
+
+import requests
+from asgiref.sync import async_to_sync
+from knox.models import AuthToken
+from rest_framework.test import APIClient
+
+from apps.commons.models import OutboxMessage
+from apps.commons.testing import FakeRedisMixin
+from apps.users import mail
+from apps.users.authentication import CachedTokenAuthentication, token_cache_key
+from apps.users.models import User
+from apps.users.passwords import (
+    PasswordHashingPool,
+    PasswordPoolFull,
+    aauthenticate,
+    password_pool,
+)
+from apps.users.tasks import purge_expired_auth_tokens
+from apps.users.tokens import PASSWORD_RESET, VERIFY_EMAIL, make_link_token
+
+PASSWORD = "Sup3r-secret-pass"
+SAVEPOINT_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class UserAuthQueryCountTests(TestCase):
+
+    """Upper bounds on the SQL statements issued by the users auth endpoints.
+    Savepoints from ATOMIC_REQUESTS and nested atomic blocks are not counted"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            first_name="Ada",
+            last_name="Baker",
+            email="ada@example.com",
+            password=PASSWORD,
+            phone_number="+2348012345678",
+        )
+
+    def setUp(self):
+        # Throttling needs Redis and issues no SQL
+        patcher = mock.patch(
+            "apps.commons.throttling.sliding_window_hit", return_value=(True, 0)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @contextmanager
+    def assertMaxQueries(self, maximum):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = [
+            query["sql"]
+            for query in context.captured_queries
+            if not query["sql"].startswith(SAVEPOINT_STATEMENTS)
+        ]
+        self.assertLessEqual(
+            len(executed),
+            maximum,
+            f"{len(executed)} queries executed, expected at most {maximum}:\n"
+            + "\n".join(executed),
+        )
+
+    def uid(self):
+        return urlsafe_base64_encode(smart_bytes(self.user.email))
+
+    def registration_payload(self, email):
+        return {
+            "email": email,
+            "password": PASSWORD,
+            "password2": PASSWORD,
+            "first_name": "Grace",
+            "last_name": "Oven",
+            "phone_number": "+2348012345679",
+        }
+
+    def test_register(self):
+        with self.assertMaxQueries(3):
+            response = self.client.post(
+                reverse("register"), self.registration_payload("grace@example.com")
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_new_registration_link(self):
+        with self.assertMaxQueries(2):
+            response = self.client.post(
+                reverse("new_registration_link"), {"email": self.user.email}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_new_registration_link_unknown_user(self):
+        with self.assertMaxQueries(1):
+            response = self.client.post(
+                reverse("new_registration_link"), {"email": "nobody@example.com"}
+            )
+        self.assertEqual(response.status_code, 400)
+
+    def test_verify_email(self):
+        token = make_link_token(self.user, VERIFY_EMAIL)
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse("verify_email"), {"token": token})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+
+    def test_verify_email_invalid_token(self):
+        with self.assertMaxQueries(0):
+            response = self.client.get(reverse("verify_email"), {"token": "invalid"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_verify_email_with_password_reset_token(self):
+        token = make_link_token(self.user, PASSWORD_RESET)
+        with self.assertMaxQueries(0):
+            response = self.client.get(reverse("verify_email"), {"token": token})
+        self.assertEqual(response.status_code, 400)
+
+    def test_request_password_reset(self):
+        with self.assertMaxQueries(2):
+            response = self.client.post(
+                reverse("request-reset-email"), {"email": self.user.email}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_request_password_reset_unknown_user(self):
+        with self.assertMaxQueries(1):
+            response = self.client.post(
+                reverse("request-reset-email"), {"email": "nobody@example.com"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_password_reset_token_check(self):
+        url = reverse(
+            "password-reset-confirm",
+            kwargs={
+                "base_64_email": self.uid(),
+                "token": make_link_token(self.user, PASSWORD_RESET),
+            },
+        )
+        with self.assertMaxQueries(1):
+            response = self.client.get(url, {"redirect_url": "http://bakery.test"})
+        self.assertEqual(response.status_code, 301)
+        self.assertIn("token_valid=True", response["Location"])
+
+    def test_async_register(self):
+        with self.assertMaxQueries(3):
+            response = async_to_sync(self.async_client.post)(
+                reverse("async_register"),
+                self.registration_payload("grace@example.com"),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_async_register_taken_email(self):
+        payload = self.registration_payload(self.user.email)
+        with self.assertMaxQueries(1):
+            response = async_to_sync(self.async_client.post)(
+                reverse("async_register"), payload, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("email", response.json())
+
+    def test_async_register_concurrent_registration(self):
+        # The other registration commits between the check and the insert
+        exists = mock.patch(
+            "django.db.models.query.QuerySet.aexists",
+            new=mock.AsyncMock(return_value=False),
+        )
+        with exists:
+            response = async_to_sync(self.async_client.post)(
+                reverse("async_register"),
+                self.registration_payload(self.user.email),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("email", response.json())
+
+    def test_async_verify_email(self):
+        token = make_link_token(self.user, VERIFY_EMAIL)
+        # The user, its update and the token digests to drop from the cache
+        with self.assertMaxQueries(3):
+            response = async_to_sync(self.async_client.get)(
+                reverse("async_verify_email"), {"token": token}
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_async_login_pool_full(self):
+        full = mock.patch.object(
+            password_pool, "run", new=mock.AsyncMock(side_effect=PasswordPoolFull)
+        )
+        with full:
+            response = async_to_sync(self.async_client.post)(
+                reverse("async_login"),
+                {"email": self.user.email, "password": PASSWORD},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_async_request_password_reset(self):
+        with self.assertMaxQueries(2):
+            response = async_to_sync(self.async_client.post)(
+                reverse("async-request-reset-email"),
+                {"email": self.user.email},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class TokenCacheInvalidationTests(FakeRedisMixin, TestCase):
+
+    """Knox token cache invalidation against a Redis-backed cache, where
+    deleting no keys is an error"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            first_name="Ada",
+            last_name="Baker",
+            email="ada@example.com",
+            password=PASSWORD,
+            phone_number="+2348012345678",
+        )
+
+    def test_saving_user_without_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+    def test_verify_email_of_new_user(self):
+        token = make_link_token(self.user, VERIFY_EMAIL)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse("verify_email"), {"token": token})
+        self.assertEqual(response.status_code, 200)
+
+    def test_change_password(self):
+        _, token = AuthToken.objects.create(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("change_password"),
+                {"old_password": PASSWORD, "new_password": "An0ther-secret-pass"},
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"Token {token}",
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_set_new_password(self):
+        payload = {
+            "password": "An0ther-secret-pass",
+            "token": make_link_token(self.user, PASSWORD_RESET),
+            "base_64_email": urlsafe_base64_encode(smart_bytes(self.user.email)),
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("password-reset-complete"),
+                payload,
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_token_dropped_once_user_save_commits(self):
+        auth_token, token = AuthToken.objects.create(self.user)
+        CachedTokenAuthentication().authenticate_credentials(token.encode())
+        key = token_cache_key(auth_token.digest)
+        self.assertIsNotNone(cache.get(key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+            self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(key))
+
+    def cache_token(self):
+        auth_token, token = AuthToken.objects.create(self.user)
+        CachedTokenAuthentication().authenticate_credentials(token.encode())
+        key = token_cache_key(auth_token.digest)
+        self.assertIsNotNone(cache.get(key))
+        return key
+
+    def test_async_verify_email_drops_cached_token(self):
+        key = self.cache_token()
+        token = make_link_token(self.user, VERIFY_EMAIL)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = async_to_sync(self.async_client.get)(
+                reverse("async_verify_email"), {"token": token}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(cache.get(key))
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+            "django.contrib.auth.hashers.UnsaltedMD5PasswordHasher",
+        ]
+    )
+    def test_async_login_rehash_drops_cached_token(self):
+        self.user.password = make_password(PASSWORD, hasher="unsalted_md5")
+        self.user.save()
+        key = self.cache_token()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = async_to_sync(aauthenticate)(self.user.email, PASSWORD)
+        self.assertTrue(user.password.startswith("md5$"))
+        self.assertIsNone(cache.get(key))
+
+
+class MailQueueTests(FakeRedisMixin, SimpleTestCase):
+
+    """Batched Mailgun sends from the Redis email queue"""
+
+    template = mail.ACCOUNT_ACTIVATION
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(mail, "get_session")
+        self.post = patcher.start().return_value.post
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(mail, "logger")
+        self.logger = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def queue(self, *emails):
+        for email in emails:
+            mail.enqueue_email(self.template, email, f"http://bakery.test/{email}")
+
+    def response(self, status_code):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = b"{}"
+        return response
+
+    def sent_recipients(self):
+        return [call.kwargs["data"]["to"] for call in self.post.call_args_list]
+
+    def remaining(self, key):
+        return self.redis.llen(key(self.template))
+
+    def test_sends_one_batch(self):
+        self.post.return_value = self.response(200)
+        self.queue("a@example.com", "b@example.com")
+
+        self.assertEqual(mail.flush(self.template), 2)
+        self.assertEqual(self.sent_recipients(), [["a@example.com", "b@example.com"]])
+        self.assertEqual(self.remaining(mail.queue_key), 0)
+        self.assertEqual(self.remaining(mail.processing_key), 0)
+
+    def test_same_address_twice_is_sent_twice(self):
+        self.post.return_value = self.response(200)
+        self.queue("a@example.com", "b@example.com", "a@example.com")
+
+        self.assertEqual(mail.flush(self.template), 3)
+        self.assertEqual(
+            self.sent_recipients(),
+            [["a@example.com", "b@example.com"], ["a@example.com"]],
+        )
+
+    def test_server_error_keeps_batch_for_next_flush(self):
+        self.post.return_value = self.response(503)
+        self.queue("a@example.com")
+
+        with self.assertRaises(requests.HTTPError):
+            mail.flush(self.template)
+        self.assertEqual(self.remaining(mail.processing_key), 1)
+
+        self.post.return_value = self.response(200)
+        self.queue("b@example.com")
+        self.assertEqual(mail.flush(self.template), 2)
+        self.assertEqual(
+            self.sent_recipients()[1:], [["a@example.com"], ["b@example.com"]]
+        )
+
+    def test_batch_claimed_by_a_dead_flush_is_sent(self):
+        self.post.return_value = self.response(200)
+        self.queue("a@example.com")
+        mail.claim_batch(self.template)
+        self.assertEqual(self.remaining(mail.queue_key), 0)
+
+        self.assertEqual(mail.flush(self.template), 1)
+        self.assertEqual(self.remaining(mail.processing_key), 0)
+
+    def test_rejected_batch_is_dead_lettered(self):
+        self.post.side_effect = [self.response(400), self.response(200)]
+        with override_settings(EMAIL_BATCH_SIZE=1):
+            self.queue("bad@example.com", "a@example.com")
+            self.assertEqual(mail.flush(self.template), 1)
+
+        self.logger.error.assert_called_once()
+        self.assertEqual(self.remaining(mail.dead_letter_key), 1)
+        self.assertEqual(self.remaining(mail.processing_key), 0)
+        self.assertEqual(self.sent_recipients()[1], ["a@example.com"])
+
+    def test_one_flush_per_template(self):
+        self.queue("a@example.com")
+        with self.redis.lock(mail.flush_lock_key(self.template), timeout=10):
+            self.assertEqual(mail.flush(self.template), 0)
+        self.post.assert_not_called()
+
+
+class PasswordHashingPoolTests(SimpleTestCase):
+    def test_rejects_calls_beyond_workers_and_queue(self):
+        pool = PasswordHashingPool(max_workers=1, max_queue=1)
+        release = threading.Event()
+
+        async def scenario():
+            calls = [asyncio.ensure_future(pool.run(release.wait, 5)) for _ in range(2)]
+            while pool.stats()["running"] < 1:
+                await asyncio.sleep(0.01)
+            with self.assertRaises(PasswordPoolFull):
+                await pool.run(release.wait, 5)
+            busy = pool.stats()
+            release.set()
+            return busy, await asyncio.gather(*calls)
+
+        busy, results = async_to_sync(scenario)()
+        self.assertEqual(results, [True, True])
+        self.assertEqual(
+            busy,
+            {
+                "max_workers": 1,
+                "max_queue": 1,
+                "running": 1,
+                "queue_depth": 1,
+                "completed": 0,
+                "rejected": 1,
+            },
+        )
+        stats = pool.stats()
+        self.assertEqual((stats["running"], stats["queue_depth"]), (0, 0))
+        self.assertEqual((stats["completed"], stats["rejected"]), (2, 1))
+
+    def test_errors_free_the_slot(self):
+        pool = PasswordHashingPool(max_workers=1, max_queue=0)
+
+        async def scenario():
+            with self.assertRaises(ZeroDivisionError):
+                await pool.run(divmod, 1, 0)
+            return await pool.run(divmod, 7, 2)
+
+        self.assertEqual(async_to_sync(scenario)(), (3, 1))
+        self.assertEqual(pool.stats()["completed"], 2)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["apps.users.hashers.ProfiledArgon2PasswordHasher"],
+    PASSWORD_HASHER_PROFILES={
+        "fast": {"time_cost": 1, "memory_cost": 64, "parallelism": 1},
+        "slow": {"time_cost": 2, "memory_cost": 128, "parallelism": 1},
+    },
+    PASSWORD_HASHER_PROFILE="fast",
+)
+class HasherProfileTests(TestCase):
+
+    """Argon2 cost taken from PASSWORD_HASHER_PROFILE, with hashes of other
+    profiles upgraded on login"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name="Ada",
+            last_name="Baker",
+            email="ada@example.com",
+            password=PASSWORD,
+            phone_number="+2348012345678",
+        )
+
+    def params(self, encoded):
+        decoded = identify_hasher(encoded).decode(encoded)
+        return decoded["time_cost"], decoded["memory_cost"]
+
+    def test_hashes_use_the_active_profile(self):
+        self.assertEqual(self.params(self.user.password), (1, 64))
+        with self.settings(PASSWORD_HASHER_PROFILE="slow"):
+            self.assertEqual(self.params(make_password(PASSWORD)), (2, 128))
+
+    def test_login_rehashes_with_a_new_profile(self):
+        with self.settings(PASSWORD_HASHER_PROFILE="slow"):
+            user = async_to_sync(aauthenticate)(self.user.email, PASSWORD)
+        self.assertEqual(self.params(user.password), (2, 128))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, user.password)
+
+    def test_login_with_the_active_profile_keeps_the_hash(self):
+        encoded = self.user.password
+        user = async_to_sync(aauthenticate)(self.user.email, PASSWORD)
+        self.assertEqual(user.password, encoded)
+
+    def test_hashes_of_other_profiles_still_verify(self):
+        with self.settings(PASSWORD_HASHER_PROFILE="slow"):
+            self.assertTrue(check_password(PASSWORD, self.user.password))
+
+    def test_unknown_profile(self):
+        with self.settings(PASSWORD_HASHER_PROFILE="medium"):
+            with self.assertRaises(ImproperlyConfigured):
+                make_password(PASSWORD)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class AuthTokenPurgeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            first_name="Ada",
+            last_name="Baker",
+            email="ada@example.com",
+            password=PASSWORD,
+            phone_number="+2348012345678",
+        )
+        cls.other = User.objects.create_user(
+            first_name="Grace",
+            last_name="Oven",
+            email="grace@example.com",
+            password=PASSWORD,
+            phone_number="+2348012345679",
+        )
+
+    def tokens(self, user, count, expiry):
+        for _ in range(count):
+            AuthToken.objects.create(user, expiry=expiry)
+
+    def test_purge_deletes_expired_tokens_in_batches(self):
+        self.tokens(self.user, 3, timedelta(hours=1))
+        self.tokens(self.user, 1, None)
+        self.tokens(self.user, 3, -timedelta(hours=1))
+        self.tokens(self.other, 2, -timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(purge_expired_auth_tokens(batch_size=2), 5)
+        deletes = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("DELETE")
+        ]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 4)
+        self.assertFalse(AuthToken.objects.filter(user=self.other).exists())
+
+        self.assertEqual(purge_expired_auth_tokens(), 0)
+
+    def test_stats(self):
+        self.tokens(self.user, 2, timedelta(hours=1))
+        self.tokens(self.user, 1, None)
+        self.tokens(self.user, 1, -timedelta(hours=1))
+        self.tokens(self.other, 2, -timedelta(hours=1))
+        client = APIClient()
+
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(reverse("auth_token_stats")).status_code, 403)
+
+        self.user.is_staff = True
+        client.force_authenticate(self.user)
+        response = client.get(reverse("auth_token_stats"))
+        self.assertEqual(
+            response.json(),
+            [
+                {"email": "ada@example.com", "live": 3, "expired": 1},
+                {"email": "grace@example.com", "live": 0, "expired": 2},
+            ],
+        )
+        response = client.get(reverse("auth_token_stats"), {"limit": 1})
+        self.assertEqual(len(response.json()), 1)
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core import signing
+
+VERIFY_EMAIL = "verify-email"
+PASSWORD_RESET = "password-reset"
+
+token_generator = PasswordResetTokenGenerator()
+
+
+def make_link_token(user, purpose):
+    """Signed token for the ``purpose`` link of ``user``.
+
+    The signature and its timestamp let stale or tampered links be refused
+    without a query. The embedded ``PasswordResetTokenGenerator`` token is
+    checked against the user row afterwards, so a reset link stops working
+    once the password changes.
+    """
+    return signing.dumps(
+        {"email": user.email, "token": token_generator.make_token(user)},
+        salt=f"apps.users.tokens.{purpose}",
+    )
+
+
+def read_link_token(token, purpose):
+    """Payload of a ``purpose`` link token, or None when it was tampered with
+    or is older than ``PASSWORD_RESET_TIMEOUT``. Never touches the DB"""
+    try:
+        return signing.loads(
+            token,
+            salt=f"apps.users.tokens.{purpose}",
+            max_age=settings.PASSWORD_RESET_TIMEOUT,
+        )
+    except signing.BadSignature:
+        return None
+
+
+def check_link_token(user, payload):
+    return user is not None and token_generator.check_token(user, payload["token"])
@@ -1,8 +1,16 @@
 from django.urls import path
 
 from apps.users.views import (
+    AsyncLoginView,
+    AsyncRegisterView,
+    AsyncRequestPasswordResetView,
+    AsyncVerifyEmailView,
+    AuthTokenStatsView,
     ChangePasswordView,
     LoginView,
+    LogoutAllView,
+    LogoutView,
+    PasswordHashingPoolStatsView,
     PasswordTokenCheckView,
     RegisterView,
     RequestNewRegistrationLinkView,
@@ -13,18 +21,38 @@ from apps.users.views import (
 
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="register"),
+    path("register/async/", AsyncRegisterView.as_view(), name="async_register"),
     path(
         "new-registration-link/",
         RequestNewRegistrationLinkView.as_view(),
         name="new_registration_link",
     ),
     path("verify-email/", VerifyEmailView.as_view(), name="verify_email"),
+    path(
+        "verify-email/async/",
+        AsyncVerifyEmailView.as_view(),
+        name="async_verify_email",
+    ),
     path("login/", LoginView.as_view(), name="login"),
+    path("login/async/", AsyncLoginView.as_view(), name="async_login"),
+    path("logout/", LogoutView.as_view(), name="logout"),
+    path("logout-all/", LogoutAllView.as_view(), name="logout_all"),
+    path("tokens/stats/", AuthTokenStatsView.as_view(), name="auth_token_stats"),
+    path(
+        "login/pool-stats/",
+        PasswordHashingPoolStatsView.as_view(),
+        name="password_hashing_pool_stats",
+    ),
     path(
         "request-password-reset/",
         RequestPasswordResetView.as_view(),
         name="request-reset-email",
     ),
+    path(
+        "request-password-reset/async/",
+        AsyncRequestPasswordResetView.as_view(),
+        name="async-request-reset-email",
+    ),
     path(
         "password-reset/<base_64_email>/<token>/",
         PasswordTokenCheckView.as_view(),
@@ -1,15 +1,39 @@
+import json
+import math
+
 from django.conf import settings
-from django.http import HttpResponsePermanentRedirect
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.http import HttpResponsePermanentRedirect, JsonResponse
+from django.utils import timezone
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
+from asgiref.sync import sync_to_async
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import generics, status
+from knox import views as knox_views
+from knox.models import AuthToken
+from rest_framework import generics, permissions, status
 from rest_framework.generics import GenericAPIView
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
+from apps.commons import outbox
+from apps.users.authentication import CachedTokenAuthentication
+from apps.users.links import password_reset_url, verification_url
+from apps.users.models import User
+from apps.users.passwords import PasswordPoolFull, aauthenticate, password_pool
 from apps.users.serializers import (
+    AsyncRegisterUserSerializer,
     ChangePasswordSerializer,
+    LoginCredentialsSerializer,
     LoginSerializer,
+    PasswordResetEmailSerializer,
     PasswordTokenCheckSerializer,
     RegisterUserSerializer,
     RequestNewRegistrationLinkSerializer,
@@ -17,6 +41,13 @@ from apps.users.serializers import (
     SetNewPasswordSerializer,
     VerifyEmailSerializer,
 )
+from apps.users.services import (
+    VERIFICATION_FIELDS,
+    auser_by_email,
+    auser_for_link_token,
+)
+from apps.users.tasks import send_account_activation_email, send_password_reset_email
+from apps.users.tokens import VERIFY_EMAIL
 
 
 class CustomRedirect(HttpResponsePermanentRedirect):
@@ -40,6 +71,7 @@ class RegisterView(GenericAPIView):
 class RequestNewRegistrationLinkView(GenericAPIView):
     serializer_class = RequestNewRegistrationLinkSerializer
     permission_classes = []
+    throttle_scope = "registration_link"
 
     def post(self, request):
         data = request.data
@@ -53,6 +85,7 @@ class RequestNewRegistrationLinkView(GenericAPIView):
 
 class VerifyEmailView(GenericAPIView):
     serializer_class = VerifyEmailSerializer
+    permission_classes = []
     http_method_names = ["get"]
     token_param_config = openapi.Parameter(
         "token",
@@ -79,6 +112,7 @@ class VerifyEmailView(GenericAPIView):
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
     permission_classes = []
+    throttle_scope = "login"
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -86,9 +120,258 @@ class LoginView(generics.GenericAPIView):
         return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 
+class AsyncAPIView(View):
+
+    """Base for the async JSON endpoints served on the ASGI stack. Django
+    cannot wrap async views in ATOMIC_REQUESTS, so they manage their own
+    transactions"""
+
+    throttle_scope = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        return csrf_exempt(transaction.non_atomic_requests(view))
+
+    @staticmethod
+    def parse_json(request):
+        try:
+            return json.loads(request.body), None
+        except ValueError:
+            return None, JsonResponse(
+                {"error": ["Invalid JSON body"]}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+    async def check_throttles(self, request):
+        """Run the REST_FRAMEWORK throttles against ``throttle_scope``,
+        returning a 429 response when one of them refuses the request"""
+        if not self.throttle_scope:
+            return None
+        api_request = Request(request, parsers=[JSONParser()])
+        for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+            throttle = throttle_class()
+            allowed = await sync_to_async(throttle.allow_request)(api_request, self)
+            if not allowed:
+                return JsonResponse(
+                    {"detail": "Request was throttled"},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS,
+                    headers={"Retry-After": str(math.ceil(throttle.wait() or 1))},
+                )
+        return None
+
+    @staticmethod
+    def pool_full_response():
+        return JsonResponse(
+            {"detail": "Too many requests in progress, try again"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+
+
+class AsyncRegisterView(AsyncAPIView):
+    http_method_names = ["post"]
+
+    async def post(self, request):
+        data, error = self.parse_json(request)
+        if error:
+            return error
+        serializer = AsyncRegisterUserSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = dict(serializer.validated_data)
+        fields.pop("password2")
+        password = fields.pop("password")
+        try:
+            user = User.objects.build_user(**fields)
+        except ValueError as error:
+            return JsonResponse(
+                {"error": [str(error)]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        # Saves hashing a password for an email that is already taken, the
+        # unique constraint catches concurrent registrations
+        if await User.objects.filter(email=user.email).aexists():
+            return self.email_taken_response()
+
+        try:
+            user.password = await password_pool.run(make_password, password)
+        except PasswordPoolFull:
+            return self.pool_full_response()
+        # The async ORM has no transactions yet, so the user and its
+        # activation email are written together in one thread hop
+        try:
+            await sync_to_async(self.create_user)(request, user)
+        except IntegrityError:
+            return self.email_taken_response()
+
+        serializer.instance = user
+        return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def email_taken_response():
+        # Same error as the unique validator of the sync registration
+        return JsonResponse(
+            {"email": ["user with this email address already exists."]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def create_user(request, user):
+        user.save()
+        outbox.enqueue(
+            send_account_activation_email,
+            email=user.email,
+            absolute_url=verification_url(request, user),
+        )
+
+
+class AsyncVerifyEmailView(AsyncAPIView):
+    http_method_names = ["get"]
+
+    async def get(self, request):
+        invalid = JsonResponse(
+            {"error": ["Invalid token, try again"]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+        user = await auser_for_link_token(
+            request.GET.get("token", ""), VERIFY_EMAIL, VERIFICATION_FIELDS
+        )
+        if user is None:
+            return invalid
+        if not user.is_verified:
+            user.is_verified = True
+            # Saved rather than updated so post_save drops the cached tokens
+            await sync_to_async(user.save)(update_fields=["is_verified"])
+
+        return JsonResponse(
+            "email successfully verified", status=status.HTTP_200_OK, safe=False
+        )
+
+
+class AsyncLoginView(AsyncAPIView):
+
+    """Login for the ASGI stack. Password hashing runs on the bounded
+    password hashing pool so login bursts cannot block the event loop"""
+
+    http_method_names = ["post"]
+    throttle_scope = "login"
+
+    async def post(self, request):
+        data, error = self.parse_json(request)
+        if error:
+            return error
+        throttled = await self.check_throttles(request)
+        if throttled:
+            return throttled
+        serializer = LoginCredentialsSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = await aauthenticate(**serializer.validated_data)
+        except PasswordPoolFull:
+            return self.pool_full_response()
+        if not user:
+            return JsonResponse(
+                {"detail": "Invalid credentials, try again"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        if not user.is_verified:
+            return JsonResponse(
+                {"detail": "Email is not verified"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        _, token = await sync_to_async(AuthToken.objects.create)(user=user)
+        return JsonResponse(
+            {"email": user.email, "token": token}, status=status.HTTP_200_OK
+        )
+
+
+class AsyncRequestPasswordResetView(AsyncAPIView):
+    http_method_names = ["post"]
+    throttle_scope = "password_reset"
+
+    async def post(self, request):
+        data, error = self.parse_json(request)
+        if error:
+            return error
+        throttled = await self.check_throttles(request)
+        if throttled:
+            return throttled
+        serializer = PasswordResetEmailSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = await auser_by_email(serializer.validated_data["email"])
+        if user:
+            redirect_url = serializer.validated_data.get("redirect_url", "")
+            await outbox.aenqueue(
+                send_password_reset_email,
+                email=user.email,
+                absolute_url=password_reset_url(request, user, redirect_url),
+            )
+
+        return JsonResponse(
+            {"data": "We have sent you a link to reset your password"},
+            status=status.HTTP_200_OK,
+        )
+
+
+class PasswordHashingPoolStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(password_pool.stats(), status=status.HTTP_200_OK)
+
+
+class LogoutView(knox_views.LogoutView):
+    authentication_classes = (CachedTokenAuthentication,)
+
+
+class LogoutAllView(knox_views.LogoutAllView):
+    authentication_classes = (CachedTokenAuthentication,)
+
+
+class AuthTokenStatsView(APIView):
+
+    """Live and expired token counts for the users holding the most tokens"""
+
+    permission_classes = [permissions.IsAdminUser]
+    max_users = 1000
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", 100)), self.max_users)
+        except ValueError:
+            limit = 100
+        now = timezone.now()
+        counts = (
+            AuthToken.objects.values("user__email")
+            .annotate(
+                live=Count("digest", filter=Q(expiry__gte=now) | Q(expiry=None)),
+                expired=Count("digest", filter=Q(expiry__lt=now)),
+            )
+            .order_by("-live", "-expired")[:limit]
+        )
+        return Response(
+            [
+                {
+                    "email": row["user__email"],
+                    "live": row["live"],
+                    "expired": row["expired"],
+                }
+                for row in counts
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+
 class RequestPasswordResetView(GenericAPIView):
     serializer_class = RequestPasswordResetSerializer
     permission_classes = []
+    throttle_scope = "password_reset"
 
     def post(self, request):
         serializer = self.serializer_class(
@@ -109,11 +392,10 @@ class ChangePasswordView(GenericAPIView):
             data=request.data, context={"request": request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        user = request.user
+        token = serializer.save()
 
         return Response(
-            {"data": user.tokens()},
+            {"data": {"email": request.user.email, "token": token}},
             status=status.HTTP_200_OK,
         )
 
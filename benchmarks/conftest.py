@@ -0,0 +1,43 @@
+import fakeredis
+import pytest
+
+from apps.commons import redis_client
+from apps.commons.testing import fake_redis_caches
+from apps.inventory.lookups import LOOKUP_CACHES, LOOKUP_FIELDS
+from apps.users.models import User
+
+PASSWORD = "Benchmark-pass-42"
+
+
+@pytest.fixture
+def verified_user(db):
+    return User.objects.create_user(
+        first_name="Bench",
+        last_name="Mark",
+        email="bench@example.com",
+        password=PASSWORD,
+        phone_number="+2348000000000",
+        is_verified=True,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(settings, monkeypatch):
+    """Same in-memory Redis as the app tests' FakeRedisMixin, so the
+    benchmarks run without a Redis server"""
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    monkeypatch.setitem(redis_client._clients, settings.REDIS_URL, client)
+    settings.CACHES = fake_redis_caches(server)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def invalidate_lookup_caches(db, fake_redis):
+    # Rolled back test databases hand out the same pkids again, so lookup
+    # rows cached by one test must not be seen by the next
+    yield
+    for model, lookup_cache in LOOKUP_CACHES.items():
+        entries = list(model.objects.values(*LOOKUP_FIELDS))
+        if entries:
+            lookup_cache.invalidate(*entries)
@@ -0,0 +1,55 @@
+"""Stand-in for the Mailgun messages API used by the load test.
+
+Point ``MAILGUN_BASE_URL`` at ``http://127.0.0.1:8025/messages`` and the
+celery workers send their batches here. The last link sent to every
+recipient is served back at ``GET /messages/<email>`` so the Locust users can
+follow their verification emails.
+
+    python benchmarks/fake_mailgun.py [--port 8025]
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote
+
+links = {}
+lock = threading.Lock()
+
+
+class MailgunHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        recipients = json.loads(form.get("recipient-variables", ["{}"])[0])
+        with lock:
+            for email, variables in recipients.items():
+                links[email] = variables["absolute_url"]
+        self.respond(200, {"id": f"<{len(recipients)}@fake>", "message": "Queued"})
+
+    def do_GET(self):
+        email = unquote(self.path.rstrip("/").rsplit("/", 1)[-1])
+        with lock:
+            link = links.get(email)
+        if link is None:
+            self.respond(404, {"message": "No message for this recipient"})
+        else:
+            self.respond(200, {"absolute_url": link})
+
+    def respond(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    ThreadingHTTPServer(("127.0.0.1", args.port), MailgunHandler).serve_forever()
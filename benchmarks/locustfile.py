@@ -0,0 +1,103 @@
+"""Load test of the register -> verify -> login -> inventory writes journey.
+
+Every simulated user registers a fresh account, follows the verification
+link captured by ``benchmarks/fake_mailgun.py``, logs in and then keeps
+writing raw materials to the batches created by ``seed_load_test_data``
+while reading the list and the daily report.
+
+    locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000 \
+        --headless -u 50 -r 10 -t 5m --csv benchmarks/results/<release>
+"""
+import json
+import os
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+import requests
+from locust import HttpUser, between, task
+
+FAKE_MAILGUN_URL = os.environ.get("FAKE_MAILGUN_URL", "http://127.0.0.1:8025")
+EMAIL_TIMEOUT = float(os.environ.get("LOAD_TEST_EMAIL_TIMEOUT", 30))
+ROWS_PER_WRITE = int(os.environ.get("LOAD_TEST_ROWS_PER_WRITE", 50))
+PASSWORD = "Load-test-pass-42"
+
+with open(os.environ.get("LOAD_TEST_DATA", "benchmarks/load_test_data.json")) as f:
+    SEED = json.load(f)
+
+
+def wait_for_link(email):
+    """Poll the fake Mailgun until the verification email of ``email`` has
+    gone through the outbox, celery and the email batcher"""
+    deadline = time.monotonic() + EMAIL_TIMEOUT
+    while time.monotonic() < deadline:
+        response = requests.get(f"{FAKE_MAILGUN_URL}/messages/{email}", timeout=5)
+        if response.status_code == 200:
+            return response.json()["absolute_url"]
+        time.sleep(0.5)
+    raise TimeoutError(f"No verification email for {email}")
+
+
+class BakeryUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.email = f"load-{uuid.uuid4().hex}@example.com"
+        self.client.post(
+            "/users/register/",
+            json={
+                "email": self.email,
+                "password": PASSWORD,
+                "password2": PASSWORD,
+                "first_name": "Load",
+                "last_name": "Test",
+                "phone_number": "+2348000000000",
+            },
+            name="register",
+        )
+
+        link = urlsplit(wait_for_link(self.email))
+        self.client.get(f"{link.path}?{link.query}", name="verify_email")
+
+        response = self.client.post(
+            "/users/login/",
+            json={"email": self.email, "password": PASSWORD},
+            name="login",
+        )
+        self.client.headers["Authorization"] = f"Token {response.json()['token']}"
+
+    def raw_material_rows(self):
+        return [
+            {
+                "weight": round(random.uniform(0.1, 50), 2),
+                "cost": round(random.uniform(1, 500), 2),
+                "pastry_type": random.choice(SEED["pastry_types"]),
+                "time_of_day": random.choice(SEED["times_of_day"]),
+                "raw_material_type": random.choice(SEED["raw_material_types"]),
+            }
+            for _ in range(ROWS_PER_WRITE)
+        ]
+
+    @task(5)
+    def write_raw_materials(self):
+        batch = random.choice(SEED["batches"])
+        self.client.post(
+            f"/inventory/batches/{batch}/raw-materials/bulk/",
+            json=self.raw_material_rows(),
+            name="raw_material_bulk_create",
+        )
+
+    @task(3)
+    def list_raw_materials(self):
+        self.client.get("/inventory/raw-materials/", name="raw_material_list")
+
+    @task(1)
+    def daily_report(self):
+        today = date.today()
+        self.client.get(
+            "/inventory/reports/daily/",
+            params={"start": today - timedelta(days=30), "end": today},
+            name="raw_material_daily_rollup",
+        )
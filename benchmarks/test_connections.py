@@ -0,0 +1,66 @@
+"""Request latency with a new database connection per request against reused
+connections.
+
+The test client never closes connections, so every request is wrapped in
+close_old_connections() like the request handler does. Run it against
+Postgres (DATABASE_URL) under each DB_POOL_MODE. Under ``pool`` the
+``reconnect`` case measures a checkout from the pool instead of a connect.
+"""
+from django.db import close_old_connections, connection
+from django.test import Client
+
+import pytest
+
+from benchmarks.conftest import PASSWORD
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def fast_login(settings, monkeypatch):
+    # Keeps hashing and Redis throttling out of the login timings
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    monkeypatch.setattr(
+        "apps.commons.throttling.sliding_window_hit", lambda *args: (True, 0)
+    )
+
+
+@pytest.fixture(params=[0, 60], ids=["reconnect", "reuse"])
+def conn_max_age(request, monkeypatch):
+    monkeypatch.setitem(connection.settings_dict, "CONN_MAX_AGE", request.param)
+    close_old_connections()
+    connection.close()
+    yield request.param
+    connection.close()
+
+
+def handle(send, *args, **kwargs):
+    close_old_connections()
+    response = send(*args, **kwargs)
+    close_old_connections()
+    return response
+
+
+def test_login(benchmark, verified_user, conn_max_age):
+    client = Client()
+    data = {"email": verified_user.email, "password": PASSWORD}
+
+    def login():
+        response = handle(client.post, "/users/login/", data)
+        assert response.status_code == 200, response.content
+
+    benchmark(login)
+
+
+def test_raw_material_list(benchmark, verified_user, conn_max_age):
+    client = Client()
+    response = client.post(
+        "/users/login/", {"email": verified_user.email, "password": PASSWORD}
+    )
+    headers = {"HTTP_AUTHORIZATION": f"Token {response.json()['token']}"}
+
+    def list_raw_materials():
+        response = handle(client.get, "/inventory/raw-materials/", **headers)
+        assert response.status_code == 200, response.content
+
+    benchmark(list_raw_materials)
@@ -0,0 +1,81 @@
+"""Consumption series over a year of rollups, per bucket size."""
+import random
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+import pytest
+
+from apps.inventory.models import (
+    PastryType,
+    RawMaterialDailyRollup,
+    RawMaterialHourlyRollup,
+    RawMaterialType,
+    TimeOfDay,
+)
+from apps.inventory.services import consumption_series
+
+pytestmark = pytest.mark.django_db
+
+DAYS = 365
+TYPES = 5
+
+
+@pytest.fixture
+def year():
+    random.seed(0)
+    end = timezone.localdate()
+    start = end - timedelta(days=DAYS - 1)
+    types = RawMaterialType.objects.bulk_create(
+        RawMaterialType(name=f"Bench material {i}") for i in range(TYPES)
+    )
+    pastry_types = PastryType.objects.bulk_create(
+        PastryType(name=f"Bench pastry {i}") for i in range(3)
+    )
+    times_of_day = TimeOfDay.objects.bulk_create(
+        TimeOfDay(name=name) for name in ("Morning", "Afternoon", "Evening")
+    )
+    first_hour = timezone.make_aware(datetime.combine(start, time.min))
+    RawMaterialHourlyRollup.objects.bulk_create(
+        (
+            RawMaterialHourlyRollup(
+                hour=first_hour + timedelta(hours=hour),
+                raw_material_type=raw_material_type,
+                total_weight=random.uniform(1, 50),
+                total_cost=random.uniform(10, 500),
+                row_count=random.randint(1, 20),
+            )
+            for hour in range(DAYS * 24)
+            for raw_material_type in types
+        ),
+        batch_size=2000,
+    )
+    RawMaterialDailyRollup.objects.bulk_create(
+        (
+            RawMaterialDailyRollup(
+                day=start + timedelta(days=day),
+                raw_material_type=raw_material_type,
+                pastry_type=pastry_type,
+                time_of_day=time_of_day,
+                total_weight=random.uniform(1, 50),
+                total_cost=random.uniform(10, 500),
+                row_count=random.randint(1, 20),
+            )
+            for day in range(DAYS)
+            for raw_material_type in types
+            for pastry_type in pastry_types
+            for time_of_day in times_of_day
+        ),
+        batch_size=2000,
+    )
+    return start, end
+
+
+@pytest.mark.parametrize("interval", ["hour", "day", "week"])
+def test_consumption_series(benchmark, year, interval):
+    series = benchmark(consumption_series, interval, *year)
+
+    assert len(series) == TYPES
+    buckets = {"hour": DAYS * 24, "day": DAYS}.get(interval)
+    if buckets:
+        assert all(len(points["buckets"]) == buckets for points in series)
@@ -0,0 +1,132 @@
+"""Batch costing with NumPy against a loop over RawMaterial instances."""
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+import numpy as np
+import pytest
+
+from apps.inventory.models import (
+    PastryRawMaterialBatch,
+    PastryType,
+    RawMaterial,
+    RawMaterialType,
+    TimeOfDay,
+)
+from apps.inventory.services import (
+    COST_PER_KG_PERCENTILES,
+    _start_of_day,
+    batch_costing,
+)
+
+pytestmark = pytest.mark.django_db
+
+BATCHES = 2000
+ROWS_PER_BATCH = 10
+
+
+@pytest.fixture
+def window():
+    random.seed(0)
+    pastry_type = PastryType.objects.create(name="Bench pastry")
+    time_of_day = TimeOfDay.objects.create(name="Morning")
+    types = RawMaterialType.objects.bulk_create(
+        RawMaterialType(name=f"Bench material {i}") for i in range(5)
+    )
+    batches = PastryRawMaterialBatch.objects.bulk_create(
+        PastryRawMaterialBatch(batch_code=f"BENCH-{i:05d}") for i in range(BATCHES)
+    )
+    RawMaterial.objects.bulk_create(
+        (
+            RawMaterial(
+                weight=round(random.uniform(0.1, 50), 2),
+                cost=round(random.uniform(1, 500), 2),
+                processing_status="Pending",
+                pastry_type=pastry_type,
+                time_of_day=time_of_day,
+                raw_material_type=random.choice(types),
+                batch=batch,
+            )
+            for batch in batches
+            for _ in range(ROWS_PER_BATCH)
+        ),
+        batch_size=1000,
+    )
+    today = timezone.localdate()
+    return today, today
+
+
+def naive_batch_costing(start, end):
+    """What the report costs when computed over model instances"""
+    raw_materials = RawMaterial.objects.filter(
+        created_at__gte=_start_of_day(start),
+        created_at__lt=_start_of_day(end + timedelta(days=1)),
+    ).select_related("batch", "raw_material_type")
+
+    grouped = defaultdict(list)
+    for raw_material in raw_materials:
+        grouped[raw_material.batch].append(raw_material)
+
+    results = []
+    for batch, rows in grouped.items():
+        total_weight = sum(row.weight for row in rows)
+        total_cost = sum(row.cost for row in rows)
+        unit_costs = [row.cost / row.weight for row in rows if row.weight > 0]
+        by_type = defaultdict(lambda: [0, 0.0, 0.0])
+        for row in rows:
+            totals = by_type[row.raw_material_type]
+            totals[0] += 1
+            totals[1] += row.weight
+            totals[2] += row.cost
+        results.append(
+            {
+                "batch": batch.id,
+                "rows": len(rows),
+                "total_weight": total_weight,
+                "total_cost": total_cost,
+                "cost_per_kg": total_cost / total_weight,
+                **{
+                    f"cost_per_kg_p{percentile}": float(
+                        np.percentile(unit_costs, percentile)
+                    )
+                    for percentile in COST_PER_KG_PERCENTILES
+                },
+                "raw_material_types": {
+                    raw_material_type.id: totals
+                    for raw_material_type, totals in by_type.items()
+                },
+            }
+        )
+    return results
+
+
+def test_results_match(window):
+    expected = {row["batch"]: row for row in naive_batch_costing(*window)}
+    results = batch_costing(*window)
+
+    assert len(results) == len(expected) == BATCHES
+    for row in results:
+        naive = expected[row["batch"]]
+        for field in ("rows", "total_weight", "total_cost", "cost_per_kg"):
+            assert row[field] == pytest.approx(naive[field])
+        for percentile in COST_PER_KG_PERCENTILES:
+            field = f"cost_per_kg_p{percentile}"
+            assert row[field] == pytest.approx(naive[field])
+        assert {
+            breakdown["raw_material_type"]: [
+                breakdown["rows"],
+                breakdown["total_weight"],
+                breakdown["total_cost"],
+            ]
+            for breakdown in row["raw_material_types"]
+        } == pytest.approx(naive["raw_material_types"])
+
+
+def test_batch_costing_numpy(benchmark, window):
+    benchmark(batch_costing, *window)
+
+
+def test_batch_costing_orm_loop(benchmark, window):
+    benchmark(naive_batch_costing, *window)
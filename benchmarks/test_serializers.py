@@ -0,0 +1,54 @@
+from itertools import count
+
+from django.test import RequestFactory
+
+import pytest
+
+from apps.users.serializers import LoginSerializer, RegisterUserSerializer
+from benchmarks.conftest import PASSWORD
+
+pytestmark = pytest.mark.django_db
+
+
+def registration_data(email):
+    return {
+        "email": email,
+        "password": PASSWORD,
+        "password2": PASSWORD,
+        "first_name": "Bench",
+        "last_name": "Mark",
+        "phone_number": "+2348000000000",
+    }
+
+
+def test_register_serializer_validate(benchmark):
+    data = registration_data("new@example.com")
+
+    def validate():
+        serializer = RegisterUserSerializer(data=data)
+        assert serializer.is_valid(), serializer.errors
+
+    benchmark(validate)
+
+
+def test_register_serializer_save(benchmark):
+    emails = count()
+    request = RequestFactory().post("/users/register/")
+
+    def register():
+        data = registration_data(f"new-{next(emails)}@example.com")
+        serializer = RegisterUserSerializer(data=data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    benchmark(register)
+
+
+def test_login_serializer(benchmark, verified_user):
+    data = {"email": verified_user.email, "password": PASSWORD}
+
+    def login():
+        serializer = LoginSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+
+    benchmark(login)
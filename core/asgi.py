@@ -15,4 +15,15 @@ from core.settings.base import SETTINGS_FILE
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", SETTINGS_FILE)
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, the feed uses the ORM and the settings
+from apps.inventory.feed import FEED_PATH, inventory_feed  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Django, apart from the inventory feed whose long-lived responses are
+    streamed without going through a Django view"""
+    if scope["type"] == "http" and scope["path"] == FEED_PATH:
+        return await inventory_feed(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -2,6 +2,8 @@ import os
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 import environ
 
 env = environ.Env()
@@ -44,6 +46,8 @@ INSTALLED_APPS = DJANGO_APPS + LOCAL_APPS + THIRD_PARTY_APPS
 AUTH_USER_MODEL = "users.User"
 
 MIDDLEWARE = [
+    "apps.commons.middleware.health_check_middleware",
+    "apps.commons.middleware.request_metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -55,6 +59,15 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "core.urls"
 
+# Share of requests whose timings and SQL queries are recorded for /metrics/
+METRICS_SAMPLE_RATE = env.float("METRICS_SAMPLE_RATE", default=0.05)
+METRICS_TOKEN = env.str("METRICS_TOKEN", default="")
+
+# Seconds each /readyz dependency check may take, and how long its results
+# are reused before the dependencies are probed again
+READINESS_PROBE_TIMEOUT = env.float("READINESS_PROBE_TIMEOUT", default=2.0)
+READINESS_CACHE_SECONDS = env.float("READINESS_CACHE_SECONDS", default=5.0)
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -77,13 +90,59 @@ DATABASES = {"default": env.db("DATABASE_URL")}
 
 DATABASES["default"]["ATOMIC_REQUESTS"] = True
 
+# Seconds a connection is reused by the following requests of the same
+# thread, 0 reconnects on every request. Reused connections are checked with
+# a cheap query before the first use of each request
+DATABASES["default"]["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=60)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool(
+    "DB_CONN_HEALTH_CHECKS", default=True
+)
+
+# persistent: one connection per thread, kept for DB_CONN_MAX_AGE
+# pgbouncer: persistent connections to a PgBouncer in transaction pooling mode
+# pool: connections shared by the threads of a process through a psycopg2 pool
+DB_POOL_MODE = env.str("DB_POOL_MODE", default="persistent")
+
+if DB_POOL_MODE == "pgbouncer":
+    # Consecutive transactions may run on different server connections, so no
+    # cursor can be held open across them
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+elif DB_POOL_MODE == "pool":
+    DATABASES["default"]["ENGINE"] = "apps.commons.db.postgresql_pool"
+    # Connections go back to the pool at the end of every request
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["POOL"] = {
+        "MIN_SIZE": env.int("DB_POOL_MIN_SIZE", default=2),
+        "MAX_SIZE": env.int("DB_POOL_MAX_SIZE", default=20),
+        # Seconds a thread waits for a connection once MAX_SIZE are in use
+        "TIMEOUT": env.float("DB_POOL_TIMEOUT", default=10.0),
+    }
+elif DB_POOL_MODE != "persistent":
+    raise ImproperlyConfigured(f"Unknown DB_POOL_MODE {DB_POOL_MODE!r}")
+
+# ProfiledArgon2PasswordHasher also verifies hashes made by Django's own
+# Argon2PasswordHasher, both use the "argon2" algorithm name
 PASSWORD_HASHERS = [
-    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "apps.users.hashers.ProfiledArgon2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
     "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
 ]
 
+# Argon2 cost parameters, memory_cost is in KiB. "default" matches Django's
+# own Argon2PasswordHasher so switching to it does not rehash anybody.
+PASSWORD_HASHER_PROFILES = {
+    "low": {"time_cost": 1, "memory_cost": 47104, "parallelism": 1},
+    "default": {"time_cost": 2, "memory_cost": 102400, "parallelism": 8},
+    "high": {"time_cost": 4, "memory_cost": 131072, "parallelism": 8},
+}
+
+PASSWORD_HASHER_PROFILE = env.str("PASSWORD_HASHER_PROFILE", default="default")
+
+LOGIN_HASHER_WORKERS = env.int("LOGIN_HASHER_WORKERS", default=os.cpu_count() or 1)
+
+LOGIN_HASHER_MAX_QUEUE = env.int("LOGIN_HASHER_MAX_QUEUE", default=64)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -103,6 +162,15 @@ CELERY_BROKER_URL = env.str("CELERY_BROKER_URL")
 
 CELERY_RESULT_BACKEND = env.str("CELERY_RESULT_BACKEND")
 
+REDIS_URL = env.str("REDIS_URL", default=CELERY_BROKER_URL)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": env.str("CACHE_URL", default=REDIS_URL),
+    }
+}
+
 CELERY_TIMEZONE = "Africa/Kigali"
 
 CELERY_ACCEPT_CONTENT = ["json"]
@@ -111,6 +179,24 @@ CELERY_TASK_SERIALIZER = "json"
 
 CELERY_RESULT_SERIALIZER = "json"
 
+OUTBOX_RELAY_BATCH_SIZE = env.int("OUTBOX_RELAY_BATCH_SIZE", default=500)
+
+OUTBOX_RELAY_INTERVAL = env.float("OUTBOX_RELAY_INTERVAL", default=0.5)
+
+# Failed publishes of one message before the relay dead-letters it
+OUTBOX_MAX_ATTEMPTS = env.int("OUTBOX_MAX_ATTEMPTS", default=5)
+
+CELERY_BEAT_SCHEDULE = {
+    "purge-expired-auth-tokens": {
+        "task": "apps.users.tasks.purge_expired_auth_tokens",
+        "schedule": timedelta(hours=1),
+    },
+    "flush-email-queue": {
+        "task": "apps.users.tasks.flush_email_queue",
+        "schedule": timedelta(minutes=1),
+    },
+}
+
 LANGUAGE_CODE = "en-us"
 
 TIME_ZONE = "UTC"
@@ -125,11 +211,42 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ("knox.auth.TokenAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": (
+        "apps.users.authentication.CachedTokenAuthentication",
+    ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    # Only views that set a throttle_scope are throttled
+    "DEFAULT_THROTTLE_CLASSES": ("apps.commons.throttling.SlidingWindowThrottle",),
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": env.str("THROTTLE_LOGIN_IP", default="20/min"),
+        "login_email": env.str("THROTTLE_LOGIN_EMAIL", default="5/min"),
+        "password_reset_ip": env.str("THROTTLE_PASSWORD_RESET_IP", default="10/hour"),
+        "password_reset_email": env.str(
+            "THROTTLE_PASSWORD_RESET_EMAIL", default="3/hour"
+        ),
+        "registration_link_ip": env.str(
+            "THROTTLE_REGISTRATION_LINK_IP", default="10/hour"
+        ),
+        "registration_link_email": env.str(
+            "THROTTLE_REGISTRATION_LINK_EMAIL", default="3/hour"
+        ),
+    },
     "NON_FIELD_ERRORS_KEY": "error",
 }
 
+SWAGGER_SETTINGS = {
+    "DEFAULT_INFO": "core.urls.api_info",
+    "SPEC_URL": "schema-json",
+}
+REDOC_SETTINGS = {"SPEC_URL": "schema-json"}
+
+# Built by `python manage.py build_openapi_schema`, generated in memory on
+# first use when missing
+OPENAPI_SCHEMA_PATH = env.str(
+    "OPENAPI_SCHEMA_PATH", default=str(BASE_DIR / "openapi" / "openapi.json")
+)
+OPENAPI_SCHEMA_MAX_AGE = env.int("OPENAPI_SCHEMA_MAX_AGE", default=300)
+
 REST_KNOX = {
     "SECURE_HASH_ALGORITHM": "cryptography.hazmat.primitives.hashes.SHA512",
     "AUTH_TOKEN_CHARACTER_LENGTH": 64,
@@ -140,6 +257,10 @@ REST_KNOX = {
     "EXPIRY_DATETIME_FORMAT": datetime,
 }
 
+KNOX_TOKEN_CACHE_TIMEOUT = env.int("KNOX_TOKEN_CACHE_TIMEOUT", default=300)
+
+KNOX_PURGE_BATCH_SIZE = env.int("KNOX_PURGE_BATCH_SIZE", default=1000)
+
 PASSWORD_RESET_TIMEOUT = env.int("PASSWORD_RESET_TIMEOUT")
 
 ADMIN_URL = env.str("ADMIN_URL")
@@ -157,7 +278,59 @@ MAILGUN_BASE_URL = env.str("MAILGUN_BASE_URL")
 
 SENDER = env.str("SENDER")
 
+MAILGUN_TIMEOUT = env.int("MAILGUN_TIMEOUT", default=10)
+
+MAILGUN_POOL_SIZE = env.int("MAILGUN_POOL_SIZE", default=4)
+
+# Mailgun accepts at most 1000 recipients per batch sending call
+EMAIL_BATCH_SIZE = min(env.int("EMAIL_BATCH_SIZE", default=1000), 1000)
+
+EMAIL_BATCH_WINDOW = env.int("EMAIL_BATCH_WINDOW", default=5)
+
 
 PROTOCOL_SCHEME = env.str("PROTOCOL_SCHEME")
 
 FRONTEND_URL = env.str("FRONTEND_URL")
+
+INVENTORY_BULK_CREATE_BATCH_SIZE = env.int(
+    "INVENTORY_BULK_CREATE_BATCH_SIZE", default=500
+)
+
+INVENTORY_EXPORT_CHUNK_SIZE = env.int("INVENTORY_EXPORT_CHUNK_SIZE", default=2000)
+
+INVENTORY_COSTING_MAX_DAYS = env.int("INVENTORY_COSTING_MAX_DAYS", default=366)
+
+INVENTORY_SERIES_MAX_DAYS = env.int("INVENTORY_SERIES_MAX_DAYS", default=366)
+
+INVENTORY_LOOKUP_CACHE_TIMEOUT = env.int("INVENTORY_LOOKUP_CACHE_TIMEOUT", default=3600)
+
+INVENTORY_LOOKUP_LOCAL_TTL = env.int("INVENTORY_LOOKUP_LOCAL_TTL", default=30)
+
+INVENTORY_LOOKUP_LOCAL_SIZE = env.int("INVENTORY_LOOKUP_LOCAL_SIZE", default=1024)
+
+# Seconds between reconciliations of the Redis pending counters with the
+# database, and the age past which a read reconciles them itself
+INVENTORY_PENDING_COUNTS_RECONCILE_INTERVAL = env.int(
+    "INVENTORY_PENDING_COUNTS_RECONCILE_INTERVAL", default=60
+)
+INVENTORY_PENDING_COUNTS_MAX_AGE = env.int(
+    "INVENTORY_PENDING_COUNTS_MAX_AGE",
+    default=2 * INVENTORY_PENDING_COUNTS_RECONCILE_INTERVAL,
+)
+
+CELERY_BEAT_SCHEDULE["reconcile-pending-counts"] = {
+    "task": "apps.inventory.tasks.reconcile_pending_counts",
+    "schedule": timedelta(seconds=INVENTORY_PENDING_COUNTS_RECONCILE_INTERVAL),
+}
+
+# Events kept in the Redis stream for clients of the inventory feed to resume
+# from, at most how many of them one reconnect replays, and the seconds
+# between keepalives on an idle feed, which is also how often the token of
+# an open feed is checked again. Feed tickets are valid for
+# INVENTORY_EVENTS_TICKET_MAX_AGE seconds
+INVENTORY_EVENTS_STREAM_LENGTH = env.int(
+    "INVENTORY_EVENTS_STREAM_LENGTH", default=10000
+)
+INVENTORY_EVENTS_REPLAY_LIMIT = env.int("INVENTORY_EVENTS_REPLAY_LIMIT", default=1000)
+INVENTORY_EVENTS_HEARTBEAT = env.int("INVENTORY_EVENTS_HEARTBEAT", default=15)
+INVENTORY_EVENTS_TICKET_MAX_AGE = env.int("INVENTORY_EVENTS_TICKET_MAX_AGE", default=60)
@@ -5,15 +5,21 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from apps.commons.views import metrics, openapi_schema
+
+api_info = openapi.Info(
+    title="Bakery Inventory API",
+    default_version="v1",
+    description="Bakery Inventory Management API",
+    terms_of_service="https://www.ourapp.com/policies/terms/",
+    contact=openapi.Contact(email="contact@expenses.local"),
+    license=openapi.License(name="Test License"),
+)
+
+# The UI pages load the schema from SPEC_URL (see SWAGGER_SETTINGS), which
+# serves the prebuilt file, so rendering them does not introspect the views
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Bakery Inventory API",
-        default_version="v1",
-        description="Bakery Inventory Management API",
-        terms_of_service="https://www.ourapp.com/policies/terms/",
-        contact=openapi.Contact(email="contact@expenses.local"),
-        license=openapi.License(name="Test License"),
-    ),
+    api_info,
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
@@ -21,11 +27,9 @@ schema_view = get_schema_view(
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("users/", include("apps.users.urls")),
+    path("inventory/", include("apps.inventory.urls")),
+    path("metrics/", metrics, name="metrics"),
     path("", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
-    path(
-        "api/api.json/",
-        schema_view.without_ui(cache_timeout=0),
-        name="schema-swagger-ui",
-    ),
+    path("api/api.json/", openapi_schema, name="schema-json"),
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
 ]